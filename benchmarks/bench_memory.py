@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+"""Check that reading and re-writing result files uses flat memory.
+
+Writes merged result files of growing size, then runs each operation on each in
+a fresh interpreter and records its peak resident set size. Fails if the peak
+for the largest file is more than ``--max_growth_mb`` above the smallest's.
+
+Usage::
+
+    python benchmarks/bench_memory.py [--sizes 100k,300k,1m] [--max_growth_mb 32]
+"""
+from argparse import ArgumentParser
+import os
+from pathlib import Path
+import subprocess
+import sys
+import tempfile
+
+from fixtures import write_merged_results
+
+OPERATIONS: dict[str, list[str]] = {
+    "read": [
+        "-c",
+        "import sys\n"
+        "from cpac_regression_dashboard.utils.records import read_records\n"
+        "for _ in read_records(sys.argv[1]): pass",
+        "{input}",
+    ],
+    "convert": [
+        "-m",
+        "cpac_regression_dashboard.cli",
+        "convert",
+        "{input}",
+        "{output}",
+    ],
+    "compress": [
+        "-c",
+        "import sys\n"
+        "from cpac_regression_dashboard.utils.data_assets import compress_asset\n"
+        "compress_asset(sys.argv[1])",
+        "{input}",
+    ],
+}
+"""Python arguments for each operation, with ``{input}`` and ``{output}`` files."""
+_MULTIPLIERS = {"k": 1000, "m": 1000000}
+
+
+def parse_size(size: str) -> int:
+    """Parse ``"100k"``, ``"4m"`` or a plain number of cells."""
+    size = size.strip().lower()
+    if size[-1:] in _MULTIPLIERS:
+        return int(float(size[:-1]) * _MULTIPLIERS[size[-1]])
+    return int(size)
+
+
+def peak_rss(arguments: list[str]) -> float:
+    """Run ``python *arguments``; return its peak resident set size, in MiB."""
+    process = subprocess.Popen([sys.executable, *arguments], stdout=subprocess.DEVNULL)
+    _, status, usage = os.wait4(process.pid, 0)
+    if os.waitstatus_to_exitcode(status):
+        msg = f"{' '.join(arguments)} failed"
+        raise RuntimeError(msg)
+    # kilobytes on Linux, bytes on macOS
+    return usage.ru_maxrss / (1 << (20 if sys.platform == "darwin" else 10))
+
+
+def main() -> None:
+    """Measure every operation at every size; exit 1 if memory grows."""
+    parser = ArgumentParser(description=__doc__.split("\n", 1)[0])
+    parser.add_argument("--sizes", default="100k,300k,1m", help="cells per file")
+    parser.add_argument(
+        "--max_growth_mb",
+        type=float,
+        default=32,
+        help="most the peak may grow from the smallest file to the largest",
+    )
+    args = parser.parse_args()
+    sizes = [(size, parse_size(size)) for size in args.sizes.split(",")]
+    peaks: dict[str, list[float]] = {operation: [] for operation in OPERATIONS}
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"{'cells':>8} {'file':>10}" + "".join(f" {op:>10}" for op in OPERATIONS))
+        for label, n_cells in sizes:
+            source = write_merged_results(Path(tmp, f"{label}.json"), n_cells)
+            row = f"{label:>8} {os.path.getsize(source) / (1 << 20):6.0f} MiB"
+            for operation, template in OPERATIONS.items():
+                arguments = [
+                    argument.format(input=source, output=Path(tmp, "out.json"))
+                    for argument in template
+                ]
+                peaks[operation].append(peak_rss(arguments))
+                row += f" {peaks[operation][-1]:6.0f} MiB"
+            print(row, flush=True)
+            for path in Path(tmp).iterdir():
+                path.unlink()
+    growth = {operation: peak[-1] - peak[0] for operation, peak in peaks.items()}
+    grew = {op: mb for op, mb in growth.items() if mb > args.max_growth_mb}
+    for operation, megabytes in grew.items():
+        print(f"{operation}: peak grew {megabytes:.0f} MiB", file=sys.stderr)
+    if grew:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+"""Compare pipeline directory discovery against the old repeated ``os.walk``.
+
+Usage::
+
+    python benchmarks/bench_scan.py [--width 8] [--depth 4] [--repeat 3]
+"""
+from argparse import ArgumentParser
+import os
+from pathlib import Path
+import tempfile
+from time import perf_counter
+from typing import Callable, Optional
+
+from fixtures import build_output_tree
+
+from cpac_regression_dashboard.utils.parse_yaml import parse_yaml
+
+
+def _legacy_get_dir(paths: Optional[str]) -> Optional[str]:
+    directory = paths
+    if directory:
+        for root, dirs, _files in os.walk(directory):
+            for _dir in dirs:
+                if "pipeline_" in _dir:
+                    directory = os.path.join(root, _dir)
+    return directory
+
+
+def legacy_parse_yaml(directory: str) -> dict[str, Optional[str]]:
+    """Discover pipeline paths the way ``parse_yaml`` did before the scanner."""
+    paths = {
+        subdir: os.path.join(directory, subdir)
+        if os.path.isdir(os.path.join(directory, subdir))
+        else None
+        for subdir in ["log", "working", "output"]
+    }
+    log_dir = _legacy_get_dir(paths["log"])
+    pipeline_config = None
+    if log_dir is not None:
+        for root, _dirs, files in os.walk(log_dir):
+            for file in files:
+                if file.endswith("Z.yml"):
+                    pipeline_config = os.path.join(root, file)
+    return {
+        "log_dir": log_dir,
+        "work_dir": _legacy_get_dir(paths["working"]),
+        "output_dir": _legacy_get_dir(paths["output"]),
+        "pipe_config": pipeline_config,
+    }
+
+
+def _time(func: Callable[[], object], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = perf_counter()
+        func()
+        best = min(best, perf_counter() - start)
+    return best
+
+
+def main() -> None:
+    """Time both implementations on a synthetic tree and report the speedup."""
+    parser = ArgumentParser(description=__doc__.split("\n", 1)[0])
+    parser.add_argument("--width", type=int, default=8, help="subdirectories per node")
+    parser.add_argument("--depth", type=int, default=4, help="node levels in working")
+    parser.add_argument("--repeat", type=int, default=3, help="best of N runs")
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as tmp:
+        subject = str(build_output_tree(Path(tmp), args.width, args.depth))
+        legacy = _time(lambda: legacy_parse_yaml(subject), args.repeat)
+        scanner = _time(lambda: parse_yaml(subject, "pipeline_1"), args.repeat)
+    n_dirs = sum(args.width**level for level in range(1, args.depth + 1))
+    print(f"synthetic working tree: {n_dirs} node directories")
+    print(f"os.walk  : {legacy * 1000:9.2f} ms")
+    print(f"scan_tree: {scanner * 1000:9.2f} ms")
+    print(f"speedup  : {legacy / scanner:9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
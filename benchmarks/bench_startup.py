@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+"""Check that ``cpac_regsuite`` help and version start quickly.
+
+Runs each invocation in a fresh interpreter with ``python -X importtime``, best
+of ``--repeat``, and fails if the total import time of any is over ``--max_ms``,
+listing its slowest imports. Wall-clock times are shown too, but they include
+interpreter startup and vary too much from run to run to check.
+
+Usage::
+
+    python benchmarks/bench_startup.py [--max_ms 100] [--repeat 5]
+"""
+from argparse import ArgumentParser
+import re
+import subprocess
+import sys
+from time import perf_counter
+from typing import NamedTuple, Optional
+
+from cpac_regression_dashboard.cli import COMMANDS
+
+_IMPORT_LINE = re.compile(r"import time:\s+\d+ \|\s+(\d+) \|( *)(\S+)")
+_SKIP = {"correlate"}
+"""Subcommands whose help comes from a dependency."""
+
+
+def invocations() -> list[list[str]]:
+    """Arguments to ``cpac_regsuite`` for help and version."""
+    return [
+        ["--help"],
+        ["--version"],
+        *([name, "--help"] for name in COMMANDS if name not in _SKIP),
+    ]
+
+
+def _command(args: list[str], *options: str) -> list[str]:
+    return [sys.executable, *options, "-m", "cpac_regression_dashboard.cli", *args]
+
+
+class Startup(NamedTuple):
+    """Timing of one invocation."""
+
+    wall: float
+    """Wall-clock time, in ms."""
+    imports: float
+    """Total import time, in ms."""
+    slowest: list[tuple[float, str]]
+    """Top-level imports with the most cumulative time (ms, module), slowest first."""
+
+
+def time_startup(args: list[str], repeat: int) -> Startup:
+    """Run ``cpac_regsuite *args`` ``repeat`` times; keep the fastest imports."""
+    best: Optional[Startup] = None
+    for _ in range(repeat):
+        start = perf_counter()
+        stderr = subprocess.run(
+            _command(args, "-X", "importtime"),
+            capture_output=True,
+            check=True,
+            text=True,
+        ).stderr
+        wall = (perf_counter() - start) * 1000
+        imports = []
+        for line in stderr.splitlines():
+            match = _IMPORT_LINE.match(line)
+            # only direct imports; nested ones are included in their parents' times
+            if match and len(match.group(2)) <= 1:
+                imports.append((int(match.group(1)) / 1000, match.group(3)))
+        total = sum(milliseconds for milliseconds, _ in imports)
+        if best is None or total < best.imports:
+            best = Startup(wall, total, sorted(imports, reverse=True))
+    assert best is not None
+    return best
+
+
+def main() -> None:
+    """Time every help and version invocation; exit 1 if any imports too much."""
+    parser = ArgumentParser(description=__doc__.split("\n", 1)[0])
+    parser.add_argument("--max_ms", type=float, default=100, help="target, in ms")
+    parser.add_argument("--repeat", type=int, default=5, help="best of N runs")
+    args = parser.parse_args()
+    slow: list[tuple[str, Startup]] = []
+    print(f"{'invocation':<44} {'imports':>10} {'wall':>10}")
+    for arguments in invocations():
+        startup = time_startup(arguments, args.repeat)
+        label = " ".join(["cpac_regsuite", *arguments])
+        flag = ""
+        if startup.imports > args.max_ms:
+            slow.append((label, startup))
+            flag = "  SLOW"
+        print(f"{label:<44} {startup.imports:7.1f} ms {startup.wall:7.1f} ms{flag}")
+    for label, startup in slow:
+        print(f"\nslowest imports for {label}:")
+        for milliseconds, module in startup.slowest[:8]:
+            print(f"  {milliseconds:7.1f} ms  {module}")
+    if slow:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
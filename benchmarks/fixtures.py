@@ -0,0 +1,172 @@
+"""Synthetic C-PAC output trees and correlation datasets for the benchmarks."""
+from pathlib import Path
+import random
+from typing import Optional
+
+from cpac_regression_dashboard.utils.records import iter_records, write_records
+from cpac_regression_dashboard.utils.static_assets import VENDOR
+
+SIZES: dict[str, int] = {"1k": 1000, "10k": 10000, "100k": 100000}
+"""Dataset sizes, in correlation cells (features x sites)."""
+_SPACES = ("template", "T1w", "bold", "MNI152NLin6ASym")
+_DESCS = ("preproc", "brain", "mean", "sm6", "zstd", "Mean", "ndmg")
+_SUFFIXES = ("bold", "T1w", "mask", "timeseries", "correlations", "alff", "reho")
+_PIPELINE_CONFIG = """\
+pipeline_setup:
+  pipeline_name: {name}
+  output_directory:
+    path: /outputs/output
+  working_directory:
+    path: /outputs/working
+  log_directory:
+    path: /outputs/log
+"""
+
+
+def _fill(path: Path, width: int, depth: int) -> None:
+    """Make a ``width``-ary tree of nipype-style node directories."""
+    if depth == 0:
+        (path / "result_node.pklz").touch()
+        return
+    for i in range(width):
+        node = path / f"node_{i}"
+        node.mkdir()
+        _fill(node, width, depth - 1)
+
+
+def build_output_tree(
+    root: Path,
+    width: int = 8,
+    depth: int = 4,
+    pipelines: int = 1,
+    configs: int = 1,
+    subject: str = "sub-0000001",
+) -> Path:
+    """Build a synthetic C-PAC output directory for one subject under ``root``.
+
+    Parameters
+    ----------
+    root : Path
+
+    width : int
+        Subdirectories per node in ``working``.
+
+    depth : int
+        Node levels in ``working``; ``output`` and ``log`` get one level.
+
+    pipelines : int
+        ``pipeline_*`` directories in each of ``log``, ``output`` and
+        ``working``.
+
+    configs : int
+        ``*Z.yml`` pipeline configs in the first pipeline's log session.
+
+    subject : str
+
+    Returns
+    -------
+    Path
+        The subject directory, as given to ``cpac_regsuite_create_yaml``.
+    """
+    directory = root / subject
+    for subdir in ["log", "working", "output"]:
+        for i in range(pipelines):
+            pipeline = directory / subdir / f"pipeline_cpac-default-{i}"
+            pipeline.mkdir(parents=True)
+            _fill(pipeline, width, depth if subdir == "working" else 1)
+    session = directory / "log" / "pipeline_cpac-default-0" / f"{subject}_ses-1"
+    session.mkdir()
+    (session / "pypeline.log").write_text("", encoding="utf-8")
+    (session / "callback.log").write_text("", encoding="utf-8")
+    for i in range(configs):
+        config = session / f"cpac_pipeline_config_2024-01-{i + 1:02d}T00-00-00Z.yml"
+        config.write_text(
+            _PIPELINE_CONFIG.format(name=f"cpac-default-{i}"), encoding="utf-8"
+        )
+    return directory
+
+
+def feature_names(n_features: int) -> list[str]:
+    """Name ``n_features`` distinct C-PAC-style outputs."""
+    return [
+        f"space-{_SPACES[i % len(_SPACES)]}_desc-{_DESCS[i // 4 % len(_DESCS)]}{i}"
+        f"_{_SUFFIXES[i % len(_SUFFIXES)]}"
+        for i in range(n_features)
+    ]
+
+
+def correlation_keys(
+    n_features: int, seed: int = 0, missing: float = 0.01
+) -> list[str]:
+    """Make ``"feature: coefficient"`` keys, as ``cpac_correlations`` returns them.
+
+    A ``missing`` fraction of the coefficients is ``nan``.
+    """
+    rng = random.Random(seed)
+    return [
+        f"{name}: {'nan' if rng.random() < missing else 1 - rng.random() ** 4 * 0.2}"
+        for name in feature_names(n_features)
+    ]
+
+
+def write_correlation_files(
+    directory: Path,
+    n_cells: int,
+    n_sites: int = 10,
+    branch: str = "main",
+    seed: int = 0,
+) -> list[Path]:
+    """Write ``n_cells`` coefficients as one ``{site}_{branch}.json`` per site."""
+    directory.mkdir(parents=True, exist_ok=True)
+    paths = []
+    for site in range(n_sites):
+        data_source = f"Site-{site:02d}"
+        path = directory / f"{data_source}_{branch}.json"
+        keys = correlation_keys(n_cells // n_sites, seed + site)
+        write_records(str(path), iter_records(keys, data_source))
+        paths.append(path)
+    return paths
+
+
+def write_coefficient_text(
+    directory: Path, n_lines: int, n_files: int = 10, seed: Optional[int] = 0
+) -> list[Path]:
+    """Write ``n_lines`` ``"feature: coefficient"`` lines across ``*.txt`` files."""
+    directory.mkdir(parents=True, exist_ok=True)
+    paths = []
+    for i in range(n_files):
+        path = directory / f"correlations_{i:02d}.txt"
+        keys = correlation_keys(n_lines // n_files, None if seed is None else seed + i)
+        path.write_text("\n".join(keys) + "\n", encoding="utf-8")
+        paths.append(path)
+    return paths
+
+
+def write_vendor_assets(directory: Path, size: int = 256 << 10) -> Path:
+    """Write stand-ins for the pinned libraries, so builds don't download them.
+
+    Point ``$CPAC_REGSUITE_ASSET_DIR`` at ``directory``.
+    """
+    for asset in VENDOR.values():
+        path = directory / asset.version / asset.filename
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(f"/* {asset.url} */\n" + " " * size, encoding="utf-8")
+    return directory
+
+
+def write_merged_results(
+    path: Path, n_cells: int, n_sites: int = 100, seed: int = 0
+) -> Path:
+    """Write ``n_cells`` coefficients for ``n_sites`` sites into one JSON file."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    write_records(
+        str(path),
+        (
+            record
+            for site in range(n_sites)
+            for record in iter_records(
+                correlation_keys(n_cells // n_sites, seed + site), f"Site-{site:03d}"
+            )
+        ),
+    )
+    return path
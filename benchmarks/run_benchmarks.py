@@ -0,0 +1,260 @@
+#!/usr/bin/env python
+"""Time the dashboard's hot paths on synthetic data, and compare with earlier runs.
+
+Usage::
+
+    python benchmarks/run_benchmarks.py [--sizes 1k,10k] [--repeat 5] [--filter body]
+    python benchmarks/run_benchmarks.py --compare main --max_slowdown 1.25
+
+Every run is saved to ``.benchmarks/{timestamp}-{commit}.json``. ``--compare``
+takes one of those files, or a commit (the latest run saved for it), and exits
+with status 1 if any benchmark got slower than ``--max_slowdown`` times.
+"""
+from argparse import ArgumentParser
+from datetime import datetime, timezone
+import json
+import os
+from pathlib import Path
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+from time import perf_counter
+from typing import Any, Callable, Optional
+
+from fixtures import (
+    build_output_tree,
+    correlation_keys,
+    SIZES,
+    write_coefficient_text,
+    write_correlation_files,
+    write_vendor_assets,
+)
+
+from cpac_regression_dashboard.build_d3_dashboard import main as build_d3_dashboard
+from cpac_regression_dashboard.utils.analysis import analyze_matrix
+from cpac_regression_dashboard.utils.columnar import CorrelationMatrix
+from cpac_regression_dashboard.utils.comment import gather_text
+from cpac_regression_dashboard.utils.html_script import body
+from cpac_regression_dashboard.utils.parse_yaml import cpac_yaml
+from cpac_regression_dashboard.utils.records import iter_records, save_records
+from cpac_regression_dashboard.utils.static_assets import ASSET_DIR_ENV
+
+RESULTS_DIR = Path(__file__).resolve().parent.parent / ".benchmarks"
+TREES: dict[str, tuple[int, int]] = {"w4d3": (4, 3), "w8d4": (8, 4)}
+"""Working-directory shapes (width, depth) for the output tree benchmarks."""
+Setup = Callable[[Path, Any], Callable[[], object]]
+"""Prepare fixtures in a scratch directory for one parameter; return what to time."""
+BENCHMARKS: dict[str, tuple[Setup, dict[str, Any]]] = {}
+
+
+def benchmark(
+    name: str, params: Optional[dict[str, Any]] = None
+) -> Callable[[Setup], Setup]:
+    """Register a benchmark, run once per parameter (default: every size)."""
+
+    def decorator(setup: Setup) -> Setup:
+        BENCHMARKS[name] = (setup, SIZES if params is None else params)
+        return setup
+
+    return decorator
+
+
+@benchmark("parse_yaml.cpac_yaml", TREES)
+def _cpac_yaml(tmp: Path, shape: tuple[int, int]) -> Callable[[], object]:
+    pipeline1 = build_output_tree(tmp / "a", *shape)
+    pipeline2 = build_output_tree(tmp / "b", *shape)
+    return lambda: cpac_yaml(
+        str(pipeline1), str(pipeline2), "correlations", "bench", 1, "main", "Site-00"
+    )
+
+
+@benchmark("html_script.body")
+def _body(tmp: Path, n_cells: int) -> Callable[[], object]:
+    keys = correlation_keys(n_cells)
+    return lambda: body(keys, "Site-00")
+
+
+@benchmark("calculate_correlations.save_records[json]")
+def _save_json(tmp: Path, n_cells: int) -> Callable[[], object]:
+    keys = correlation_keys(n_cells)
+    return lambda: save_records("Site-00_main.json", iter_records(keys, "Site-00"))
+
+
+@benchmark("calculate_correlations.save_records[npz]")
+def _save_npz(tmp: Path, n_cells: int) -> Callable[[], object]:
+    keys = correlation_keys(n_cells)
+    return lambda: save_records("Site-00_main.npz", iter_records(keys, "Site-00"))
+
+
+@benchmark("analysis.analyze_matrix")
+def _analyze_matrix(tmp: Path, n_cells: int) -> Callable[[], object]:
+    matrix = CorrelationMatrix.from_records(
+        record
+        for site in range(10)
+        for record in iter_records(
+            correlation_keys(n_cells // 10, site), f"Site-{site:02d}"
+        )
+    )
+    return lambda: analyze_matrix(matrix)
+
+
+@benchmark("build_d3_dashboard.main")
+def _build_d3_dashboard(tmp: Path, n_cells: int) -> Callable[[], object]:
+    args = [
+        argument
+        for path in write_correlation_files(tmp / "results", n_cells)
+        for argument in ("--json_file", str(path))
+    ]
+    args += ["--branch", "main", "--output_dir", str(tmp / "output"), "--force"]
+    os.environ[ASSET_DIR_ENV] = str(write_vendor_assets(tmp / "vendor"))
+    return lambda: build_d3_dashboard.main(args, standalone_mode=False)
+
+
+@benchmark("generate_comment.gather_text")
+def _gather_text(tmp: Path, n_cells: int) -> Callable[[], object]:
+    write_coefficient_text(tmp / "correlations", n_cells)
+    return lambda: gather_text(tmp / "correlations")
+
+
+def _git(*args: str) -> str:
+    try:
+        return subprocess.run(
+            ["git", *args],
+            capture_output=True,
+            check=True,
+            cwd=RESULTS_DIR.parent,
+            text=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def run_benchmark(
+    setup: Setup,
+    param: Any,  # noqa: ANN401
+    repeat: int,
+) -> list[float]:
+    """Set up in a scratch directory, then time ``repeat`` calls after a warm-up."""
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        try:
+            func = setup(Path(tmp), param)
+            func()
+            times = []
+            for _ in range(repeat):
+                start = perf_counter()
+                func()
+                times.append(perf_counter() - start)
+        finally:
+            os.chdir(cwd)
+    return times
+
+
+def find_results(reference: str, results_dir: Path) -> Path:
+    """Find a results file by path, or the latest one saved for a commit."""
+    if os.path.isfile(reference):
+        return Path(reference)
+    commit = _git("rev-parse", "--verify", "--quiet", f"{reference}^{{commit}}")
+    saved = sorted(results_dir.glob(f"*-{(commit or reference)[:12]}.json"))
+    if not saved:
+        msg = f"no saved benchmark results for {reference} in {results_dir}"
+        raise FileNotFoundError(msg)
+    return saved[-1]
+
+
+def compare(
+    current: dict[str, Any], reference: dict[str, Any], max_slowdown: float
+) -> list[str]:
+    """Print the change in best time for each benchmark in both runs.
+
+    Returns
+    -------
+    list of str
+        Benchmarks that got more than ``max_slowdown`` times slower.
+    """
+    print(f"\ncompared with {reference['commit'][:12]} ({reference['timestamp']})")
+    if reference.get("machine") != current["machine"]:
+        print(f"warning: that run was on {reference.get('machine')}")
+    slower = []
+    for key, result in current["results"].items():
+        if key not in reference["results"]:
+            continue
+        ratio = result["min"] / reference["results"][key]["min"]
+        flag = ""
+        if ratio > max_slowdown:
+            slower.append(key)
+            flag = "  SLOWER"
+        print(f"{key:<56} {ratio:6.2f}x{flag}")
+    return slower
+
+
+def main() -> None:
+    """Run the selected benchmarks, save the results and compare if asked."""
+    parser = ArgumentParser(description=__doc__.split("\n", 1)[0])
+    parser.add_argument(
+        "--sizes",
+        default=",".join(SIZES),
+        help=f"comma-separated dataset sizes, of {', '.join(SIZES)}",
+    )
+    parser.add_argument("--repeat", type=int, default=5, help="timed calls each")
+    parser.add_argument("--filter", default="", help="only benchmarks containing this")
+    parser.add_argument(
+        "--results_dir", type=Path, default=RESULTS_DIR, help="where runs are saved"
+    )
+    parser.add_argument("--no-save", action="store_true", help="don't save this run")
+    parser.add_argument("--compare", help="results file or commit to compare with")
+    parser.add_argument(
+        "--max_slowdown",
+        type=float,
+        default=1.25,
+        help="ratio of best times above which --compare fails",
+    )
+    args = parser.parse_args()
+    sizes = args.sizes.split(",")
+    # before saving, so that comparing with HEAD doesn't find this run
+    reference = find_results(args.compare, args.results_dir) if args.compare else None
+    commit = _git("rev-parse", "HEAD") or "unknown"
+    run: dict[str, Any] = {
+        "commit": commit,
+        "dirty": bool(_git("status", "--porcelain", "--untracked-files=no")),
+        "timestamp": datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ"),
+        "python": platform.python_version(),
+        "machine": f"{platform.platform()} {platform.processor()}".strip(),
+        "repeat": args.repeat,
+        "results": {},
+    }
+    print(f"{'benchmark':<56} {'best':>10} {'median':>10}")
+    for name, (setup, params) in BENCHMARKS.items():
+        if args.filter not in name:
+            continue
+        for label, param in params.items():
+            if params is SIZES and label not in sizes:
+                continue
+            times = run_benchmark(setup, param, args.repeat)
+            key = f"{name}[{label}]"
+            run["results"][key] = {
+                "min": min(times),
+                "median": statistics.median(times),
+                "runs": times,
+            }
+            print(
+                f"{key:<56} {min(times) * 1000:8.2f}ms "
+                f"{statistics.median(times) * 1000:8.2f}ms"
+            )
+    if not args.no_save:
+        args.results_dir.mkdir(parents=True, exist_ok=True)
+        path = args.results_dir / f"{run['timestamp']}-{commit[:12]}.json"
+        with path.open("w", encoding="utf-8") as _f:
+            json.dump(run, _f, indent=2)
+        print(f"\nsaved {path}")
+    if reference is not None:
+        with reference.open(encoding="utf-8") as _f:
+            if compare(run, json.load(_f), args.max_slowdown):
+                sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
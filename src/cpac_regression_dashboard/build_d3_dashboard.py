@@ -1,38 +1,73 @@
-import os
-from shutil import copy
+"""Build D3 heatmap pages from correlation results, with an index page."""
+import sys
+from typing import TYPE_CHECKING
 
 import click
-from lxml import etree
+
+from cpac_regression_dashboard.utils.instrumentation import instrumented
+
+if TYPE_CHECKING:
+    from cpac_regression_dashboard.utils.d3_pages import PageResult
 
 
 @click.command()
-@click.option("--json_file", required=True, help="JSON file from correlations")
-@click.option("--branch", required=True, help="branch name")
-def main(json_file=None, branch=None):
-    outdir = f"output/{branch}"
-    os.makedirs(outdir, exist_ok=True)
-    json_filename = os.path.basename(json_file)
-    copy(json_file, "/".join([outdir, json_filename]))
-    name = json_filename.replace(f"_{branch}.json", "")
-    with open("templates/heatmap.html", "r", encoding="utf-8") as _f:
-        body = etree.HTML(_f.read())
-    script_element = etree.SubElement(body[0], "script")
-    script_element.set("defer", "defer")
-    script_element.set("src", "./heatmap.js")
-    with open("templates/heatmap.js", "r", encoding="utf-8") as _f:
-        with open(f"{outdir}/heatmap.js", "w", encoding="utf=8") as _s:
-            _s.write(
-                _f.read()
-                .replace("DATAFILE", json_filename)
-                .replace("GRAPHTITLE", branch)
-                .replace("GRAPHSUBTITLE", name)
-            )
-    body = etree.tostring(body, encoding="unicode", method="html")
-
-    with open(f"{outdir}/{name}.html", "w", encoding="utf-8") as _f:
-        _f.write(body)
-
-    return body, name, branch
+@click.option(
+    "--json_file",
+    required=True,
+    multiple=True,
+    help="JSON (or .npz) file from correlations; repeat for more pages",
+)
+@click.option(
+    "--branch",
+    required=True,
+    multiple=True,
+    help="branch name, once for all files or once per --json_file",
+)
+@click.option("--output_dir", default="output", help="where to write the pages")
+@click.option("--n_workers", type=int, default=1, help="number of worker processes")
+@click.option("--force", is_flag=True, help="rebuild pages even if up to date")
+@click.option(
+    "--order",
+    type=click.Choice(["cluster", "name"]),
+    default="cluster",
+    show_default=True,
+    help="cluster similar rows and columns together, worst first, or sort rows "
+    "by name",
+)
+@click.option(
+    "--threshold",
+    type=float,
+    default=0.98,
+    show_default=True,
+    help="coefficients below this are counted and flagged in each row's summary",
+)
+@instrumented("build_d3_dashboard")
+def main(
+    json_file: tuple[str, ...],
+    branch: tuple[str, ...],
+    output_dir: str = "output",
+    n_workers: int = 1,
+    force: bool = False,
+    order: str = "cluster",
+    threshold: float = 0.98,
+) -> "list[PageResult]":
+    """Build a page for each result file, skipping those that are up to date."""
+    from cpac_regression_dashboard.utils.d3_pages import build_pages
+
+    if len(branch) == 1:
+        branch = branch * len(json_file)
+    elif len(branch) != len(json_file):
+        msg = "give --branch once, or once per --json_file"
+        raise click.UsageError(msg)
+    results = build_pages(
+        list(zip(json_file, branch)), output_dir, n_workers, force, order, threshold
+    )
+    failures = [result for result in results if result.error]
+    for result in failures:
+        click.echo(f"{result.html}: {result.error}", err=True)
+    if failures:
+        sys.exit(1)
+    return results
 
 
 if __name__ == "__main__":
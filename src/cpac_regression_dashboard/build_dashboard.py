@@ -2,7 +2,7 @@ import os
 
 import click
 
-from cpac_regression_dashboard.utils.html_script import setup_browser, write_html
+from cpac_regression_dashboard.utils.instrumentation import instrumented
 
 
 def process_option(ctx, param, value):
@@ -17,28 +17,108 @@ def process_option(ctx, param, value):
     "--json_files",
     required=True,
     callback=process_option,
-    help="JSON files from correlations",
+    help="JSON (or .npz) files from correlations",
 )
 @click.option("--branch", required=True, help="branch name")
-def main(json_files=None, branch=None):
-    body = ""
+@click.option(
+    "--inline",
+    is_flag=True,
+    help="embed the data in the page (for viewing without a web server) instead "
+    "of writing it to separate, pre-compressed files; always on unless "
+    "--no-browser is given, as the page is opened from file://, where it can't "
+    "fetch separate files",
+)
+@click.option(
+    "--no-browser",
+    "no_browser",
+    is_flag=True,
+    help="static export: write the files and exit without opening a browser",
+)
+@click.option(
+    "--snapshot",
+    type=click.Path(dir_okay=False),
+    help="also render the heatmap to this .svg or .png file (.png needs cairosvg)",
+)
+@click.option(
+    "--order",
+    type=click.Choice(["cluster", "name"]),
+    default="cluster",
+    show_default=True,
+    help="cluster similar rows and columns together, worst first, or sort rows "
+    "by name",
+)
+@click.option(
+    "--threshold",
+    type=float,
+    default=0.98,
+    show_default=True,
+    help="coefficients below this are counted and flagged in each row's summary",
+)
+@instrumented("build_dashboard")
+def main(
+    json_files=None,
+    branch=None,
+    inline=False,
+    no_browser=False,
+    snapshot=None,
+    order="cluster",
+    threshold=0.98,
+):
+    if snapshot and not snapshot.lower().endswith((".svg", ".png")):
+        msg = "must be a .svg or .png file"
+        raise click.BadParameter(msg, param_hint="--snapshot")
+    from cpac_regression_dashboard.utils.data_assets import (
+        ordered_records,
+        write_data_assets,
+    )
+    from cpac_regression_dashboard.utils.heatmap_svg import write_snapshot
+    from cpac_regression_dashboard.utils.html_script import (
+        linked_html,
+        open_browser,
+        stream_html,
+        VENDOR_SCRIPTS,
+    )
+    from cpac_regression_dashboard.utils.records import read_records
+    from cpac_regression_dashboard.utils.static_assets import bundle_scripts
+
+    # a page opened from file:// can't fetch its data from separate files
+    inline = inline or not no_browser
     data_source = []
     for json in json_files:
-        name = os.path.basename(json)
-        data = name.replace(f"_{branch}.json", "")
+        name = os.path.splitext(os.path.basename(json))[0]
+        data = name.replace(f"_{branch}", "")
         data_source.append(data)
-        with open(json) as user_file:
-            file_contents = user_file.read()
-            body += file_contents
-    body = (body.rstrip()).rstrip(",")
-
-    html_body = write_html(body)
-    file = open("html.html", "w")
-    file.write(html_body)
-    file.close()
-    setup_browser(html_body)
-
-    return body, data_source, branch
+
+    html_path = "html.html"
+    records = (record for json in json_files for record in read_records(json))
+    manifest = None
+    with open(html_path, "w", encoding="utf-8") as file:
+        if inline:
+            manifest, records = ordered_records(records, order, threshold)
+            stream_html(file, records, bundle_scripts(".", VENDOR_SCRIPTS))
+        else:
+            manifest = write_data_assets(
+                records, ".", "html", order=order, threshold=threshold
+            )
+            file.write(
+                linked_html(
+                    "html.manifest.json",
+                    bundle_scripts(".", VENDOR_SCRIPTS, ("data_loader.js",)),
+                )
+            )
+    if snapshot:
+        write_snapshot(
+            snapshot,
+            (record for json in json_files for record in read_records(json)),
+            branch,
+            ", ".join(data_source),
+            rows=manifest and manifest.rows,
+            columns=manifest and manifest.columns,
+        )
+    if not no_browser:
+        open_browser(html_path)
+
+    return html_path, data_source, branch
 
 
 if __name__ == "__main__":
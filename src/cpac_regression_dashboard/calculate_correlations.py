@@ -1,18 +1,180 @@
 #!/usr/bin/env python
 """Calculate correlations and write them to D3-friendly file."""
-import json
+from argparse import ArgumentParser, Namespace
+import os
+import sys
+from typing import Any, Optional
 
-from cpac_correlations import cpac_correlations
+from cpac_regression_dashboard.utils.artifact_cache import (
+    default_cache_dir,
+    DEFAULT_MAX_BYTES,
+)
+from cpac_regression_dashboard.utils.instrumentation import (
+    add_arguments,
+    configure,
+    run,
+    span,
+)
+from cpac_regression_dashboard.utils.records import iter_records, save_records
 
-from cpac_regression_dashboard.utils.html_script import body
+
+def _pop_local_args() -> Namespace:
+    """Parse this package's options, leaving the rest for ``cpac_correlations``."""
+    parser = ArgumentParser(add_help=False)
+    parser.add_argument(
+        "--output_format",
+        choices=["json", "npz"],
+        default="json",
+        help="write JSON records (default) or a columnar .npz matrix",
+    )
+    parser.add_argument(
+        "--engine",
+        choices=["native", "cpac_correlations"],
+        default="native",
+        help="correlate each derivative in a process pool (default), or call "
+        "cpac_correlations",
+    )
+    parser.add_argument(
+        "--n_cpus",
+        type=int,
+        help="native engine: worker processes [default: n_cpus in the YAML file]",
+    )
+    parser.add_argument(
+        "--cache_dir",
+        default=default_cache_dir(),
+        help="where to cache correlation runs, to reuse for identical inputs",
+    )
+    parser.add_argument(
+        "--cache_max_bytes",
+        type=int,
+        default=DEFAULT_MAX_BYTES,
+        help="evict the least recently used runs beyond this total size",
+    )
+    parser.add_argument(
+        "--hash_contents",
+        action="store_true",
+        help="fingerprint input files by content instead of size and mtime",
+    )
+    parser.add_argument(
+        "--no-cache", action="store_true", help="always correlate, and cache nothing"
+    )
+    parser.add_argument(
+        "--cache_stats", action="store_true", help="print cache statistics and exit"
+    )
+    add_arguments(parser)
+    args, remaining = parser.parse_known_args(sys.argv[1:])
+    sys.argv[1:] = remaining
+    return args
+
+
+def _correlation_args(required: bool) -> Optional[Namespace]:
+    """Parse the run's YAML config, branch and data source, if all are given.
+
+    These are also what ``cpac_correlations`` reads, so they are left in place.
+    """
+    parser = ArgumentParser(add_help=False)
+    parser.add_argument("input_yaml", nargs=None if required else "?")
+    parser.add_argument("--branch", required=required)
+    parser.add_argument("--data_source", required=required)
+    args, _ = parser.parse_known_args(sys.argv[1:])
+    if args.input_yaml and args.branch and args.data_source:
+        return args
+    return None
+
+
+def _native_correlations(
+    config: dict[str, Any], target: Namespace, n_cpus: Optional[int]
+) -> list[str]:
+    """Correlate each derivative in a process pool, and write them as text too."""
+    from cpac_regression_dashboard.utils.correlate import correlate_pipelines
+
+    all_keys = []
+    for result in correlate_pipelines(config, n_cpus):
+        if result.error:
+            print(f"{result.key}: {result.error}", file=sys.stderr)
+        all_keys.append(f"{result.key}: {result.r}")
+    settings = config["settings"]
+    run_name = settings.get("run_name") or f"{target.branch}_{target.data_source}"
+    os.makedirs(settings["correlations_dir"], exist_ok=True)
+    with open(
+        os.path.join(settings["correlations_dir"], f"{run_name}_correlations.txt"),
+        "w",
+        encoding="utf-8",
+    ) as _f:
+        _f.writelines(f"{key}\n" for key in all_keys)
+    return all_keys
+
+
+def _correlate(args: Namespace) -> tuple[list[str], str, str]:
+    """Correlate, or reuse a cached run with the same inputs."""
+    native = args.engine == "native"
+    target = _correlation_args(required=native)
+    if target is None:
+        # cpac_correlations reads its arguments itself
+        from cpac_correlations import cpac_correlations
+
+        with span("cpac_correlations"):
+            return cpac_correlations()
+    import yaml
+
+    from cpac_regression_dashboard.utils.artifact_cache import (
+        ArtifactCache,
+        changed_files,
+        fingerprint,
+        snapshot,
+    )
+
+    with open(target.input_yaml, "r", encoding="utf-8") as _f:
+        config = yaml.safe_load(_f)
+    correlations_dir = config["settings"]["correlations_dir"]
+    run_name = config["settings"].get("run_name")
+    data_source, branch = target.data_source, target.branch
+    cache = None
+    if not args.no_cache:
+        cache = ArtifactCache(args.cache_dir, args.cache_max_bytes)
+        key = fingerprint(config, args.hash_contents, args.engine)
+        all_keys = cache.get(key, correlations_dir, run_name)
+        if all_keys is not None:
+            print(f"correlation cache hit ({cache.stats()})", file=sys.stderr)
+            cache.close()
+            return all_keys, data_source, branch
+    before = snapshot(correlations_dir)
+    if native:
+        with span("native_correlations"):
+            all_keys = _native_correlations(config, target, args.n_cpus)
+    else:
+        from cpac_correlations import cpac_correlations
+
+        with span("cpac_correlations"):
+            all_keys, data_source, branch = cpac_correlations()
+    if cache is not None:
+        cache.put(
+            key,
+            list(all_keys),
+            correlations_dir,
+            changed_files(correlations_dir, before),
+            run_name,
+        )
+        print(f"correlation cache miss ({cache.stats()})", file=sys.stderr)
+        cache.close()
+    return all_keys, data_source, branch
 
 
 def main() -> None:
     """Gather correlation coefficients and write them to D3-readable JSON."""
-    all_keys, data_source, branch = cpac_correlations()
-    html_body = body(all_keys, data_source)
-    with open(f"{data_source}_{branch}.json", "w", encoding="utf-8") as file:
-        file.write(json.dumps(json.loads(f"[{html_body.strip().strip(',')}]")))
+    args = _pop_local_args()
+    if args.cache_stats:
+        from cpac_regression_dashboard.utils.artifact_cache import ArtifactCache
+
+        print(ArtifactCache(args.cache_dir, args.cache_max_bytes).stats())
+        return
+    configure(args.trace, args.profile, args.cprofile_dir)
+    with run("cpac_regsuite_correlate"):
+        all_keys, data_source, branch = _correlate(args)
+        save_records(
+            f"{data_source}_{branch}.{args.output_format}",
+            iter_records(all_keys, data_source),
+        )
 
 
 main.__doc__ = __doc__
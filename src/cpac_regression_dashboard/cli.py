@@ -0,0 +1,147 @@
+#!/usr/bin/env python
+"""Run every regression suite tool as a subcommand of ``cpac_regsuite``.
+
+Subcommands are imported only when they are run (or asked for their own help),
+so ``cpac_regsuite --help`` and ``--version`` load nothing but :py:mod:`click`.
+"""
+from importlib import import_module
+import sys
+from typing import Any, Callable, Optional
+
+import click
+
+COMMANDS: dict[str, tuple[str, str]] = {
+    "build_d3_dashboard": (
+        "cpac_regression_dashboard.build_d3_dashboard:main",
+        "Build D3 heatmap pages, with an index page.",
+    ),
+    "build_dashboard": (
+        "cpac_regression_dashboard.build_dashboard:main",
+        "Write the dashboard and open it in a browser.",
+    ),
+    "convert": (
+        "cpac_regression_dashboard.convert_results:main",
+        "Convert results between JSON records and columnar .npz.",
+    ),
+    "correlate": (
+        "cpac_regression_dashboard.calculate_correlations:main",
+        "Calculate correlations and write D3-friendly results.",
+    ),
+    "create_yaml": (
+        "cpac_regression_dashboard.create_yml:main",
+        "Write the YAML config to correlate two output directories.",
+    ),
+    "delta": (
+        "cpac_regression_dashboard.delta:main",
+        "Report coefficients that got worse against a baseline.",
+    ),
+    "generate_comment": (
+        "cpac_regression_dashboard.generate_comment:main",
+        "Comment the results on a GitHub commit and its PRs.",
+    ),
+    "history": (
+        "cpac_regression_dashboard.history:main",
+        "Track correlation results across branches and commits.",
+    ),
+    "run": (
+        "cpac_regression_dashboard.run:main",
+        "Rebuild the whole report, skipping up-to-date steps.",
+    ),
+    "watch": (
+        "cpac_regression_dashboard.watch:main",
+        "Rebuild D3 heatmap pages as result files are written.",
+    ),
+}
+"""Subcommand name: (``module:function``, one-line help)."""
+
+
+def _passthrough(
+    name: str, function: Callable[[], Any], short_help: str
+) -> click.Command:
+    """Wrap an argparse ``main()`` that reads its own options from ``sys.argv``."""
+
+    @click.command(
+        name,
+        help=short_help,
+        add_help_option=False,
+        context_settings={"ignore_unknown_options": True},
+    )
+    @click.argument("args", nargs=-1, type=click.UNPROCESSED)
+    def command(args: tuple[str, ...]) -> None:
+        sys.argv = [f"cpac_regsuite {name}", *args]
+        function()
+
+    return command
+
+
+class LazyGroup(click.Group):
+    """A command group that imports each subcommand on first use."""
+
+    def __init__(
+        self,
+        *args: Any,  # noqa: ANN401
+        lazy_commands: Optional[dict[str, tuple[str, str]]] = None,
+        **kwargs: Any,  # noqa: ANN401
+    ) -> None:
+        """Register ``lazy_commands`` (see :data:`COMMANDS`) without importing."""
+        super().__init__(*args, **kwargs)
+        self.lazy_commands = lazy_commands or {}
+
+    def list_commands(self, ctx: click.Context) -> list[str]:
+        """List loaded and lazy subcommands."""
+        return sorted({*super().list_commands(ctx), *self.lazy_commands})
+
+    def get_command(self, ctx: click.Context, cmd_name: str) -> Optional[click.Command]:
+        """Import a lazy subcommand, if it hasn't been yet."""
+        if cmd_name in self.lazy_commands and cmd_name not in self.commands:
+            target, short_help = self.lazy_commands[cmd_name]
+            module, _, attribute = target.partition(":")
+            command = getattr(import_module(module), attribute)
+            if not isinstance(command, click.Command):
+                command = _passthrough(cmd_name, command, short_help)
+            self.add_command(command, cmd_name)
+        return super().get_command(ctx, cmd_name)
+
+    def format_commands(
+        self, ctx: click.Context, formatter: click.HelpFormatter
+    ) -> None:
+        """List subcommands with their registered help, importing none of them."""
+        rows = [
+            (
+                name,
+                self.lazy_commands[name][1]
+                if name in self.lazy_commands
+                else self.commands[name].get_short_help_str(),
+            )
+            for name in self.list_commands(ctx)
+        ]
+        if rows:
+            with formatter.section("Commands"):
+                formatter.write_dl(rows)
+
+
+def _print_version(ctx: click.Context, _param: click.Parameter, value: bool) -> None:
+    """Print the version, which is only looked up when asked for."""
+    if not value or ctx.resilient_parsing:
+        return
+    from cpac_regression_dashboard._version import __version__
+
+    click.echo(f"cpac_regsuite {__version__}")
+    ctx.exit()
+
+
+@click.group(cls=LazyGroup, lazy_commands=COMMANDS)
+@click.option(
+    "--version",
+    is_flag=True,
+    expose_value=False,
+    is_eager=True,
+    callback=_print_version,
+    help="Show the version and exit.",
+)
+def main() -> None:
+    """Run a C-PAC regression suite tool; see `cpac_regsuite COMMAND --help`."""
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+#!/usr/bin/env python
+"""Convert correlation results between JSON records and columnar ``.npz``."""
+import click
+
+from cpac_regression_dashboard.utils.instrumentation import instrumented
+
+
+@click.command()
+@click.argument("input_file", type=click.Path(exists=True, dir_okay=False))
+@click.argument("output_file", type=click.Path(dir_okay=False))
+@click.option(
+    "--dtype",
+    type=click.Choice(["float32", "float64"]),
+    default="float64",
+    show_default=True,
+    help="Value precision when writing .npz; float64 round-trips any JSON value, "
+    "float32 halves the size but keeps only about 6 significant digits",
+)
+@instrumented("cpac_regsuite_convert")
+def main(input_file: str, output_file: str, dtype: str) -> None:
+    """Convert INPUT_FILE to OUTPUT_FILE, each JSON or .npz by extension."""
+    from cpac_regression_dashboard.utils.records import read_records, write_records
+
+    records = read_records(input_file)
+    if output_file.endswith(".npz"):
+        import numpy as np
+
+        from cpac_regression_dashboard.utils.columnar import records_to_npz
+
+        count = int(
+            records_to_npz(records, output_file, np.dtype(dtype).type).present.sum()
+        )
+    else:
+        count = write_records(output_file, records)
+    click.echo(f"Wrote {count} records to {output_file}")
+
+
+if __name__ == "__main__":
+    main()
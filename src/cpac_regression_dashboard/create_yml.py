@@ -1,28 +1,129 @@
 import os
+import sys
 
 import click
 
-from cpac_regression_dashboard.utils.parse_yaml import cpac_yaml
+from cpac_regression_dashboard.utils.instrumentation import instrumented
 
 
 @click.command()
 @click.option(
     "--pipeline1",
-    required=True,
     type=str,
     help="Path to output directory from CPAC run " "to correlate against pipeline2",
 )
 @click.option(
     "--pipeline2",
-    required=True,
     type=str,
     help="Path to output directory from CPAC run " "to correlate against pipeline1",
 )
 @click.option("--workspace", type=str, help="directory to save correlations")
 @click.option("--branch", type=str, help="branch name")
 @click.option("--data_source", type=str, help="Data site")
-def main(pipeline1, pipeline2, workspace, branch, data_source) -> None:
+@click.option(
+    "--max_depth",
+    type=int,
+    default=None,
+    help="Don't look for pipeline directories deeper than this",
+)
+@click.option(
+    "--manifest",
+    type=click.Path(exists=True, dir_okay=False),
+    help="Batch mode: YAML list of pipeline1/pipeline2(/data_source) mappings",
+)
+@click.option(
+    "--root1",
+    type=click.Path(exists=True, file_okay=False),
+    help="Batch mode: directory containing sub-* output directories "
+    "to correlate against root2",
+)
+@click.option(
+    "--root2",
+    type=click.Path(exists=True, file_okay=False),
+    help="Batch mode: directory containing sub-* output directories "
+    "to correlate against root1",
+)
+@click.option(
+    "--n_workers",
+    type=int,
+    default=1,
+    show_default=True,
+    help="Batch mode: number of worker processes",
+)
+@click.option(
+    "--n_cpus",
+    type=int,
+    default=1,
+    show_default=True,
+    help="Worker processes for correlating, written to each YAML file",
+)
+@click.option(
+    "--cache_file",
+    type=click.Path(dir_okay=False),
+    help="Directory scan cache [default: ~/.cache/cpac_regsuite/scans.sqlite]",
+)
+@click.option(
+    "--no-cache",
+    "no_cache",
+    is_flag=True,
+    help="Rescan every directory instead of reusing cached scans",
+)
+@instrumented("cpac_regsuite_create_yaml")
+def main(  # noqa: PLR0913
+    pipeline1,
+    pipeline2,
+    workspace,
+    branch,
+    data_source,
+    max_depth,
+    manifest,
+    root1,
+    root2,
+    n_workers,
+    n_cpus,
+    cache_file,
+    no_cache,
+) -> None:
     """Correlate outputs from regression run again another C-PAC version."""
+    from cpac_regression_dashboard.utils.batch import (
+        pair_subjects,
+        read_manifest,
+        run_batch,
+    )
+    from cpac_regression_dashboard.utils.parse_yaml import cpac_yaml
+    from cpac_regression_dashboard.utils.scan_cache import ScanCache
+
+    cache = None
+    if not no_cache:
+        cache = ScanCache(cache_file)
+    if manifest or root1 or root2:
+        unmatched = None
+        if manifest:
+            try:
+                pairs = read_manifest(manifest)
+            except ValueError as error:
+                raise click.BadParameter(str(error), param_hint="--manifest")
+        elif root1 and root2:
+            pairs, unmatched = pair_subjects(root1, root2)
+        else:
+            raise click.UsageError("--root1 and --root2 must be given together.")
+        index, results = run_batch(
+            pairs, workspace, branch, n_workers, max_depth, cache, n_cpus, unmatched
+        )
+        failures = [result for result in results if result.error]
+        for failure in failures:
+            click.echo(f"{failure.data_source}: {failure.error}", err=True)
+        click.echo(
+            f"Wrote {len(results) - len(failures)} of {len(results)} YAML files; "
+            f"see {index}"
+        )
+        if failures:
+            sys.exit(1)
+        return
+    if not (pipeline1 and pipeline2):
+        raise click.UsageError(
+            "Give --pipeline1 and --pipeline2, or --manifest, or --root1 and --root2."
+        )
     os.path.normpath(os.path.dirname(os.path.abspath(__file__)) + os.sep + os.pardir)
     run_name = f"{branch}_{data_source}"
 
@@ -31,9 +132,11 @@ def main(pipeline1, pipeline2, workspace, branch, data_source) -> None:
         pipeline2,
         f"{workspace}/correlations",
         run_name,
-        1,
+        n_cpus,
         branch,
         data_source,
+        max_depth,
+        cache,
     )
 
 
@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+"""Report correlation coefficients that got worse between two result sets."""
+import json
+import sys
+from typing import Optional
+
+import click
+
+from cpac_regression_dashboard.utils.instrumentation import instrumented
+
+_files = click.Path(exists=True, dir_okay=False)
+
+
+@click.command()
+@click.option(
+    "--baseline",
+    required=True,
+    multiple=True,
+    type=_files,
+    help="JSON (or .npz) results to compare against, e.g. the previous release; "
+    "repeat for more sites",
+)
+@click.option(
+    "--candidate",
+    required=True,
+    multiple=True,
+    type=_files,
+    help="JSON (or .npz) results to check; repeat for more sites",
+)
+@click.option(
+    "--tolerance",
+    type=float,
+    default=0.0,
+    show_default=True,
+    help="only report drops larger than this",
+)
+@click.option(
+    "--json",
+    "json_file",
+    type=click.Path(dir_okay=False),
+    help="write a JSON report here",
+)
+@click.option(
+    "--markdown",
+    type=click.Path(dir_okay=False),
+    help="write a Markdown report here (a *.md file in the correlations directory "
+    "is included by cpac_regsuite_generate_comment)",
+)
+@click.option(
+    "--heatmap",
+    type=click.Path(dir_okay=False),
+    help="render the deltas to this .svg or .png file (.png needs cairosvg)",
+)
+@click.option(
+    "--fail_on_regression",
+    is_flag=True,
+    help="exit with status 1 if anything got worse",
+)
+@instrumented("cpac_regsuite_delta")
+def main(
+    baseline: tuple[str, ...],
+    candidate: tuple[str, ...],
+    tolerance: float,
+    json_file: Optional[str],
+    markdown: Optional[str],
+    heatmap: Optional[str],
+    fail_on_regression: bool,
+) -> None:
+    """Compare CANDIDATE results with BASELINE results, feature by feature."""
+    if heatmap and not heatmap.lower().endswith((".svg", ".png")):
+        msg = "must be a .svg or .png file"
+        raise click.BadParameter(msg, param_hint="--heatmap")
+    from cpac_regression_dashboard.utils.delta import (
+        compare,
+        DELTA_DOMAIN,
+        load_matrix,
+    )
+    from cpac_regression_dashboard.utils.heatmap_svg import (
+        sequential_color,
+        write_snapshot,
+    )
+
+    report = compare(load_matrix(baseline), load_matrix(candidate))
+    regressions = report.regressions(tolerance)
+    if json_file:
+        with open(json_file, "w", encoding="utf-8") as _f:
+            json.dump(report.to_dict(tolerance), _f, indent=2)
+    if markdown:
+        with open(markdown, "w", encoding="utf-8") as _f:
+            _f.write(report.to_markdown(tolerance))
+    if heatmap:
+        write_snapshot(
+            heatmap,
+            report.delta_records(),
+            "Change in correlation",
+            f"{', '.join(candidate)} vs. {', '.join(baseline)}",
+            sequential_color(DELTA_DOMAIN),
+        )
+    click.echo(
+        f"{len(regressions)} of {report.compared} coefficients got worse"
+        f"; {report.new} new in the candidate"
+    )
+    for regression in regressions[:10]:
+        candidate_value = (
+            "lost" if regression.candidate is None else f"{regression.candidate:.6g}"
+        )
+        click.echo(
+            f"  {regression.feature} @ {regression.site}: "
+            f"{regression.baseline:.6g} -> {candidate_value}"
+        )
+    if fail_on_regression and regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+"""Track correlation results across branches and commits."""
+import os
+from typing import Optional
+
+import click
+
+from cpac_regression_dashboard.utils.history import (
+    HISTORY_FILENAME,
+    HistoryStore,
+    site_from_filename,
+)
+from cpac_regression_dashboard.utils.instrumentation import instrumented
+from cpac_regression_dashboard.utils.records import save_records
+
+_store_option = click.option(
+    "--store",
+    type=click.Path(dir_okay=False),
+    default=HISTORY_FILENAME,
+    show_default=True,
+    help="SQLite history file",
+)
+
+
+@click.group()
+def main() -> None:
+    """Track correlation results across branches and commits."""
+
+
+@main.command()
+@click.argument(
+    "json_files", nargs=-1, required=True, type=click.Path(exists=True, dir_okay=False)
+)
+@click.option("--branch", required=True, help="branch name")
+@click.option("--sha", envvar="SHA", required=True, help="commit SHA [default: $SHA]")
+@_store_option
+@instrumented("cpac_regsuite_history ingest")
+def ingest(json_files: tuple[str, ...], branch: str, sha: str, store: str) -> None:
+    """Add {data_source}_{branch}.json (or .npz) files, skipping any seen before."""
+    with HistoryStore(store) as history:
+        for json_file in json_files:
+            count = history.ingest(json_file, branch, sha)
+            site = site_from_filename(json_file, branch)
+            if count is None:
+                click.echo(f"{json_file}: already ingested")
+            else:
+                click.echo(f"{json_file}: {count} records for {site} @ {sha[:7]}")
+
+
+@main.command()
+@click.option("--below", type=float, help="only coefficients below this")
+@click.option("--last", type=int, help="only the N most recently ingested runs")
+@click.option("--branch", help="only this branch")
+@click.option("--sha", help="only this commit")
+@click.option("--site", help="only this data source")
+@click.option("--feature", help="only this feature")
+@_store_option
+@instrumented("cpac_regsuite_history query")
+def query(
+    below: Optional[float],
+    last: Optional[int],
+    branch: Optional[str],
+    sha: Optional[str],
+    site: Optional[str],
+    feature: Optional[str],
+    store: str,
+) -> None:
+    """Print matching correlations as tab-separated values."""
+    with HistoryStore(store) as history:
+        click.echo("branch\tsha\tsite\tfeature\tvalue")
+        for row in history.query(below, last, branch, sha, site, feature):
+            click.echo("\t".join(str(field) for field in row))
+
+
+@main.command()
+@click.argument("output_file", type=click.Path(dir_okay=False))
+@click.option("--below", type=float, help="only coefficients below this")
+@click.option("--last", type=int, help="only the N most recently ingested runs")
+@click.option("--branch", help="only this branch")
+@click.option("--sha", help="only this commit")
+@click.option("--site", help="only this data source")
+@click.option("--feature", help="only this feature")
+@click.option(
+    "--by_run",
+    is_flag=True,
+    help="one column per run and site instead of per site, which holds the newest "
+    "run's value",
+)
+@_store_option
+@instrumented("cpac_regsuite_history export")
+def export(
+    output_file: str,
+    below: Optional[float],
+    last: Optional[int],
+    branch: Optional[str],
+    sha: Optional[str],
+    site: Optional[str],
+    feature: Optional[str],
+    by_run: bool,
+    store: str,
+) -> None:
+    """Write matching correlations to OUTPUT_FILE (JSON or .npz) for dashboards."""
+    with HistoryStore(store) as history:
+        count = save_records(
+            output_file,
+            history.export_records(
+                by_run,
+                below=below,
+                last=last,
+                branch=branch,
+                sha=sha,
+                site=site,
+                feature=feature,
+            ),
+        )
+    click.echo(f"Wrote {count} records to {os.path.abspath(output_file)}")
+
+
+if __name__ == "__main__":
+    main()
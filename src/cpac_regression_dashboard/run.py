@@ -0,0 +1,126 @@
+"""Rebuild a whole regression report, skipping steps that are up to date."""
+import os
+import sys
+from typing import Optional
+
+import click
+
+from cpac_regression_dashboard.utils.instrumentation import instrumented
+
+
+@click.command()
+@click.option(
+    "--manifest",
+    type=click.Path(exists=True, dir_okay=False),
+    help="YAML list of pipeline1/pipeline2(/data_source) mappings",
+)
+@click.option(
+    "--root1",
+    type=click.Path(exists=True, file_okay=False),
+    help="directory containing sub-* output directories to correlate against root2",
+)
+@click.option(
+    "--root2",
+    type=click.Path(exists=True, file_okay=False),
+    help="directory containing sub-* output directories to correlate against root1",
+)
+@click.option("--workspace", default=".", show_default=True, help="where to build")
+@click.option("--branch", required=True, help="branch name")
+@click.option(
+    "--n_jobs",
+    type=int,
+    default=1,
+    show_default=True,
+    help="steps to run at once, e.g. correlating several data sources",
+)
+@click.option(
+    "--n_cpus",
+    type=int,
+    default=1,
+    show_default=True,
+    help="worker processes for correlating each data source",
+)
+@click.option(
+    "--snapshot",
+    type=click.Choice(["png", "svg"]),
+    default="png",
+    show_default=True,
+    help="heatmap image format (.png needs cairosvg)",
+)
+@click.option(
+    "--comment",
+    is_flag=True,
+    help="also comment the results on GitHub (see generate_comment --help)",
+)
+@click.option("--force", is_flag=True, help="run every step, even if up to date")
+@click.option("--dry_run", is_flag=True, help="list the steps that would run, and exit")
+@instrumented("cpac_regsuite_run")
+def main(  # noqa: PLR0913
+    manifest: Optional[str],
+    root1: Optional[str],
+    root2: Optional[str],
+    workspace: str,
+    branch: str,
+    n_jobs: int = 1,
+    n_cpus: int = 1,
+    snapshot: str = "png",
+    comment: bool = False,
+    force: bool = False,
+    dry_run: bool = False,
+) -> None:
+    """Correlate each pair of output directories and build every page and image.
+
+    Each step is skipped if its command, the content of the files it reads and
+    writes, and (for correlations) the output directories are unchanged since it
+    last succeeded, so a failed or interrupted run resumes where it stopped.
+    Each step's output is logged to WORKSPACE/logs.
+    """
+    from cpac_regression_dashboard.utils.batch import pair_subjects, read_manifest
+    from cpac_regression_dashboard.utils.report_tasks import report_tasks
+    from cpac_regression_dashboard.utils.tasks import STATE_FILENAME, TaskRunner
+
+    if manifest:
+        try:
+            pairs = read_manifest(manifest)
+        except ValueError as error:
+            raise click.BadParameter(str(error), param_hint="--manifest")
+    elif root1 and root2:
+        pairs, unmatched = pair_subjects(root1, root2)
+        for skipped in unmatched:
+            click.echo(f"{skipped.data_source}: {skipped.error}", err=True)
+    else:
+        raise click.UsageError("Give --manifest, or --root1 and --root2.")
+    if not pairs:
+        raise click.UsageError("No pairs of output directories to correlate.")
+    runner = TaskRunner(
+        report_tasks(pairs, workspace, branch, n_cpus, snapshot, comment),
+        os.path.join(workspace, STATE_FILENAME),
+        n_jobs,
+        force,
+        os.path.join(workspace, "logs"),
+    )
+    results = runner.run(dry_run)
+    for result in results:
+        line = f"{result.status:>10}  {result.name}"
+        if result.duration:
+            line += f" ({result.duration:.1f} s)"
+        if result.error:
+            line += f": {result.error}"
+            if result.log:
+                line += f"; see {result.log}"
+        click.echo(line, err=bool(result.error))
+    failed = [result for result in results if result.status in ("failed", "blocked")]
+    ran = sum(result.status == "ran" for result in results)
+    click.echo(
+        f"{ran} ran, {len(results) - ran - len(failed)} up to date, "
+        f"{len(failed)} failed or blocked"
+        if not dry_run
+        else f"{sum(result.status == 'would run' for result in results)} of "
+        f"{len(results)} steps would run"
+    )
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+// Load a dataset written by cpac_regression_dashboard.utils.data_assets: a
+// manifest plus chunks of records, each also pre-compressed as ".gz".
+
+// fetch JSON, preferring the gzipped copy where the browser can decompress it
+async function fetchDataAsset(url) {
+  if (typeof DecompressionStream !== "undefined") {
+    try {
+      var compressed = await fetch(url + ".gz");
+      if (compressed.ok) {
+        return await new Response(
+          compressed.body.pipeThrough(new DecompressionStream("gzip"))
+        ).json();
+      }
+    } catch (error) {
+      // e.g. the server already decoded it; fall back to the plain file
+    }
+  }
+  var response = await fetch(url);
+  if (!response.ok) {
+    throw new Error(url + ": " + response.status);
+  }
+  return response.json();
+}
+
+// call onManifest with the manifest, then onChunk with each chunk's records as
+// it arrives
+function loadCorrelationData(manifestUrl, onManifest, onChunk) {
+  var base = manifestUrl.slice(0, manifestUrl.lastIndexOf("/") + 1);
+  return fetchDataAsset(manifestUrl).then(function(manifest) {
+    if (onManifest) {
+      onManifest(manifest);
+    }
+    return Promise.all(manifest.chunks.map(function(chunk) {
+      return fetchDataAsset(base + chunk.file).then(function(data) {
+        onChunk(data, chunk);
+      });
+    }));
+  });
+}
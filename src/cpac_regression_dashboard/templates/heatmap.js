@@ -1,3 +1,7 @@
+// page settings from this script tag's data-datafile (a data_assets manifest),
+// data-title and data-subtitle
+var config = document.currentScript.dataset;
+
 // set the dimensions and margins of the graph
 var margin = {top: 80, right: 25, bottom: 30, left: 40},
   width = 800 - margin.left - margin.right,
@@ -13,18 +17,81 @@ var svg = d3.select("#heatmap-container")
     .attr("transform",
           "translate(" + margin.left + "," + margin.top + ")");
 
-//Read the data
-datasource = d3.json("DATAFILE");
-datasource.then(function(data) {
+// Build color scale
+var myColor = d3.scaleSequential()
+  .interpolator(d3.interpolateRdYlGn)
+  .domain([0.8, 1]);
+
+// Create a tooltip
+var tooltip = d3.select("#my_dataviz")
+  .append("div")
+  .style("opacity", 0)
+  .attr("class", "tooltip")
+  .style("background-color", "white")
+  .style("border", "solid")
+  .style("border-width", "2px")
+  .style("border-radius", "5px")
+  .style("padding", "5px");
+
+// Three functions that change the tooltip when user hovers / moves / leaves a cell
+var mouseover = function(d) {
+  tooltip
+    .style("opacity", 1);
+  d3.select(this)
+    .style("stroke", "black")
+    .style("opacity", 1);
+};
+
+// per-row summaries from the manifest (min, mean, below threshold), by row
+var rowStats = {}, threshold;
+
+var describeRow = function(rowid) {
+  var stats = rowStats[rowid];
+  if (!stats) {
+    return "";
+  }
+  return "<br>row min " + stats.min + ", mean " +
+    (stats.mean === null ? null : stats.mean.toFixed(4)) + ", " +
+    stats.below + " below " + threshold;
+};
+
+var mousemove = function(event, d) {
+  tooltip
+    .html(d.rowid + ": " + d.value + describeRow(d.rowid))
+    .style("left", (d3.pointer(event)[0] + 70) + "px")
+    .style("top", (d3.pointer(event)[1]) + "px");
+};
 
-  data.sort(function(a, b) { return d3.descending(a.rowid, b.rowid) });
-  // Labels of row and columns -> unique identifier of the column called 'group' and 'variable'
-  var groupedData = d3.group(data, d => d.columnid);
-  var myGroups = Array.from(groupedData.keys());
-  var myVars = Array.from(d3.group(data, d => d.rowid).keys());
+var mouseleave = function(d) {
+  tooltip
+    .style("opacity", 0);
+  d3.select(this)
+    .style("stroke", "none")
+    .style("opacity", 0.8);
+};
+
+var x, y;
+
+//Read the data, drawing each chunk as it arrives
+loadCorrelationData(config.datafile, function(manifest) {
+
+  // Labels of row and columns, in the order they are drawn (rows bottom to
+  // top), as ordered by cpac_regression_dashboard.utils.analysis
+  var myGroups = manifest.columns;
+  var myVars = manifest.rows;
+  threshold = manifest.threshold;
+  if (manifest.row_stats && manifest.row_stats.min) {
+    myVars.forEach(function(row, i) {
+      rowStats[row] = {
+        min: manifest.row_stats.min[i],
+        mean: manifest.row_stats.mean[i],
+        below: manifest.row_stats.below[i]
+      };
+    });
+  }
 
   // Build X scales and axis:
-  var x = d3.scaleBand()
+  x = d3.scaleBand()
     .domain(myGroups)
     .range([0, width])
     .padding(0.05);
@@ -36,56 +103,23 @@ datasource.then(function(data) {
     .select(".domain").remove();
 
   // Build Y scales and axis:
-  var y = d3.scaleBand()
+  y = d3.scaleBand()
     .domain(myVars)
     .range([height, 0])
     .padding(0.05);
 
-  svg.append("g")
+  var yAxis = svg.append("g")
     .style("font-size", 15)
     .attr("transform", "translate(" + width + ",0)")
-    .call(d3.axisLeft(y).tickSize(0))
-    .select(".domain").remove();
+    .call(d3.axisLeft(y).tickSize(0));
+  yAxis.select(".domain").remove();
+  // flag rows with coefficients below the threshold
+  yAxis.selectAll(".tick text")
+    .filter(function(row) { return rowStats[row] && rowStats[row].below > 0; })
+    .style("fill", "#d73027")
+    .style("font-weight", "bold");
 
-  // Build color scale
-  var myColor = d3.scaleSequential()
-    .interpolator(d3.interpolateRdYlGn)
-    .domain([0.8, 1]);
-
-  // Create a tooltip
-  var tooltip = d3.select("#my_dataviz")
-    .append("div")
-    .style("opacity", 0)
-    .attr("class", "tooltip")
-    .style("background-color", "white")
-    .style("border", "solid")
-    .style("border-width", "2px")
-    .style("border-radius", "5px")
-    .style("padding", "5px");
-
-  // Three functions that change the tooltip when user hovers / moves / leaves a cell
-  var mouseover = function(d) {
-    tooltip
-      .style("opacity", 1);
-    d3.select(this)
-      .style("stroke", "black")
-      .style("opacity", 1);
-  };
-
-  var mousemove = function(d) {
-    tooltip
-      .html(d.rowid + ": " + d.value)
-      .style("left", (d3.pointer(this)[0] + 70) + "px")
-      .style("top", (d3.pointer(this)[1]) + "px");
-  };
-
-  var mouseleave = function(d) {
-    tooltip
-      .style("opacity", 0);
-    d3.select(this)
-      .style("stroke", "none")
-      .style("opacity", 0.8);
-  };
+}, function(data) {
 
   // Add the squares
   svg.selectAll()
@@ -113,7 +147,7 @@ svg.append("text")
   .attr("y", -50)
   .attr("text-anchor", "left")
   .style("font-size", "22px")
-  .text("GRAPHTITLE");
+  .text(config.title);
 
 // Add subtitle to graph
 svg.append("text")
@@ -123,4 +157,4 @@ svg.append("text")
   .style("font-size", "14px")
   .style("fill", "grey")
   .style("max-width", 400)
-  .text("GRAPHSUBTITLE");
+  .text(config.subtitle);
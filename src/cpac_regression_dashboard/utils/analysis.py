@@ -0,0 +1,231 @@
+"""Summaries, ordering and an overview of a correlation matrix, for heatmaps.
+
+Rows (features) and columns (data sources) are summarized by their minimum, mean
+and number of coefficients below a threshold, and can be reordered so that
+similar rows sit together, worst first: by hierarchical (Ward) clustering if
+:py:mod:`scipy` is installed, otherwise along the leading principal component.
+Matrices with more rows than fit on a page also get a down-sampled overview.
+"""
+from dataclasses import dataclass
+from typing import Any, Optional
+
+import numpy as np
+
+from cpac_regression_dashboard.utils.columnar import CorrelationMatrix
+from cpac_regression_dashboard.utils.instrumentation import count, span
+
+DEFAULT_THRESHOLD: float = 0.98
+"""Coefficients below this count against their row and column."""
+ORDERS: tuple[str, ...] = ("cluster", "name")
+"""Row and column orders: by similarity, or rows by name as before."""
+MAX_LINKAGE: int = 2000
+"""Most rows clustered one by one; larger matrices cluster groups of rows."""
+OVERVIEW_ROWS: int = 500
+"""Matrices with more rows than this get an overview of at most this many."""
+
+
+def _to_list(array: np.ndarray) -> list[Optional[float]]:
+    """Convert to a JSON-friendly list, with ``None`` for ``nan``."""
+    return [None if np.isnan(value) else value for value in array.tolist()]
+
+
+@dataclass
+class AxisStats:
+    """Summaries of each row (or each column) of a matrix."""
+
+    min: np.ndarray
+    """Smallest coefficient, ``nan`` if none."""
+    mean: np.ndarray
+    """Mean coefficient, ``nan`` if none."""
+    below: np.ndarray
+    """Number of coefficients below the threshold."""
+    missing: np.ndarray
+    """Number of cells with a record but no finite coefficient."""
+
+    def to_dict(self) -> dict[str, list]:
+        """Return a JSON-serializable mapping of lists."""
+        return {
+            "min": _to_list(self.min),
+            "mean": _to_list(self.mean),
+            "below": self.below.tolist(),
+            "missing": self.missing.tolist(),
+        }
+
+    def take(self, order: np.ndarray) -> "AxisStats":
+        """Reorder, e.g. like the rows of a heatmap."""
+        return AxisStats(
+            self.min[order], self.mean[order], self.below[order], self.missing[order]
+        )
+
+
+def axis_stats(
+    values: np.ndarray, present: np.ndarray, axis: int, threshold: float
+) -> AxisStats:
+    """Summarize each row (``axis=1``) or column (``axis=0``) of a matrix."""
+    finite = np.isfinite(values)
+    n = finite.sum(axis=axis)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = np.where(finite, values, 0).sum(axis=axis, dtype=np.float64) / n
+    minimum = np.where(finite, values, np.inf).min(axis=axis, initial=np.inf)
+    minimum = np.where(n > 0, minimum, np.nan).astype(np.float64)
+    below = (finite & (np.where(finite, values, np.inf) < threshold)).sum(axis=axis)
+    missing = (present & ~finite).sum(axis=axis)
+    return AxisStats(minimum, mean, below, missing)
+
+
+def _filled(values: np.ndarray) -> np.ndarray:
+    """Replace missing coefficients with their column's mean (or 1)."""
+    data = np.array(values, dtype=np.float64)
+    finite = np.isfinite(data)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        column_means = np.where(finite, data, 0).sum(axis=0) / finite.sum(axis=0)
+    column_means[~np.isfinite(column_means)] = 1.0
+    return np.where(finite, data, column_means)
+
+
+def _principal_order(data: np.ndarray) -> np.ndarray:
+    """Order observations along their leading principal component."""
+    centered = data - data.mean(axis=0)
+    if not centered.any():
+        return np.arange(len(data))
+    _, _, components = np.linalg.svd(centered, full_matrices=False)
+    return np.argsort(centered @ components[0], kind="stable")
+
+
+def cluster_order(data: np.ndarray, max_linkage: int = MAX_LINKAGE) -> np.ndarray:
+    """Order observations (rows of ``data``) so that similar ones are adjacent.
+
+    Observations are clustered hierarchically (Ward linkage) and listed in
+    dendrogram order. Beyond ``max_linkage`` observations, they are first cut
+    into ``max_linkage`` runs along the leading principal component, and the
+    runs' centroids are clustered instead. Without :py:mod:`scipy`, the
+    principal component order is used as is.
+
+    Returns
+    -------
+    numpy.ndarray
+        A permutation of ``range(len(data))``, worst (lowest mean) end first.
+    """
+    n = len(data)
+    if n < 3:  # noqa: PLR2004
+        order = np.arange(n)
+    else:
+        order = _principal_order(data)
+        try:
+            from scipy.cluster.hierarchy import leaves_list, linkage
+        except ImportError:  # optional
+            pass
+        else:
+            groups = np.array_split(order, min(n, max_linkage))
+            centroids = np.array([data[group].mean(axis=0) for group in groups])
+            leaves = leaves_list(linkage(centroids, method="ward"))
+            order = np.concatenate([groups[leaf] for leaf in leaves])
+    half = n // 2
+    if half and data[order[:half]].mean() > data[order[n - half :]].mean():
+        order = order[::-1]
+    return order
+
+
+def overview(
+    values: np.ndarray, row_labels: list[str], max_rows: int = OVERVIEW_ROWS
+) -> dict[str, Any]:
+    """Down-sample rows to at most ``max_rows`` bins of adjacent rows.
+
+    Each bin keeps the lowest coefficient of its rows in every column, so bad
+    cells stay visible.
+
+    Returns
+    -------
+    dict
+        ``rows`` (bin labels, ``"first … last"``), ``sizes`` (rows per bin) and
+        ``values`` (a list per bin, ``None`` where no row has a value).
+    """
+    n = len(row_labels)
+    starts = np.linspace(0, n, min(n, max_rows) + 1).astype(int)[:-1]
+    ends = np.append(starts[1:], n)
+    lowest = np.minimum.reduceat(np.where(np.isfinite(values), values, np.inf), starts)
+    lowest[np.isinf(lowest)] = np.nan
+    return {
+        "rows": [
+            row_labels[start]
+            if end - start == 1
+            else f"{row_labels[start]} … {row_labels[end - 1]}"
+            for start, end in zip(starts.tolist(), ends.tolist())
+        ],
+        "sizes": (ends - starts).tolist(),
+        "values": [_to_list(row) for row in lowest.astype(np.float64)],
+    }
+
+
+@dataclass
+class MatrixAnalysis:
+    """A matrix's row and column order for display, with summaries."""
+
+    rows: list[str]
+    """Features, top to bottom."""
+    columns: list[str]
+    """Data sources, left to right."""
+    row_stats: AxisStats
+    """In the order of :py:attr:`rows`."""
+    column_stats: AxisStats
+    """In the order of :py:attr:`columns`."""
+    threshold: float
+    overview: Optional[dict[str, Any]] = None
+    """See :py:func:`overview`; only for matrices with many rows."""
+
+
+def analyze_matrix(
+    matrix: CorrelationMatrix,
+    threshold: float = DEFAULT_THRESHOLD,
+    order: str = "cluster",
+    overview_rows: int = OVERVIEW_ROWS,
+) -> MatrixAnalysis:
+    """Summarize and order a matrix for a heatmap.
+
+    Parameters
+    ----------
+    matrix : CorrelationMatrix
+
+    threshold : float
+        Coefficients below this are counted in :py:attr:`AxisStats.below`.
+
+    order : str
+        ``"cluster"`` to order rows and columns with :py:func:`cluster_order`,
+        or ``"name"`` for rows by name and columns as they first appear.
+
+    overview_rows : int
+        Add an :py:func:`overview` if there are more rows than this.
+
+    Returns
+    -------
+    MatrixAnalysis
+    """
+    if order not in ORDERS:
+        msg = f"order must be one of {', '.join(ORDERS)}, not {order!r}"
+        raise ValueError(msg)
+    with span("analyze_matrix", order=order):
+        values = np.asarray(matrix.values)
+        present = np.asarray(matrix.present)
+        count(records=int(present.sum()))
+        rows, columns = matrix.rows.tolist(), matrix.columns.tolist()
+        if order == "cluster" and values.size:
+            data = _filled(values)
+            row_order = cluster_order(data)
+            column_order = cluster_order(data.T)
+        else:
+            row_order = np.argsort(matrix.rows, kind="stable")
+            column_order = np.arange(len(columns))
+        values = values[np.ix_(row_order, column_order)]
+        present = present[np.ix_(row_order, column_order)]
+        rows = [rows[i] for i in row_order.tolist()]
+        columns = [columns[j] for j in column_order.tolist()]
+        return MatrixAnalysis(
+            rows,
+            columns,
+            axis_stats(values, present, 1, threshold),
+            axis_stats(values, present, 0, threshold),
+            threshold,
+            overview(values, rows, overview_rows)
+            if len(rows) > overview_rows
+            else None,
+        )
@@ -0,0 +1,365 @@
+"""Content-addressed cache of correlation outputs, keyed by their inputs.
+
+A correlation run is fingerprinted by its YAML config (from
+:py:func:`~.parse_yaml.cpac_yaml`) and the size and mtime, or optionally the
+content, of every file under each pipeline's output directory and of each
+pipeline config. Runs with the same fingerprint reuse the stored coefficients
+and the files the run wrote to the correlations directory, instead of
+correlating again.
+
+Files are stored once per distinct content, as
+``{cache_dir}/objects/{sha256[:2]}/{sha256[2:]}``, and indexed in a SQLite file
+alongside. The least recently used runs are evicted beyond a size bound.
+"""
+from dataclasses import dataclass
+import hashlib
+from importlib.metadata import PackageNotFoundError, version
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+from typing import Any, Iterator, Optional
+
+from cpac_regression_dashboard._version import __version__
+from cpac_regression_dashboard.utils.history import file_digest
+from cpac_regression_dashboard.utils.instrumentation import count, span
+
+CACHE_DIR_ENV = "CPAC_REGSUITE_CACHE_DIR"
+DEFAULT_MAX_BYTES: int = 2 << 30
+"""Default total size of cached runs (2 GiB) before the oldest are evicted."""
+RUN_SETTINGS: frozenset[str] = frozenset({"correlations_dir", "n_cpus", "run_name"})
+"""YAML settings that don't change the coefficients, left out of fingerprints.
+
+Files named after ``run_name`` are renamed when restored; see
+:py:meth:`ArtifactCache.get`."""
+
+
+def default_cache_dir() -> str:
+    """Get where correlation runs are cached by default.
+
+    ``$CPAC_REGSUITE_CACHE_DIR``, or ``cpac_regsuite/correlations`` in the user
+    cache directory (``$XDG_CACHE_HOME`` or ``~/.cache``).
+    """
+    if os.environ.get(CACHE_DIR_ENV):
+        return os.environ[CACHE_DIR_ENV]
+    cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.join(
+        os.path.expanduser("~"), ".cache"
+    )
+    return os.path.join(cache_home, "cpac_regsuite", "correlations")
+
+
+def _walk(path: str) -> Iterator[str]:
+    """Yield ``path`` if it's a file, or every file under it, in sorted order."""
+    if os.path.isfile(path):
+        yield path
+        return
+    try:
+        entries = sorted(os.scandir(path), key=lambda entry: entry.name)
+    except OSError:
+        return
+    for entry in entries:
+        if entry.is_dir(follow_symlinks=False):
+            yield from _walk(entry.path)
+        elif entry.is_file():
+            yield entry.path
+
+
+def _engine_version(engine: str) -> str:
+    """Version of what correlates, so upgrading it invalidates the cache."""
+    if engine == "native":
+        from cpac_regression_dashboard.utils.correlate import ENGINE_REVISION
+
+        return f"native {__version__} r{ENGINE_REVISION}"
+    try:
+        return f"{engine} {version(engine)}"
+    except PackageNotFoundError:
+        return f"{engine} unknown"
+
+
+def fingerprint(
+    config: dict[str, Any],
+    hash_contents: bool = False,
+    engine: str = "native",
+) -> str:
+    """Fingerprint a correlation run.
+
+    Parameters
+    ----------
+    config : dict
+        The run's YAML config, as written by
+        :py:func:`~.parse_yaml.cpac_yaml`.
+
+    hash_contents : bool
+        Hash the content of every input file instead of using its mtime. Slower,
+        but still matches when outputs are copied or touched without changing.
+
+    engine : str
+        ``"native"`` (:py:mod:`~.correlate`) or ``"cpac_correlations"``.
+
+    Returns
+    -------
+    str
+        A SHA-256 hex digest.
+    """
+    with span("fingerprint"):
+        settings = {
+            key: value
+            for key, value in (config.get("settings") or {}).items()
+            if key not in RUN_SETTINGS
+        }
+        pipelines = config.get("pipelines") or {}
+        digest = hashlib.sha256(
+            json.dumps(
+                [_engine_version(engine), settings, pipelines],
+                default=str,
+                sort_keys=True,
+            ).encode("utf-8")
+        )
+        for name in sorted(pipelines, key=str):
+            pipeline = pipelines[name] or {}
+            for path in (pipeline.get("pipe_config"), pipeline.get("output_dir")):
+                if not path:
+                    continue
+                for file in _walk(path):
+                    stat = os.stat(file)
+                    state = file_digest(file) if hash_contents else stat.st_mtime_ns
+                    digest.update(
+                        json.dumps([file, stat.st_size, state]).encode("utf-8")
+                    )
+                    count(files=1, bytes=stat.st_size)
+        return digest.hexdigest()
+
+
+def snapshot(directory: str) -> dict[str, tuple[int, int]]:
+    """Map each file under ``directory`` (relative path) to its size and mtime."""
+    files = {}
+    for path in _walk(directory):
+        stat = os.stat(path)
+        files[os.path.relpath(path, directory)] = (stat.st_size, stat.st_mtime_ns)
+    return files
+
+
+def changed_files(directory: str, before: dict[str, tuple[int, int]]) -> list[str]:
+    """List files under ``directory`` added or modified since :py:func:`snapshot`."""
+    return sorted(
+        path for path, state in snapshot(directory).items() if before.get(path) != state
+    )
+
+
+@dataclass
+class CacheStats:
+    """Cumulative use of an :py:class:`ArtifactCache`."""
+
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    entries: int = 0
+    bytes: int = 0
+    max_bytes: int = DEFAULT_MAX_BYTES
+
+    def __str__(self) -> str:
+        """Summarize on one line."""
+        lookups = self.hits + self.misses
+        rate = f" ({self.hits / lookups:.0%})" if lookups else ""
+        return (
+            f"{self.hits} hits{rate}, {self.misses} misses, "
+            f"{self.evictions} evictions; {self.entries} runs, "
+            f"{self.bytes / (1 << 20):.1f} of {self.max_bytes / (1 << 20):.0f} MiB"
+        )
+
+
+class ArtifactCache:
+    """Cache of correlation runs: a JSON value plus the files each run wrote.
+
+    Each entry is keyed on a :py:func:`fingerprint` and lists its files by
+    relative path and content digest. Entry sizes count every file they list, so
+    the bound holds even though identical files are stored once.
+
+    The connection is opened lazily, like
+    :py:class:`~.scan_cache.ScanCache`, and SQLite serializes writes from
+    concurrent jobs sharing a cache directory.
+    """
+
+    def __init__(self, directory: str, max_bytes: int = DEFAULT_MAX_BYTES) -> None:
+        """Set the cache directory and size bound without opening it yet."""
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._connection: Optional[sqlite3.Connection] = None
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        """Connection to the index, created on first use."""
+        if self._connection is None:
+            os.makedirs(self.directory, exist_ok=True)
+            self._connection = sqlite3.connect(
+                os.path.join(self.directory, "index.sqlite"), timeout=60
+            )
+            with self._connection:
+                self._connection.execute("PRAGMA journal_mode=WAL")
+                self._connection.execute(
+                    "CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, "
+                    "manifest TEXT NOT NULL, size INTEGER NOT NULL, "
+                    "last_used REAL NOT NULL)"
+                )
+                self._connection.execute(
+                    "CREATE INDEX IF NOT EXISTS entries_last_used "
+                    "ON entries (last_used)"
+                )
+                self._connection.execute(
+                    "CREATE TABLE IF NOT EXISTS stats "
+                    "(name TEXT PRIMARY KEY, value INTEGER NOT NULL)"
+                )
+        return self._connection
+
+    def close(self) -> None:
+        """Close the connection, if open."""
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def _object(self, digest: str) -> str:
+        return os.path.join(self.directory, "objects", digest[:2], digest[2:])
+
+    def _tally(self, name: str, value: int = 1) -> None:
+        """Add to a persistent counter; call within a transaction."""
+        self.connection.execute(
+            "INSERT INTO stats (name, value) VALUES (?, ?) "
+            "ON CONFLICT (name) DO UPDATE SET value = value + excluded.value",
+            (name, value),
+        )
+        count(**{f"cache_{name}": value})
+
+    def get(
+        self, key: str, directory: str, name: Optional[str] = None
+    ) -> Optional[Any]:  # noqa: ANN401
+        """Restore a cached run's files into ``directory`` and return its value.
+
+        Parameters
+        ----------
+        key : str
+
+        directory : str
+
+        name : str, optional
+            The run's name (``run_name``), which isn't part of ``key``. Files
+            named after the cached run's name are restored under this one.
+
+        Returns
+        -------
+        value or None
+            ``None`` on a miss, including when a file has been evicted by
+            another job since the entry was read.
+        """
+        with span("cache_get", key=key[:12]):
+            row = self.connection.execute(
+                "SELECT manifest FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+            manifest = json.loads(row[0]) if row else None
+            cached_name = (manifest or {}).get("name")
+            if name is not None and manifest is not None and not cached_name:
+                # stored without its name, so its files can't be renamed
+                manifest = None
+            try:
+                for path, digest in (manifest or {}).get("files", {}).items():
+                    if name is not None and cached_name != name:
+                        path = path.replace(cached_name, name)  # noqa: PLW2901
+                    target = os.path.join(directory, path)
+                    os.makedirs(os.path.dirname(target) or ".", exist_ok=True)
+                    shutil.copyfile(self._object(digest), target)
+                    count(files=1, bytes=os.path.getsize(target))
+            except FileNotFoundError:
+                manifest = None
+            with self.connection:
+                if manifest is None:
+                    self._tally("misses")
+                    return None
+                self._tally("hits")
+                self.connection.execute(
+                    "UPDATE entries SET last_used = ? WHERE key = ?",
+                    (time.time(), key),
+                )
+            return manifest["value"]
+
+    def put(
+        self,
+        key: str,
+        value: Any,  # noqa: ANN401
+        directory: str,
+        paths: list[str],
+        name: Optional[str] = None,
+    ) -> None:
+        """Store a run's JSON-serializable ``value`` and the files it wrote.
+
+        ``paths`` are relative to ``directory``. ``name`` is the run's name, for
+        :py:meth:`get` to rename its files after another run's. The least
+        recently used runs are then evicted until the cache is within
+        ``max_bytes``.
+        """
+        with span("cache_put", key=key[:12]):
+            files = {}
+            size = 0
+            with self.connection:
+                # hold the write lock, so no other job collects these objects
+                # before the entry that references them is committed
+                self.connection.execute("BEGIN IMMEDIATE")
+                for path in paths:
+                    source = os.path.join(directory, path)
+                    digest = file_digest(source)
+                    target = self._object(digest)
+                    if not os.path.exists(target):
+                        os.makedirs(os.path.dirname(target), exist_ok=True)
+                        handle, temporary = tempfile.mkstemp(
+                            dir=os.path.dirname(target)
+                        )
+                        os.close(handle)
+                        shutil.copyfile(source, temporary)
+                        os.replace(temporary, target)
+                    files[path] = digest
+                    size += os.path.getsize(target)
+                    count(files=1, bytes=os.path.getsize(target))
+                manifest = json.dumps({"value": value, "files": files, "name": name})
+                self.connection.execute(
+                    "INSERT OR REPLACE INTO entries (key, manifest, size, last_used) "
+                    "VALUES (?, ?, ?, ?)",
+                    (key, manifest, size + len(manifest), time.time()),
+                )
+                self._evict()
+
+    def _evict(self) -> None:
+        """Drop the oldest entries beyond ``max_bytes`` and their unshared files."""
+        total = self.connection.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM entries"
+        ).fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        evicted = 0
+        for key, size in self.connection.execute(
+            "SELECT key, size FROM entries ORDER BY last_used"
+        ).fetchall():
+            if total <= self.max_bytes:
+                break
+            self.connection.execute("DELETE FROM entries WHERE key = ?", (key,))
+            total -= size
+            evicted += 1
+        self._tally("evictions", evicted)
+        referenced = {
+            digest
+            for (manifest,) in self.connection.execute("SELECT manifest FROM entries")
+            for digest in json.loads(manifest)["files"].values()
+        }
+        for path in _walk(os.path.join(self.directory, "objects")):
+            prefix, name = os.path.split(path)
+            if os.path.basename(prefix) + name not in referenced:
+                os.remove(path)
+
+    def stats(self) -> CacheStats:
+        """Count lookups and evictions so far, and what's cached now."""
+        stats = CacheStats(max_bytes=self.max_bytes)
+        for name, value in self.connection.execute("SELECT name, value FROM stats"):
+            setattr(stats, name, value)
+        stats.entries, stats.bytes = self.connection.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries"
+        ).fetchone()
+        return stats
@@ -0,0 +1,213 @@
+"""Write regression YAML files for many subjects and sites in one run."""
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass
+import os
+from pathlib import Path
+from typing import Iterable, Optional
+
+import yaml
+
+from cpac_regression_dashboard.utils.instrumentation import span
+from cpac_regression_dashboard.utils.parse_yaml import cpac_yaml
+from cpac_regression_dashboard.utils.scan_cache import ScanCache
+
+
+@dataclass
+class SubjectPair:
+    """A pair of C-PAC output directories to correlate."""
+
+    data_source: str
+    pipeline1: str
+    pipeline2: str
+
+
+@dataclass
+class BatchResult:
+    """Outcome of writing one regression YAML file."""
+
+    data_source: str
+    pipeline1: str
+    pipeline2: str
+    yaml: Optional[str] = None
+    error: Optional[str] = None
+
+
+def _find_subjects(root: str, prefix: str = "") -> Iterable[str]:
+    """Yield ``sub-*`` directories below ``root``, relative to ``root``."""
+    try:
+        with os.scandir(root) as entries:
+            dirs = sorted(
+                entry.name for entry in entries if entry.is_dir(follow_symlinks=True)
+            )
+    except OSError:
+        return
+    for name in dirs:
+        relative = os.path.join(prefix, name) if prefix else name
+        if name.startswith("sub-"):
+            yield relative
+        else:
+            yield from _find_subjects(os.path.join(root, name), relative)
+
+
+def pair_subjects(
+    root1: str, root2: str
+) -> tuple[list[SubjectPair], list[BatchResult]]:
+    """Pair up ``sub-*`` directories found at the same relative path in two roots.
+
+    The ``data_source`` for each pair is its relative path joined with
+    underscores, e.g. ``KKI_sub-3884955``.
+
+    Returns
+    -------
+    pairs : list of SubjectPair
+
+    unmatched : list of BatchResult
+        An error for each ``sub-*`` directory in only one of the roots.
+    """
+    subjects1 = list(_find_subjects(root1))
+    subjects2 = list(_find_subjects(root2))
+    pairs: list[SubjectPair] = []
+    unmatched: list[BatchResult] = []
+    for relative in sorted(set(subjects1) | set(subjects2)):
+        pair = SubjectPair(
+            "_".join(Path(relative).parts),
+            os.path.join(root1, relative),
+            os.path.join(root2, relative),
+        )
+        if not os.path.isdir(pair.pipeline1):
+            unmatched.append(
+                BatchResult(**asdict(pair), error=f"unmatched: not in {root1}")
+            )
+        elif not os.path.isdir(pair.pipeline2):
+            unmatched.append(
+                BatchResult(**asdict(pair), error=f"unmatched: not in {root2}")
+            )
+        else:
+            pairs.append(pair)
+    return pairs, unmatched
+
+
+def read_manifest(manifest: str) -> list[SubjectPair]:
+    """Read subject pairs from a YAML list of ``pipeline1``/``pipeline2`` mappings.
+
+    Each entry may also set ``data_source``; otherwise the last two components
+    of ``pipeline1`` (usually site and subject) are joined with an underscore.
+    """
+    with open(manifest, "r", encoding="utf-8") as _f:
+        entries = yaml.safe_load(_f) or []
+    pairs: list[SubjectPair] = []
+    seen: set[str] = set()
+    for i, entry in enumerate(entries):
+        if not (
+            isinstance(entry, dict)
+            and entry.get("pipeline1")
+            and entry.get("pipeline2")
+        ):
+            msg = f"{manifest} entry {i} needs both 'pipeline1' and 'pipeline2'"
+            raise ValueError(msg)
+        data_source = str(
+            entry.get("data_source")
+            or "_".join(Path(os.path.normpath(entry["pipeline1"])).parts[-2:])
+        )
+        if data_source in seen:
+            msg = f"{manifest} entry {i} repeats data_source '{data_source}'"
+            raise ValueError(msg)
+        seen.add(data_source)
+        pairs.append(
+            SubjectPair(data_source, str(entry["pipeline1"]), str(entry["pipeline2"]))
+        )
+    return pairs
+
+
+def _write_one(
+    pair: SubjectPair,
+    workspace: str,
+    branch: str,
+    max_depth: Optional[int],
+    cache: Optional[ScanCache],
+    n_cpus: int,
+) -> BatchResult:
+    """Write a single regression YAML, capturing any failure in the result."""
+    result = BatchResult(**asdict(pair))
+    with span("subject", data_source=pair.data_source):
+        try:
+            result.yaml = str(
+                cpac_yaml(
+                    pair.pipeline1,
+                    pair.pipeline2,
+                    f"{workspace}/correlations",
+                    f"{branch}_{pair.data_source}",
+                    n_cpus,
+                    branch,
+                    pair.data_source,
+                    max_depth,
+                    cache,
+                )
+            )
+        except Exception as exception:
+            result.error = f"{type(exception).__name__}: {exception}"
+    return result
+
+
+def run_batch(
+    pairs: list[SubjectPair],
+    workspace: str,
+    branch: str,
+    n_workers: int = 1,
+    max_depth: Optional[int] = None,
+    cache: Optional[ScanCache] = None,
+    n_cpus: int = 1,
+    unmatched: Optional[list[BatchResult]] = None,
+) -> tuple[Path, list[BatchResult]]:
+    """Write a regression YAML for every pair, plus a summary index.
+
+    Parameters
+    ----------
+    pairs : list of SubjectPair
+
+    workspace : str
+        Directory to save correlations.
+
+    branch : str
+        Branch name.
+
+    n_workers : int
+        Number of worker processes. ``1`` runs everything in this process.
+
+    max_depth : int, optional
+        See :py:func:`~cpac_regression_dashboard.utils.scan.scan_tree`.
+
+    cache : ScanCache, optional
+        Shared by all workers.
+
+    n_cpus : int
+        Worker processes for correlating, written to each YAML file.
+
+    unmatched : list of BatchResult, optional
+        Directories that couldn't be paired (see :py:func:`pair_subjects`), to
+        list in the index and results as errors.
+
+    Returns
+    -------
+    index : Path
+        ``{branch}_index.yml``, listing the YAML written (or the error raised)
+        for each pair.
+
+    results : list of BatchResult
+    """
+    args = [[arg] * len(pairs) for arg in (workspace, branch, max_depth, cache, n_cpus)]
+    if n_workers > 1 and len(pairs) > 1:
+        with ProcessPoolExecutor(max_workers=n_workers) as pool:
+            results = list(pool.map(_write_one, pairs, *args))
+    else:
+        results = list(map(_write_one, pairs, *args))
+    results.extend(unmatched or [])
+    index = Path(f"{branch}_index.yml")
+    with index.open("w", encoding="utf-8") as _f:
+        yaml.dump(
+            [asdict(result) for result in results],
+            _f,
+            default_flow_style=False,
+            sort_keys=False,
+        )
+    return index, results
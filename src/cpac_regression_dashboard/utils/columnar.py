@@ -0,0 +1,244 @@
+"""Compact columnar storage of correlation matrices in NumPy ``.npz`` files.
+
+Each file holds interned ``rows`` (feature) and ``columns`` (data source) labels,
+packed as UTF-8 bytes plus offsets, a ``values`` matrix of shape
+``(len(rows), len(columns))`` and a boolean ``present`` matrix marking which cells
+have a record. The archive is written uncompressed so the matrices can be
+memory-mapped straight out of it.
+"""
+from array import array
+from dataclasses import dataclass
+import math
+import struct
+from typing import Iterable, Iterator, Optional
+import zipfile
+
+import numpy as np
+import numpy.typing as npt
+
+from cpac_regression_dashboard.utils.records import CorrelationRecord
+
+DEFAULT_DTYPE = np.float64
+"""Value precision, with which every JSON value round-trips. Ask for
+``np.float32`` to halve the size of the values, keeping only decimals of up to 6
+significant digits exact."""
+_LOCAL_HEADER = struct.Struct("<4s5H3L2H")
+"""ZIP local file header (see APPNOTE.TXT §4.3.7)."""
+
+
+@dataclass
+class CorrelationMatrix:
+    """Correlation coefficients indexed by feature and data source."""
+
+    rows: np.ndarray
+    """Feature labels."""
+    columns: np.ndarray
+    """Data source labels."""
+    values: np.ndarray
+    """Coefficients, ``NaN`` where missing or not finite."""
+    present: np.ndarray
+    """Whether a record exists for each cell."""
+
+    @classmethod
+    def from_records(
+        cls, records: Iterable[CorrelationRecord], dtype: type = DEFAULT_DTYPE
+    ) -> "CorrelationMatrix":
+        """Build a matrix from records, keeping labels in first-seen order.
+
+        Cell indices and values are collected in typed arrays (8 bytes each, not
+        a Python object per record) until the matrix is filled.
+        """
+        row_index: dict[str, int] = {}
+        column_index: dict[str, int] = {}
+        row_ids = array("q")
+        column_ids = array("q")
+        values = array("d")
+        for record in records:
+            row_ids.append(row_index.setdefault(record.rowid, len(row_index)))
+            column_ids.append(
+                column_index.setdefault(record.columnid, len(column_index))
+            )
+            values.append(np.nan if record.value is None else record.value)
+        matrix: np.ndarray = np.full(
+            (len(row_index), len(column_index)), np.nan, dtype=dtype
+        )
+        present = np.zeros(matrix.shape, dtype=bool)
+        if values:
+            cells = (
+                np.frombuffer(row_ids, np.int64),
+                np.frombuffer(column_ids, np.int64),
+            )
+            matrix[cells] = np.frombuffer(values, np.float64)
+            present[cells] = True
+        return cls(
+            np.array(list(row_index), dtype=str),
+            np.array(list(column_index), dtype=str),
+            matrix,
+            present,
+        )
+
+    def to_records(
+        self,
+        row_order: Optional[np.ndarray] = None,
+        column_order: Optional[np.ndarray] = None,
+    ) -> Iterator[CorrelationRecord]:
+        """Yield a record for every present cell, one data source at a time.
+
+        ``row_order`` and ``column_order`` are indices of the rows and columns
+        to include, in the order to yield them; by default, all in order.
+        """
+        rows = self.rows.tolist()
+        if row_order is not None:
+            rows = [rows[i] for i in row_order.tolist()]
+        columns = self.columns.tolist()
+        if column_order is None:
+            column_order = np.arange(len(columns))
+        for j in column_order.tolist():
+            column = columns[j]
+            column_values = np.asarray(self.values[:, j])
+            column_present = np.asarray(self.present[:, j])
+            if row_order is not None:
+                column_values = column_values[row_order]
+                column_present = column_present[row_order]
+            if column_values.dtype == np.float32:
+                # shortest decimal that round-trips at single precision
+                as_float = [float(value) for value in column_values.astype(str)]
+            else:
+                as_float = column_values.tolist()
+            for i in np.flatnonzero(column_present).tolist():
+                value = as_float[i]
+                yield CorrelationRecord(
+                    rows[i], column, None if math.isnan(value) else value
+                )
+
+    def save(self, path: str) -> None:
+        """Write an uncompressed ``.npz`` file."""
+        rows, row_offsets = _pack_labels(self.rows)
+        columns, column_offsets = _pack_labels(self.columns)
+        np.savez(
+            path,
+            rows=rows,
+            row_offsets=row_offsets,
+            columns=columns,
+            column_offsets=column_offsets,
+            values=np.ascontiguousarray(self.values),
+            present=np.ascontiguousarray(self.present),
+        )
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> "CorrelationMatrix":
+        """Read a ``.npz`` file, memory-mapping ``values`` and ``present``."""
+        with np.load(path, allow_pickle=False) as npz:
+            rows = _unpack_labels(npz["rows"], npz["row_offsets"])
+            columns = _unpack_labels(npz["columns"], npz["column_offsets"])
+            if not mmap:
+                return cls(rows, columns, npz["values"], npz["present"])
+        return cls(
+            rows, columns, _mmap_member(path, "values"), _mmap_member(path, "present")
+        )
+
+    @classmethod
+    def merge(
+        cls,
+        matrices: Iterable["CorrelationMatrix"],
+        dtype: Optional[npt.DTypeLike] = None,
+    ) -> "CorrelationMatrix":
+        """Combine matrices over the union of their labels.
+
+        Later matrices take precedence where cells overlap.
+        """
+        matrices = list(matrices)
+        rows = _union(matrix.rows for matrix in matrices)
+        columns = _union(matrix.columns for matrix in matrices)
+        if dtype is None:
+            dtype = (
+                np.result_type(*(matrix.values.dtype for matrix in matrices))
+                if matrices
+                else DEFAULT_DTYPE
+            )
+        values = np.full((len(rows), len(columns)), np.nan, dtype=dtype)
+        present = np.zeros(values.shape, dtype=bool)
+        row_index = {label: i for i, label in enumerate(rows.tolist())}
+        column_index = {label: j for j, label in enumerate(columns.tolist())}
+        for matrix in matrices:
+            i = np.array([row_index[label] for label in matrix.rows.tolist()], int)
+            j = np.array(
+                [column_index[label] for label in matrix.columns.tolist()], int
+            )
+            mask = np.asarray(matrix.present)
+            block = values[np.ix_(i, j)]
+            block[mask] = np.asarray(matrix.values)[mask]
+            values[np.ix_(i, j)] = block
+            present[np.ix_(i, j)] |= mask
+        return cls(rows, columns, values, present)
+
+
+def _union(label_arrays: Iterable[np.ndarray]) -> np.ndarray:
+    """Union of label arrays, in first-seen order."""
+    labels: dict[str, None] = {}
+    for label_array in label_arrays:
+        labels.update(dict.fromkeys(label_array.tolist()))
+    return np.array(list(labels), dtype=str)
+
+
+def _pack_labels(labels: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Concatenate labels as UTF-8 bytes, with the end offset of each."""
+    encoded = [label.encode("utf-8") for label in labels.tolist()]
+    offsets = np.cumsum([len(label) for label in encoded], dtype=np.int64)
+    return np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets
+
+
+def _unpack_labels(packed: np.ndarray, offsets: np.ndarray) -> np.ndarray:
+    """Invert :py:func:`_pack_labels`."""
+    data = packed.tobytes()
+    starts = [0, *offsets.tolist()[:-1]]
+    return np.array(
+        [
+            data[start:end].decode("utf-8")
+            for start, end in zip(starts, offsets.tolist())
+        ],
+        dtype=str,
+    )
+
+
+def _mmap_member(path: str, name: str) -> np.ndarray:
+    """Memory-map an array stored uncompressed in an ``.npz`` file."""
+    with zipfile.ZipFile(path) as archive:
+        info = archive.getinfo(f"{name}.npy")
+    if info.compress_type != zipfile.ZIP_STORED:
+        with np.load(path, allow_pickle=False) as npz:
+            return npz[name]
+    with open(path, "rb") as file:
+        file.seek(info.header_offset)
+        header = _LOCAL_HEADER.unpack(file.read(_LOCAL_HEADER.size))
+        file.seek(header[-2] + header[-1], 1)
+        version = np.lib.format.read_magic(file)
+        if version == (1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(file)
+        else:
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(file)
+        offset = file.tell()
+    if not np.prod(shape):
+        return np.empty(shape, dtype=dtype)
+    return np.memmap(
+        path,
+        dtype=dtype,
+        mode="r",
+        offset=offset,
+        shape=shape,
+        order="F" if fortran_order else "C",
+    )
+
+
+def records_to_npz(
+    records: Iterable[CorrelationRecord], path: str, dtype: type = DEFAULT_DTYPE
+) -> CorrelationMatrix:
+    """Write records to a ``.npz`` file."""
+    matrix = CorrelationMatrix.from_records(records, dtype)
+    matrix.save(path)
+    return matrix
+
+
+def iter_npz_records(path: str) -> Iterator[CorrelationRecord]:
+    """Read records from a ``.npz`` file."""
+    return CorrelationMatrix.load(path).to_records()
@@ -0,0 +1,570 @@
+"""Generate a comment on a commit: a heatmap, images, reports and a table.
+
+The heatmap is rendered from the ``*.json`` results in a correlations
+directory, committed with any other images to ``regtest-runlogs`` and linked,
+followed by any Markdown reports and a table of the coefficients in the
+``*.txt`` files. :py:func:`post_comment` posts it on the commit and its open
+pull requests, through one :py:class:`~.github_api.GitHubClient`, which is
+imported (with :py:mod:`aiohttp`) only when a client is created.
+"""
+import asyncio
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from functools import lru_cache
+from importlib.metadata import metadata
+import logging
+import math
+import os
+from pathlib import Path
+import time
+from typing import (
+    AsyncIterator,
+    Awaitable,
+    Generator,
+    Iterable,
+    Optional,
+    TYPE_CHECKING,
+    TypeVar,
+)
+import warnings
+
+from cpac_regression_dashboard._version import __version__
+from cpac_regression_dashboard.utils.comment_table import (
+    build_table,
+    COMMENT_LIMIT,
+    iter_coefficient_lines,
+)
+from cpac_regression_dashboard.utils.heatmap_svg import render_heatmap_svg, svg_to_png
+from cpac_regression_dashboard.utils.instrumentation import span
+from cpac_regression_dashboard.utils.records import read_records
+
+if TYPE_CHECKING:
+    from cpac_regression_dashboard.utils.github_api import GitHubClient
+
+_PACKAGE = "cpac_regression_dashboard"
+_COMMAND = f"{_PACKAGE}.generate_comment"
+"""Named in the comment as what generated it."""
+
+
+_LOGGER = logging.getLogger(__name__)
+_T = TypeVar("_T")
+
+
+@dataclass
+class EnvVars:
+    """Dataclass for environment variables."""
+
+    github_api_url: str
+    github_token: str
+    owner: str
+    repo: str
+    sha: str
+    testing_owner: str
+    threshold: str
+
+    def __init__(self) -> None:
+        """Initialize the dataclass from the environment."""
+        attrs = [
+            "github_api_url",
+            "github_token",
+            "owner",
+            "repo",
+            "sha",
+            "testing_owner",
+            "threshold",
+        ]
+        for attr in attrs:
+            setattr(self, attr, os.environ.get(attr.upper(), ""))
+        if not self.github_api_url:
+            from cpac_regression_dashboard.utils.github_api import GITHUB_API
+
+            self.github_api_url = GITHUB_API
+
+    @property
+    def threshold_value(self) -> Optional[float]:
+        """``THRESHOLD`` as a number, ``None`` if unset.
+
+        Raises
+        ------
+        ValueError
+            If ``THRESHOLD`` isn't a finite number.
+        """
+        if not self.threshold.strip():
+            return None
+        try:
+            value = float(self.threshold)
+        except ValueError:
+            value = math.nan
+        if not math.isfinite(value):
+            msg = f"THRESHOLD must be a number, not {self.threshold!r}"
+            raise ValueError(msg)
+        return value
+
+    def client(self) -> "GitHubClient":
+        """Create a GitHub API client with this token and API URL."""
+        from cpac_regression_dashboard.utils.github_api import GitHubClient
+
+        return GitHubClient(self.github_token, self.github_api_url)
+
+
+@lru_cache(maxsize=None)
+def _env() -> EnvVars:
+    """Read the environment variables on first use."""
+    return EnvVars()
+
+
+_RUNLOGS = "regtest-runlogs"
+"""Repository (owned by ``TESTING_OWNER``) that images are committed to."""
+
+
+@asynccontextmanager
+async def _github(client: "Optional[GitHubClient]") -> "AsyncIterator[GitHubClient]":
+    """Reuse an open client, or open one for the duration of the context."""
+    if client is not None:
+        yield client
+    else:
+        async with _env().client() as new_client:
+            yield new_client
+
+
+@dataclass
+class Heatmap:
+    """Heatmap dataclass."""
+
+    filename: str
+    content: str
+
+
+async def add_heatmap_to_branch(
+    file: Heatmap, images: Iterable[Path] = (), client: "Optional[GitHubClient]" = None
+) -> None:
+    """Add a heatmap to a branch.
+
+    Parameters
+    ----------
+    file : Heatmap
+        The heatmap file to add.
+
+    images : iterable of Path
+        Other images to add in the same commit.
+
+    client : GitHubClient, optional
+        Open client to reuse.
+
+    Returns
+    -------
+    None
+    """
+    files = {f"{file.filename}.png": _heatmap_png(file)}
+    files.update({image.name: image.read_bytes() for image in images})
+    await upload_images(files, ":loud_sound: Add heatmap image", client)
+
+
+async def upload_images(
+    files: dict[str, bytes],
+    message: str = ":loud_sound: Add images",
+    client: "Optional[GitHubClient]" = None,
+) -> None:
+    """Commit images to this run's branch of ``regtest-runlogs`` in one commit.
+
+    Parameters
+    ----------
+    files : dict of str to bytes
+        Image contents keyed by filename.
+
+    message : str
+        Commit message.
+
+    client : GitHubClient, optional
+        Open client to reuse.
+
+    Returns
+    -------
+    None
+    """
+    if not files:
+        return
+    env = _env()
+    async with _github(client) as github:
+        await github.commit_files(
+            env.testing_owner,
+            _RUNLOGS,
+            f"{env.repo}_{env.sha}",
+            files,
+            message,
+        )
+
+
+def gather_images(path: Path) -> Generator[Path, None, None]:
+    """Gather the images.
+
+    Parameters
+    ----------
+    path : Path
+        The path to the correlations directory..
+
+    Yields
+    ------
+    image : Path
+       The path to an image.
+    """
+    return path.glob("*.png")
+
+
+def gather_reports(path: Path) -> str:
+    """Concatenate the Markdown reports in the given directory.
+
+    For example, the regression report from ``cpac_regsuite_delta --markdown``.
+
+    Parameters
+    ----------
+    path : Path
+        The path to the correlations directory.
+
+    Returns
+    -------
+    str
+        Each ``*.md`` file in name order, followed by a blank line.
+    """
+    return "".join(
+        f"{report.read_text(encoding='utf-8').strip()}\n\n"
+        for report in sorted(path.glob("*.md"))
+    )
+
+
+def gather_text(
+    path: Path, threshold: Optional[float] = None, budget: int = COMMENT_LIMIT
+) -> str:
+    """Tabulate the coefficients in all text files in the given directory.
+
+    Rows are sorted worst first, and rows beyond ``budget`` are summarized.
+
+    Parameters
+    ----------
+    path : Path
+        The path to the correlations directory.
+
+    threshold : float, optional
+        Only list coefficients below this.
+
+    budget : int
+        Maximum size of the table, in UTF-8 bytes.
+
+    Returns
+    -------
+    str
+        The Markdown table.
+    """
+    return build_table(
+        iter_coefficient_lines(sorted(path.glob("*.txt"))), threshold, budget
+    )
+
+
+def _heatmap_png(file: Heatmap) -> bytes:
+    """Convert a heatmap SVG to PNG."""
+    return svg_to_png(file.content)
+
+
+def gather_results(path: Path, branch: Optional[str] = None) -> list[Path]:
+    """Find the correlation result files in a directory.
+
+    Other JSON files, such as ``cpac_regsuite_delta --json`` reports, are
+    skipped with a warning.
+
+    Parameters
+    ----------
+    path : Path
+        The path to the correlations directory.
+
+    branch : str, optional
+        Only ``*_{branch}.json`` files.
+
+    Returns
+    -------
+    list of Path
+        In name order.
+    """
+    results = []
+    for json_file in sorted(path.glob(f"*_{branch}.json" if branch else "*.json")):
+        try:
+            next(iter(read_records(str(json_file))), None)
+        except ValueError as error:
+            _LOGGER.warning("skipping %s: %s", json_file.name, error)
+            continue
+        results.append(json_file)
+    return results
+
+
+def render_heatmap(path: Path, branch: Optional[str] = None) -> dict[str, bytes]:
+    """Render the heatmap of the results in a directory to PNG.
+
+    Parameters
+    ----------
+    path : Path
+        The path to the correlations directory, with ``*.json`` results.
+
+    branch : str, optional
+        Only render ``*_{branch}.json`` results.
+
+    Returns
+    -------
+    dict of str to bytes
+        The PNG keyed by filename, or empty if there are no results or they
+        can't be rendered (with a warning).
+    """
+    json_files = gather_results(path, branch)
+    if not json_files:
+        return {}
+    try:
+        heatmap = Heatmap(
+            "heatmap",
+            render_heatmap_svg(
+                (
+                    record
+                    for json_file in json_files
+                    for record in read_records(str(json_file))
+                ),
+                title=_env().repo,
+                subtitle=_env().sha,
+            ),
+        )
+        return {f"{heatmap.filename}.png": _heatmap_png(heatmap)}
+    except Exception as exception:
+        warnings.warn(
+            f"couldn't render the heatmap: {exception}\n\nIs cairosvg installed?",
+            RuntimeWarning,
+            stacklevel=2,
+        )
+        return {}
+
+
+def _heatmap_link(filename: str) -> str:
+    """Markdown linking a committed heatmap image to the online dashboard."""
+    env = _env()
+    url = f"https://{env.testing_owner}.github.io/dashboard/?data_sha={env.sha}"
+    heatmap = _raw_image_path(env.testing_owner, env.repo, env.sha, Path(filename))
+    return f"[![heatmap]({heatmap})]({url})"
+
+
+def _comment_header() -> str:
+    """Credit this package (and link to its source, if known)."""
+    project_urls = metadata(_PACKAGE).get_all("Project-URL", [])
+    source_url = None
+    for _url in project_urls:
+        if _url.startswith("Repository, "):
+            source_url = _url.split(",")[1].strip()
+            break
+    if source_url is None:
+        return f"Generated by {_COMMAND} {__version__}\n\n"
+    return (
+        f"Generated by [{_PACKAGE}]({source_url})."
+        f"{_COMMAND[len(_PACKAGE) + 1 :]} {__version__}\n\n"
+    )
+
+
+async def _timed(stage: str, awaitable: Awaitable[_T], origin: float) -> _T:
+    """Await a stage in a span, logging when it finished after ``origin``."""
+    start = time.perf_counter()
+    try:
+        with span(stage):
+            return await awaitable
+    finally:
+        end = time.perf_counter()
+        _LOGGER.info(
+            "%s took %.3f s (done at %.3f s)", stage, end - start, end - origin
+        )
+
+
+async def _upload_with_heatmap(
+    github: "GitHubClient",
+    heatmap: Awaitable[dict[str, bytes]],
+    images: Iterable[Path],
+) -> None:
+    """Upload images while the heatmap renders, then commit them all at once."""
+    env = _env()
+    owner, branch = env.testing_owner, f"{env.repo}_{env.sha}"
+    files = await asyncio.to_thread(
+        lambda: {image.name: image.read_bytes() for image in images}
+    )
+    blobs = await github.create_blobs(owner, _RUNLOGS, files)
+    heatmap_files = await heatmap
+    blobs.update(await github.create_blobs(owner, _RUNLOGS, heatmap_files))
+    if blobs:
+        await github.commit_blobs(
+            owner,
+            _RUNLOGS,
+            branch,
+            blobs,
+            ":loud_sound: Add heatmap image"
+            if heatmap_files
+            else ":loud_sound: Add images",
+        )
+
+
+async def generate_comment(
+    path: Path,
+    client: "Optional[GitHubClient]" = None,
+    branch: Optional[str] = None,
+) -> str:
+    """Generate the comment.
+
+    The heatmap render, the image uploads and the text table are independent
+    stages run concurrently; image blobs are uploaded while the heatmap renders
+    and committed together with it. Each stage's timing is logged.
+
+    Parameters
+    ----------
+    path : Path
+        The path to the correlations directory.
+
+    client : GitHubClient, optional
+        Open client to reuse.
+
+    branch : str, optional
+        Only draw the heatmap from ``*_{branch}.json`` results.
+
+    Returns
+    -------
+    str : The comment.
+    """
+    origin = time.perf_counter()
+    env = _env()
+    images = sorted(gather_images(path))
+    header = _comment_header()
+    image_links = "".join(
+        f"![{image.stem}]"
+        f"({_raw_image_path(env.testing_owner, env.repo, env.sha, image)})\n"
+        for image in images
+    )
+    reports = gather_reports(path)
+    budget = COMMENT_LIMIT - len(
+        f"{header}{_heatmap_link('heatmap.png')}{image_links}{reports}".encode("utf-8")
+    )
+    threshold = env.threshold_value
+    async with _github(client) as github:
+        render = asyncio.ensure_future(
+            _timed(
+                "render heatmap",
+                asyncio.to_thread(render_heatmap, path, branch),
+                origin,
+            )
+        )
+        stages = [
+            render,
+            asyncio.ensure_future(
+                _timed(
+                    "upload images",
+                    _upload_with_heatmap(github, render, images),
+                    origin,
+                )
+            ),
+            asyncio.ensure_future(
+                _timed(
+                    "gather text",
+                    asyncio.to_thread(gather_text, path, threshold, budget),
+                    origin,
+                )
+            ),
+        ]
+        try:
+            heatmap, _, text = await asyncio.gather(*stages)
+        except BaseException:
+            for stage in stages:
+                stage.cancel()
+            raise
+    _LOGGER.info("generate comment took %.3f s", time.perf_counter() - origin)
+    heatmap_link = _heatmap_link(next(iter(heatmap))) if heatmap else ""
+    return f"{header}{heatmap_link}{image_links}{reports}{text}"
+
+
+async def get_heatmap(
+    path: Path,
+    client: "Optional[GitHubClient]" = None,
+    branch: Optional[str] = None,
+) -> str:
+    """Get a heatmap image.
+
+    The heatmap is committed along with any other images in ``path``.
+
+    Parameters
+    ----------
+    path : Path
+        The path to the correlations directory, with ``*.json`` results.
+
+    client : GitHubClient, optional
+        Open client to reuse.
+
+    branch : str, optional
+        Only draw ``*_{branch}.json`` results.
+
+    Returns
+    -------
+    str : Markdown linking the heatmap image to the online dashboard.
+    """
+    heatmap = await asyncio.to_thread(render_heatmap, path, branch)
+    files = dict(heatmap)
+    files.update({image.name: image.read_bytes() for image in gather_images(path)})
+    if not heatmap:
+        await upload_images(files, client=client)
+        return ""
+    await upload_images(files, ":loud_sound: Add heatmap image", client)
+    return _heatmap_link(next(iter(heatmap)))
+
+
+async def post_comment(path: Path, branch: Optional[str] = None) -> None:
+    """Post a comment on a GitHub commit and relevant PR.
+
+    The pull requests containing the commit are fetched while the comment is
+    generated, then the commit and every open pull request whose head is the
+    commit are commented on concurrently, over one pooled connection.
+    ``branch`` limits the heatmap to that branch's results.
+    """
+    env = _env()
+    async with env.client() as client:
+        pulls, comment = await asyncio.gather(
+            client.pulls_for_commit(env.owner, env.repo, env.sha),
+            generate_comment(path, client, branch),
+        )
+        await asyncio.gather(
+            client.create_commit_comment(env.owner, env.repo, env.sha, comment),
+            *(
+                client.create_issue_comment(
+                    env.owner, env.repo, pull["number"], comment
+                )
+                for pull in pulls
+                if pull.get("head", {}).get("sha") == env.sha
+            ),
+        )
+
+
+def _raw_image_path(owner: str, repo: str, sha: str, image: Path) -> str:
+    """Generate the raw image path.
+
+    Parameters
+    ----------
+    owner : str
+        The owner of the repository.
+
+    repo : str
+        The name of the repository.
+
+    sha : str
+        The SHA of the commit.
+
+    image : Path
+        The path to the image.
+
+    Returns
+    -------
+    str : The raw image path.
+    """
+    return f"https://raw.githubusercontent.com/{owner}/regtest-runlogs/{repo}_{sha}/{image.name}"
+
+
+def comment_on_commit(path: str, branch: Optional[str] = None) -> None:
+    """Post the comment from the command line, logging progress to stderr.
+
+    Runs :py:func:`post_comment` to completion.
+    """
+    logging.basicConfig(level=logging.INFO, format="%(name)s: %(message)s")
+    asyncio.run(post_comment(Path(path), branch))
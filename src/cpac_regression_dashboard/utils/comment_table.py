@@ -0,0 +1,105 @@
+"""Markdown tables of ``feature: coefficient`` lines, sized for a GitHub comment."""
+from itertools import chain
+import math
+from pathlib import Path
+from typing import Iterable, Iterator, NamedTuple, Optional
+
+COMMENT_LIMIT: int = 65536
+"""Longest comment body GitHub accepts, in characters."""
+HEADER: str = "|feature|coefficient|\n|---|---|"
+_SUMMARY_RESERVE = 160
+"""Bytes kept back for the summary line."""
+
+
+class CoefficientLine(NamedTuple):
+    """A parsed ``feature: coefficient`` line."""
+
+    feature: str
+    text: str
+    """Coefficient as written."""
+    value: Optional[float]
+    """Coefficient, or ``None`` if missing or not finite."""
+
+
+def parse_line(line: str) -> Optional[CoefficientLine]:
+    """Parse a ``feature: coefficient`` line; ``None`` for a blank line."""
+    line = line.strip()
+    if not line:
+        return None
+    feature, colon, text = line.rpartition(":")
+    if not colon:
+        feature, text = text, ""
+    feature, text = feature.strip(), text.strip()
+    try:
+        value: Optional[float] = float(text)
+    except ValueError:
+        value = None
+    if value is not None and not math.isfinite(value):
+        value = None
+    return CoefficientLine(feature, text, value)
+
+
+def iter_coefficient_lines(paths: Iterable[Path]) -> Iterator[CoefficientLine]:
+    """Stream parsed lines from text files, one line at a time."""
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as file:
+            for line in file:
+                parsed = parse_line(line)
+                if parsed is not None:
+                    yield parsed
+
+
+def _worst_first(line: CoefficientLine) -> tuple[bool, float, str]:
+    """Sort key: missing coefficients, then lowest, then by feature."""
+    return (line.value is not None, line.value or 0.0, line.feature)
+
+
+def build_table(
+    lines: Iterable[CoefficientLine],
+    threshold: Optional[float] = None,
+    budget: int = COMMENT_LIMIT,
+) -> str:
+    """Build a Markdown table, worst coefficients first.
+
+    Parameters
+    ----------
+    lines : iterable of CoefficientLine
+
+    threshold : float, optional
+        Only list coefficients below this (missing ones are always listed).
+
+    budget : int
+        Maximum size of the table in UTF-8 bytes. Rows that don't fit are
+        replaced by a summary line.
+
+    Returns
+    -------
+    str
+    """
+    total = 0
+    kept = []
+    for line in lines:
+        total += 1
+        if threshold is None or line.value is None or line.value < threshold:
+            kept.append(line)
+    kept.sort(key=_worst_first)
+    rows = []
+    remaining = budget - len(HEADER.encode("utf-8")) - _SUMMARY_RESERVE
+    for line in kept:
+        row = f"\n|{line.feature}|{line.text}|"
+        remaining -= len(row.encode("utf-8"))
+        if remaining < 0:
+            break
+        rows.append(row)
+    omitted = []
+    if len(rows) < len(kept):
+        omitted.append(f"{len(kept) - len(rows)} to fit the size limit")
+    if len(kept) < total:
+        omitted.append(f"{total - len(kept)} at or above {threshold:g}")
+    summary = []
+    if omitted:
+        summary.append(
+            f"\n\n_{len(rows)} of {total} features shown; "
+            f"omitted {' and '.join(omitted)}._"
+        )
+    return "".join(chain([HEADER], rows, summary))
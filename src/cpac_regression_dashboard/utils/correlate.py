@@ -0,0 +1,275 @@
+"""Correlate matching derivatives of two C-PAC runs, one process per derivative.
+
+Images are read a block of volumes (or slices) at a time through nibabel's
+array proxies, which memory-map uncompressed NIfTI files, and Pearson's r is
+accumulated block by block, so memory stays bounded however long the series.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+import math
+import os
+from typing import Any, cast, Iterator, Optional
+import warnings
+
+import numpy as np
+
+from cpac_regression_dashboard.utils.instrumentation import count, span
+
+IMAGE_EXTENSIONS: tuple[str, ...] = (".nii.gz", ".nii")
+TEXT_EXTENSIONS: tuple[str, ...] = (".1D", ".tsv", ".csv", ".txt")
+"""Tabular derivatives, read whole: they are small."""
+DEFAULT_CHUNK_BYTES: int = 16 << 20
+"""Default size of the blocks read from each image, as float64 (16 MiB)."""
+ENGINE_REVISION: int = 2
+"""Changed whenever the same inputs would give different results, so that runs
+cached by an earlier revision aren't reused."""
+_SUBJECT_ENTITIES: tuple[str, ...] = ("sub-", "ses-")
+
+
+def derivative_key(path: str) -> Optional[tuple[str, str]]:
+    """Split a derivative's filename into its subject and session, and the rest.
+
+    Returns
+    -------
+    (str, str) or None
+        The ``sub-``/``ses-`` entities (``""`` if none) and the name without
+        them or the extension, or ``None`` for files that aren't correlated.
+    """
+    name = os.path.basename(path)
+    for extension in IMAGE_EXTENSIONS + TEXT_EXTENSIONS:
+        if name.endswith(extension):
+            name = name[: -len(extension)]
+            break
+    else:
+        return None
+    entities = name.split("_")
+    return (
+        "_".join(entity for entity in entities if entity.startswith(_SUBJECT_ENTITIES)),
+        "_".join(
+            entity for entity in entities if not entity.startswith(_SUBJECT_ENTITIES)
+        ),
+    )
+
+
+def gather_derivatives(output_dir: str) -> dict[tuple[str, str], str]:
+    """Map the key of each derivative under ``output_dir`` to its file.
+
+    Keys are from :py:func:`derivative_key`. Where two files share a key, the
+    first in sorted path order is kept.
+    """
+    derivatives: dict[tuple[str, str], str] = {}
+    for directory, subdirs, filenames in os.walk(output_dir):
+        subdirs.sort()
+        for filename in sorted(filenames):
+            key = derivative_key(filename)
+            if key is not None:
+                derivatives.setdefault(key, os.path.join(directory, filename))
+    return derivatives
+
+
+def pair_derivatives(
+    derivatives1: dict[tuple[str, str], str],
+    derivatives2: dict[tuple[str, str], str],
+) -> list["Correlation"]:
+    """Pair the derivatives of the same subject and session in two outputs.
+
+    If each output has one subject and session, as for one pair of subject
+    directories, derivatives are paired and named by the rest of their names,
+    whatever the subject. Otherwise they are paired within each subject and
+    session, and prefixed with it. Subjects and sessions found in only one of
+    the outputs are warned about.
+    """
+    subjects1 = {subject for subject, _ in derivatives1}
+    subjects2 = {subject for subject, _ in derivatives2}
+    prefixed = len(subjects1) > 1 or len(subjects2) > 1
+    if not prefixed:
+        derivatives1 = {("", name): path for (_, name), path in derivatives1.items()}
+        derivatives2 = {("", name): path for (_, name), path in derivatives2.items()}
+        subjects1 = subjects2 = {""}
+    unmatched = sorted(subject or "(none)" for subject in subjects1 ^ subjects2)
+    if unmatched:
+        warnings.warn(
+            f"no derivatives to correlate with in the other output for "
+            f"{', '.join(unmatched)}",
+            stacklevel=2,
+        )
+    return [
+        Correlation(
+            f"{subject}_{name}" if prefixed and subject else name,
+            derivatives1[subject, name],
+            derivatives2[subject, name],
+        )
+        for subject, name in sorted(derivatives1.keys() & derivatives2.keys())
+    ]
+
+
+@dataclass
+class PearsonAccumulator:
+    """Pearson's r over data seen a block at a time.
+
+    Blocks are merged with the pairwise update of Chan, Golub and LeVeque, which
+    keeps the centred sums as accurate as a single pass over all the data.
+    """
+
+    n: int = 0
+    mean_x: float = 0.0
+    mean_y: float = 0.0
+    m2_x: float = 0.0
+    """Sum of squared deviations of ``x`` from its mean."""
+    m2_y: float = 0.0
+    c_xy: float = 0.0
+    """Sum of products of the deviations of ``x`` and ``y``."""
+
+    def update(self, x: np.ndarray, y: np.ndarray) -> None:
+        """Add a block of paired values."""
+        x = np.asarray(x, dtype=np.float64).ravel()
+        y = np.asarray(y, dtype=np.float64).ravel()
+        if x.size != y.size:
+            msg = f"blocks differ in size: {x.size} != {y.size}"
+            raise ValueError(msg)
+        n = x.size
+        if n == 0:
+            return
+        block_mean_x, block_mean_y = float(x.mean()), float(y.mean())
+        dx, dy = x - block_mean_x, y - block_mean_y
+        total = self.n + n
+        delta_x, delta_y = block_mean_x - self.mean_x, block_mean_y - self.mean_y
+        weight = self.n * n / total
+        self.m2_x += float(dx @ dx) + delta_x * delta_x * weight
+        self.m2_y += float(dy @ dy) + delta_y * delta_y * weight
+        self.c_xy += float(dx @ dy) + delta_x * delta_y * weight
+        self.mean_x += delta_x * n / total
+        self.mean_y += delta_y * n / total
+        self.n = total
+
+    @property
+    def r(self) -> float:
+        """Pearson's r, or ``nan`` if either side is constant."""
+        denominator = math.sqrt(self.m2_x * self.m2_y)
+        return self.c_xy / denominator if denominator > 0 else math.nan
+
+
+def _image_blocks(
+    path1: str, path2: str, chunk_bytes: int
+) -> Iterator[tuple[np.ndarray, np.ndarray]]:
+    """Yield matching blocks of two images along their last axis."""
+    import nibabel as nib
+
+    image1, image2 = (
+        cast(nib.spatialimages.SpatialImage, nib.load(path)) for path in (path1, path2)
+    )
+    shape = image1.shape
+    if shape != image2.shape:
+        msg = f"shapes differ: {shape} != {image2.shape}"
+        raise ValueError(msg)
+    block = max(1, chunk_bytes // (8 * math.prod(shape[:-1])))
+    for start in range(0, shape[-1], block):
+        yield (
+            np.asarray(image1.dataobj[..., start : start + block]),
+            np.asarray(image2.dataobj[..., start : start + block]),
+        )
+
+
+def _read_table(path: str) -> np.ndarray:
+    """Read a 1D, TSV, CSV or text table, skipping ``#`` comments and a header."""
+    delimiter = {".tsv": "\t", ".csv": ","}.get(os.path.splitext(path)[1])
+    skip_header = 0
+    with open(path, "r", encoding="utf-8") as _f:
+        for line in _f:
+            if line.strip() and not line.lstrip().startswith("#"):
+                try:
+                    [float(value) for value in line.split(delimiter) if value.strip()]
+                except ValueError:
+                    skip_header = 1
+                break
+    return np.genfromtxt(
+        path, delimiter=delimiter, comments="#", skip_header=skip_header
+    )
+
+
+def correlate_files(
+    path1: str, path2: str, chunk_bytes: int = DEFAULT_CHUNK_BYTES
+) -> float:
+    """Pearson's r between the values of two images or tables."""
+    accumulator = PearsonAccumulator()
+    if path1.endswith(IMAGE_EXTENSIONS):
+        blocks = _image_blocks(path1, path2, chunk_bytes)
+    else:
+        table1, table2 = _read_table(path1), _read_table(path2)
+        if table1.shape != table2.shape:
+            msg = f"shapes differ: {table1.shape} != {table2.shape}"
+            raise ValueError(msg)
+        blocks = iter([(table1, table2)])
+    for block1, block2 in blocks:
+        accumulator.update(block1, block2)
+        count(bytes=block1.nbytes + block2.nbytes)
+    return accumulator.r
+
+
+@dataclass
+class Correlation:
+    """Outcome of correlating one derivative."""
+
+    key: str
+    path1: str
+    path2: str
+    r: float = math.nan
+    error: Optional[str] = None
+
+
+def _correlate_one(pair: Correlation, chunk_bytes: int) -> Correlation:
+    """Correlate one derivative, capturing any failure in the result."""
+    with span("correlate", key=pair.key):
+        try:
+            pair.r = correlate_files(pair.path1, pair.path2, chunk_bytes)
+        except Exception as exception:
+            pair.error = f"{type(exception).__name__}: {exception}"
+        count(files=2)
+    return pair
+
+
+def correlate_pipelines(
+    config: dict[str, Any],
+    n_cpus: Optional[int] = None,
+    chunk_bytes: int = DEFAULT_CHUNK_BYTES,
+) -> list[Correlation]:
+    """Correlate every derivative the two pipelines in a config have in common.
+
+    Parameters
+    ----------
+    config : dict
+        A pipeline-pair YAML config, as written by
+        :py:func:`~.parse_yaml.cpac_yaml`.
+
+    n_cpus : int, optional
+        Number of worker processes; defaults to ``settings.n_cpus`` in
+        ``config``. ``1`` correlates everything in this process.
+
+    chunk_bytes : int
+        Approximate size of each block read from an image.
+
+    Returns
+    -------
+    list of Correlation
+        Sorted by key.
+    """
+    pipelines = list((config.get("pipelines") or {}).values())
+    if len(pipelines) != 2:  # noqa: PLR2004
+        msg = f"expected 2 pipelines, got {len(pipelines)}"
+        raise ValueError(msg)
+    if n_cpus is None:
+        n_cpus = int((config.get("settings") or {}).get("n_cpus") or 1)
+    with span("gather_derivatives"):
+        derivatives1, derivatives2 = (
+            gather_derivatives(pipeline["output_dir"]) for pipeline in pipelines
+        )
+        count(files=len(derivatives1) + len(derivatives2))
+    pairs = pair_derivatives(derivatives1, derivatives2)
+    # largest first, so that no worker is left with a big file at the end
+    pairs.sort(key=lambda pair: os.path.getsize(pair.path1), reverse=True)
+    if n_cpus > 1 and len(pairs) > 1:
+        with ProcessPoolExecutor(max_workers=n_cpus) as pool:
+            results = list(pool.map(_correlate_one, pairs, [chunk_bytes] * len(pairs)))
+    else:
+        results = [_correlate_one(pair, chunk_bytes) for pair in pairs]
+    return sorted(results, key=lambda result: result.key)
@@ -0,0 +1,281 @@
+"""Build D3 heatmap pages for many result files at once."""
+from concurrent.futures import Executor, ProcessPoolExecutor
+import copy
+from dataclasses import dataclass
+from functools import lru_cache
+import hashlib
+from importlib.resources import files
+import json
+import os
+from typing import Any, Optional
+
+from lxml import etree
+
+from cpac_regression_dashboard.utils.analysis import DEFAULT_THRESHOLD
+from cpac_regression_dashboard.utils.data_assets import write_data_assets
+from cpac_regression_dashboard.utils.history import file_digest
+from cpac_regression_dashboard.utils.instrumentation import span
+from cpac_regression_dashboard.utils.records import read_records
+from cpac_regression_dashboard.utils.static_assets import (
+    bundle_scripts,
+    BundledAsset,
+)
+
+MANIFEST_FILENAME: str = ".build_manifest.json"
+"""Input digests of the pages in an output directory, to skip unchanged pages."""
+
+
+@dataclass
+class PageJob:
+    """A page to build from one result file."""
+
+    json_file: str
+    branch: str
+    name: str
+    """Data source, from ``{data_source}_{branch}.json``."""
+    digest: str
+    """SHA-256 of ``json_file``."""
+    order: str = "cluster"
+    """See :py:func:`~.analysis.analyze_matrix`."""
+    threshold: float = DEFAULT_THRESHOLD
+
+
+@dataclass
+class PageResult:
+    """Outcome of building one page."""
+
+    branch: str
+    name: str
+    html: str
+    """Page path, relative to the output directory."""
+    built: bool
+    """``False`` if the page was up to date."""
+    error: Optional[str] = None
+
+
+VENDOR_SCRIPTS: tuple[str, ...] = ("d3",)
+"""Libraries pages load (see :py:data:`~.static_assets.VENDOR`)."""
+SCRIPTS: tuple[str, ...] = ("data_loader.js", "heatmap.js")
+"""Templates pages load after :data:`VENDOR_SCRIPTS`, in this order."""
+
+
+@lru_cache(maxsize=None)
+def _template() -> tuple[etree._Element, str]:
+    """Parse the page template once per process, and digest it."""
+    html = (
+        files("cpac_regression_dashboard")
+        .joinpath("templates/heatmap.html")
+        .read_text(encoding="utf-8")
+    )
+    return etree.HTML(html), hashlib.sha256(html.encode("utf-8")).hexdigest()
+
+
+def _page_name(json_file: str, branch: str) -> str:
+    """Get ``data_source`` from a ``{data_source}_{branch}`` result filename."""
+    name = os.path.splitext(os.path.basename(json_file))[0]
+    return name[: -len(f"_{branch}")] if name.endswith(f"_{branch}") else name
+
+
+def render_page(
+    data_file: str, title: str, subtitle: str, assets: list[BundledAsset]
+) -> str:
+    """Render a heatmap page for the data manifest ``data_file``.
+
+    ``data_file`` is relative to the page, which loads ``assets`` (bundled into
+    its parent directory) at the end of its body, in order. The last reads its
+    settings from its ``<script>`` tag.
+    """
+    page = copy.deepcopy(_template()[0])
+    body = page.find("body")
+    for asset in assets:
+        script_element = etree.SubElement(body, "script")
+        src = asset.src("../")
+        if src is None:
+            script_element.text = asset.text
+        else:
+            script_element.set("src", src)
+    script_element.set("data-datafile", data_file)
+    script_element.set("data-title", title)
+    script_element.set("data-subtitle", subtitle)
+    return etree.tostring(page, encoding="unicode", method="html")
+
+
+def build_page(
+    job: PageJob, output_dir: str, assets: list[BundledAsset]
+) -> PageResult:
+    """Write one page and its data, capturing any failure in the result."""
+    data_name = os.path.splitext(os.path.basename(job.json_file))[0]
+    result = PageResult(job.branch, job.name, f"{job.branch}/{job.name}.html", True)
+    with span("build_page", page=result.html):
+        try:
+            write_data_assets(
+                read_records(job.json_file),
+                os.path.join(output_dir, job.branch),
+                data_name,
+                order=job.order,
+                threshold=job.threshold,
+            )
+            page = render_page(
+                f"{data_name}.manifest.json", job.branch, job.name, assets
+            )
+            path = os.path.join(output_dir, result.html)
+            with open(path, "w", encoding="utf-8") as _f:
+                _f.write(page)
+        except Exception as exception:
+            result.error = f"{type(exception).__name__}: {exception}"
+    return result
+
+
+def _write_if_changed(path: str, content: str) -> None:
+    """Write a text file unless it already has exactly this content."""
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as _f:
+            if _f.read() == content:
+                return
+    with open(path, "w", encoding="utf-8") as _f:
+        _f.write(content)
+
+
+def render_index(results: list[PageResult]) -> str:
+    """Render a page linking to every heatmap page, grouped by branch."""
+    html = etree.Element("html")
+    head = etree.SubElement(html, "head")
+    etree.SubElement(head, "title").text = "Correlations heatmaps"
+    body = etree.SubElement(html, "body")
+    etree.SubElement(body, "h1").text = "Correlations heatmaps"
+    branches: dict[str, list[PageResult]] = {}
+    for result in results:
+        if result.error is None:
+            branches.setdefault(result.branch, []).append(result)
+    for branch in sorted(branches):
+        etree.SubElement(body, "h2").text = branch
+        items = etree.SubElement(body, "ul")
+        for result in sorted(branches[branch], key=lambda result: result.name):
+            link = etree.SubElement(etree.SubElement(items, "li"), "a")
+            link.set("href", result.html)
+            link.text = result.name
+    return etree.tostring(
+        html, encoding="unicode", method="html", doctype="<!DOCTYPE html>"
+    )
+
+
+def build_pages(
+    inputs: list[tuple[str, str]],
+    output_dir: str = "output",
+    n_workers: int = 1,
+    force: bool = False,
+    order: str = "cluster",
+    threshold: float = DEFAULT_THRESHOLD,
+    assets: Optional[list[BundledAsset]] = None,
+    executor: Optional[Executor] = None,
+) -> list[PageResult]:
+    """Build a heatmap page for every result file, plus an index page.
+
+    Pages whose input (and the templates) are unchanged since the last build are
+    skipped. Each page's data is written once as pre-compressed assets (see
+    :py:mod:`~cpac_regression_dashboard.utils.data_assets`), and the scripts
+    (:data:`VENDOR_SCRIPTS` and :data:`SCRIPTS`) are bundled once into
+    ``{output_dir}/assets`` for every page to share (see
+    :py:mod:`~.static_assets`).
+
+    Parameters
+    ----------
+    inputs : list of (str, str)
+        ``(result file, branch)`` pairs.
+
+    output_dir : str
+        Pages are written to ``{output_dir}/{branch}/{data_source}.html`` and the
+        index to ``{output_dir}/index.html``.
+
+    n_workers : int
+        Number of worker processes. ``1`` builds everything in this process.
+
+    force : bool
+        Rebuild pages even if they are up to date.
+
+    order : str
+        Row and column order; see :py:func:`~.analysis.analyze_matrix`.
+
+    threshold : float
+        Coefficients below this are counted in each row and column's summary.
+
+    assets : list of BundledAsset, optional
+        Scripts already bundled into ``output_dir``, e.g. by an earlier call.
+
+    executor : concurrent.futures.Executor, optional
+        Workers to build pages in instead of ``n_workers`` new processes, e.g.
+        to reuse them (and the templates they have parsed) across calls.
+
+    Returns
+    -------
+    list of PageResult
+    """
+    if assets is None:
+        assets = bundle_scripts(output_dir, VENDOR_SCRIPTS, SCRIPTS)
+    # bundled files are named by content, so a change to any script changes this
+    template_digest = hashlib.sha256(
+        json.dumps([_template()[1], *map(repr, assets)]).encode("utf-8")
+    ).hexdigest()
+    manifest_path = os.path.join(output_dir, MANIFEST_FILENAME)
+    manifest: dict[str, dict[str, Any]] = {}
+    # loaded even with ``force``, so the index keeps pages not rebuilt this time
+    if os.path.exists(manifest_path):
+        with open(manifest_path, "r", encoding="utf-8") as _f:
+            manifest = json.load(_f)
+    jobs: list[PageJob] = []
+    results: list[PageResult] = []
+    for json_file, branch in inputs:
+        os.makedirs(os.path.join(output_dir, branch), exist_ok=True)
+        name = _page_name(json_file, branch)
+        job = PageJob(
+            json_file, branch, name, file_digest(json_file), order, threshold
+        )
+        html = f"{branch}/{name}.html"
+        if not force and manifest.get(html) == {
+            "input": job.digest,
+            "template": template_digest,
+            "options": [order, threshold],
+        } and os.path.exists(os.path.join(output_dir, html)):
+            results.append(PageResult(branch, name, html, False))
+        else:
+            jobs.append(job)
+    if executor is not None and len(jobs) > 1:
+        built = list(
+            executor.map(
+                build_page, jobs, [output_dir] * len(jobs), [assets] * len(jobs)
+            )
+        )
+    elif n_workers > 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=n_workers) as pool:
+            built = list(
+                pool.map(
+                    build_page,
+                    jobs,
+                    [output_dir] * len(jobs),
+                    [assets] * len(jobs),
+                )
+            )
+    else:
+        built = [build_page(job, output_dir, assets) for job in jobs]
+    for job, result in zip(jobs, built):
+        if result.error is None:
+            manifest[result.html] = {
+                "input": job.digest,
+                "template": template_digest,
+                "options": [order, threshold],
+            }
+        else:
+            manifest.pop(result.html, None)
+    results.extend(built)
+    with open(manifest_path, "w", encoding="utf-8") as _f:
+        json.dump(manifest, _f, indent=2, sort_keys=True)
+    # link every page built so far, not only those from this run
+    index = {result.html: result for result in results}
+    for html in manifest:
+        if html not in index:
+            branch, _, page = html.partition("/")
+            index[html] = PageResult(branch, os.path.splitext(page)[0], html, False)
+    _write_if_changed(
+        os.path.join(output_dir, "index.html"), render_index(list(index.values()))
+    )
+    return results
@@ -0,0 +1,224 @@
+"""Dashboard data written once as separate, pre-compressed assets.
+
+A dataset ``{name}`` is a manifest, ``{name}.manifest.json``, listing the rows
+and columns of the heatmap and the chunks holding its records. Small datasets are
+one chunk, ``{name}.json``; larger ones get one chunk per data source,
+``{name}.{i}.json``, so pages can draw each as it arrives. Every file also gets a
+gzip (``.gz``) and, if :py:mod:`brotli` is installed, a Brotli (``.br``) copy for
+servers (and the page's loader, ``templates/data_loader.js``) to use.
+"""
+from dataclasses import asdict, dataclass, field
+import gzip
+import json
+import os
+from typing import Any, Iterable, Iterator, Optional
+
+import numpy as np
+
+try:
+    import brotli
+except ImportError:  # optional
+    brotli = None
+
+from cpac_regression_dashboard.utils.analysis import analyze_matrix, DEFAULT_THRESHOLD
+from cpac_regression_dashboard.utils.columnar import CorrelationMatrix
+from cpac_regression_dashboard.utils.instrumentation import count, span
+from cpac_regression_dashboard.utils.records import CorrelationRecord, write_records
+
+CHUNK_RECORDS: int = 20000
+"""Datasets with more records than this are split into one chunk per column."""
+
+
+@dataclass
+class DataChunk:
+    """A file of records for some of the columns."""
+
+    file: str
+    """Filename, relative to the manifest."""
+    columns: list[str]
+    records: int
+
+
+@dataclass
+class DataManifest:
+    """Index of a chunked dataset."""
+
+    rows: list[str]
+    """Features, bottom to top as the heatmap draws them."""
+    columns: list[str]
+    """Data sources, in the order the heatmap draws them."""
+    chunks: list[DataChunk] = field(default_factory=list)
+    encodings: list[str] = field(default_factory=list)
+    """Pre-compressed copies available for every file, e.g. ``["br", "gzip"]``."""
+    threshold: Optional[float] = None
+    row_stats: dict[str, list] = field(default_factory=dict)
+    """``min``, ``mean``, ``below`` (the threshold) and ``missing`` per row, in
+    the order of :py:attr:`rows`; see :py:class:`~.analysis.AxisStats`."""
+    column_stats: dict[str, list] = field(default_factory=dict)
+    """The same per column."""
+    overview: Optional[str] = None
+    """Filename of a down-sampled matrix (:py:func:`~.analysis.overview`), rows
+    top to bottom, for datasets with many rows."""
+
+
+def compress_asset(path: str, chunk_size: int = 1 << 20) -> list[str]:
+    """Write pre-compressed copies of a file, returning their encodings.
+
+    The file is read and compressed ``chunk_size`` bytes at a time.
+    """
+    encodings = []
+    if brotli is not None:
+        compressor = brotli.Compressor(quality=11)
+        with open(path, "rb") as source, open(f"{path}.br", "wb") as target:
+            while chunk := source.read(chunk_size):
+                target.write(compressor.process(chunk))
+            target.write(compressor.finish())
+        encodings.append("br")
+    with open(path, "rb") as source, open(f"{path}.gz", "wb") as raw:
+        # no filename and mtime=0 keep the output identical for identical input
+        with gzip.GzipFile("", "wb", 9, raw, mtime=0) as target:
+            while chunk := source.read(chunk_size):
+                target.write(chunk)
+    encodings.append("gzip")
+    return encodings
+
+
+def write_data_assets(
+    records: Iterable[CorrelationRecord],
+    directory: str,
+    name: str,
+    chunk_records: int = CHUNK_RECORDS,
+    order: str = "cluster",
+    threshold: float = DEFAULT_THRESHOLD,
+) -> DataManifest:
+    """Write records as a manifest plus chunks, each pre-compressed.
+
+    Rows and columns are ordered, and summarized, by
+    :py:func:`~.analysis.analyze_matrix`.
+
+    Parameters
+    ----------
+    records : iterable of CorrelationRecord
+        Read completely before anything is written, so they may come from a file
+        that is about to be overwritten.
+
+    directory : str
+
+    name : str
+        Base filename.
+
+    chunk_records : int
+        Split into one chunk per column above this many records.
+
+    order : str
+        ``"cluster"`` or ``"name"``; see :py:func:`~.analysis.analyze_matrix`.
+
+    threshold : float
+        Coefficients below this are counted in the row and column summaries.
+
+    Returns
+    -------
+    DataManifest
+        As written to ``{directory}/{name}.manifest.json``.
+    """
+    with span("write_data_assets", name=name):
+        return _write_data_assets(
+            records, directory, name, chunk_records, order, threshold
+        )
+
+
+def ordered_records(
+    records: Iterable[CorrelationRecord],
+    order: str = "cluster",
+    threshold: float = DEFAULT_THRESHOLD,
+) -> tuple[DataManifest, Iterator[CorrelationRecord]]:
+    """Order records as :py:func:`write_data_assets` does, for a page to embed.
+
+    Returns
+    -------
+    DataManifest
+        Without chunks or an overview.
+
+    iterator of CorrelationRecord
+        One data source at a time, in the order of the manifest's columns, each
+        with its rows in the manifest's order.
+    """
+    with span("ordered_records", order=order):
+        matrix, manifest, row_order, column_order, _ = _analyze(
+            records, order, threshold
+        )
+        return manifest, matrix.to_records(row_order, column_order)
+
+
+def _analyze(
+    records: Iterable[CorrelationRecord], order: str, threshold: float
+) -> tuple[
+    CorrelationMatrix, DataManifest, np.ndarray, np.ndarray, Optional[dict[str, Any]]
+]:
+    """Order and summarize records.
+
+    Returns the records as a matrix, a manifest without chunks, the indices of
+    the matrix's rows and columns in the manifest's order, and the
+    :py:func:`~.analysis.overview`, if any.
+    """
+    # records are kept as a matrix, not as objects, and re-emitted from it in order
+    matrix = CorrelationMatrix.from_records(records, np.float64)
+    analysis = analyze_matrix(matrix, threshold, order)
+    # heatmap.js draws the first row of its domain at the bottom
+    bottom_up = np.arange(len(analysis.rows))[::-1]
+    row_index = {row: i for i, row in enumerate(matrix.rows.tolist())}
+    column_index = {column: j for j, column in enumerate(matrix.columns.tolist())}
+    row_order = np.array([row_index[row] for row in analysis.rows[::-1]], np.intp)
+    column_order = np.array(
+        [column_index[column] for column in analysis.columns], np.intp
+    )
+    manifest = DataManifest(
+        analysis.rows[::-1],
+        analysis.columns,
+        threshold=threshold,
+        row_stats=analysis.row_stats.take(bottom_up).to_dict(),
+        column_stats=analysis.column_stats.to_dict(),
+    )
+    return matrix, manifest, row_order, column_order, analysis.overview
+
+
+def _write_json_asset(path: str, content: Any) -> list[str]:  # noqa: ANN401
+    """Write compact JSON and its pre-compressed copies."""
+    with open(path, "w", encoding="utf-8") as _f:
+        json.dump(content, _f, separators=(",", ":"))
+    return compress_asset(path)
+
+
+def _write_data_assets(
+    records: Iterable[CorrelationRecord],
+    directory: str,
+    name: str,
+    chunk_records: int,
+    order: str,
+    threshold: float,
+) -> DataManifest:
+    matrix, manifest, row_order, column_order, overview = _analyze(
+        records, order, threshold
+    )
+    if int(np.count_nonzero(matrix.present)) > chunk_records:
+        groups = [
+            ([column], column_order[j : j + 1])
+            for j, column in enumerate(manifest.columns)
+        ]
+        filenames = [f"{name}.{i}.json" for i in range(len(groups))]
+    else:
+        groups = [(manifest.columns, column_order)]
+        filenames = [f"{name}.json"]
+    for filename, (columns, indices) in zip(filenames, groups):
+        path = os.path.join(directory, filename)
+        written = write_records(path, matrix.to_records(row_order, indices))
+        manifest.chunks.append(DataChunk(filename, columns, written))
+        manifest.encodings = compress_asset(path)
+        count(records=written, files=1, bytes=os.path.getsize(path))
+    if overview is not None:
+        manifest.overview = f"{name}.overview.json"
+        _write_json_asset(os.path.join(directory, manifest.overview), overview)
+    _write_json_asset(
+        os.path.join(directory, f"{name}.manifest.json"), asdict(manifest)
+    )
+    return manifest
@@ -0,0 +1,179 @@
+"""Compare two sets of correlation results and rank what got worse."""
+from dataclasses import dataclass
+import math
+from typing import Any, Iterable, Iterator, NamedTuple, Optional
+
+import numpy as np
+
+from cpac_regression_dashboard.utils.columnar import CorrelationMatrix
+from cpac_regression_dashboard.utils.comment_table import COMMENT_LIMIT
+from cpac_regression_dashboard.utils.instrumentation import count, span
+from cpac_regression_dashboard.utils.records import CorrelationRecord, read_records
+
+DELTA_DOMAIN: tuple[float, float] = (-0.2, 0.0)
+"""Colour range of the delta heatmap: red at a drop of 0.2 or more, green at 0."""
+_DIGITS = 12
+"""Decimal places kept in deltas, dropping floating-point noise."""
+
+
+class Regression(NamedTuple):
+    """A coefficient that got worse."""
+
+    feature: str
+    site: str
+    baseline: float
+    candidate: Optional[float]
+    """``None`` if the candidate lost the value (missing or not finite)."""
+    delta: Optional[float]
+    """``candidate - baseline``, or ``None`` if the value was lost."""
+
+
+def load_matrix(paths: Iterable[str]) -> CorrelationMatrix:
+    """Read result files (JSON or ``.npz``) into one double-precision matrix."""
+    paths = list(paths)
+    with span("load_matrix", files=len(paths)):
+        matrix = CorrelationMatrix.from_records(
+            (record for path in paths for record in read_records(path)), np.float64
+        )
+        count(cells=int(np.count_nonzero(matrix.present)))
+    return matrix
+
+
+@dataclass
+class DeltaReport:
+    """A candidate result set aligned with a baseline, cell for cell.
+
+    Rows and columns are the baseline's; candidate cells with no baseline
+    counterpart are only counted, in ``new``.
+    """
+
+    rows: np.ndarray
+    columns: np.ndarray
+    baseline: np.ndarray
+    baseline_present: np.ndarray
+    candidate: np.ndarray
+    candidate_present: np.ndarray
+    new: int
+    """Candidate cells absent from the baseline."""
+
+    @property
+    def delta(self) -> np.ndarray:
+        """``candidate - baseline`` for every cell (``NaN`` where either is)."""
+        return np.round(self.candidate - self.baseline, _DIGITS)
+
+    @property
+    def compared(self) -> int:
+        """Number of baseline cells with a finite value."""
+        return int(np.count_nonzero(self.baseline_present & np.isfinite(self.baseline)))
+
+    def regressions(self, tolerance: float = 0.0) -> list[Regression]:
+        """Cells that dropped by more than ``tolerance`` or lost their value.
+
+        Lost values come first, then the largest drops.
+        """
+        delta = self.delta
+        base_ok = self.baseline_present & np.isfinite(self.baseline)
+        candidate_ok = self.candidate_present & np.isfinite(self.candidate)
+        lost = base_ok & ~candidate_ok
+        worse = base_ok & candidate_ok & (delta < -tolerance)
+        i, j = np.nonzero(lost | worse)
+        order = np.argsort(np.where(lost[i, j], -np.inf, delta[i, j]), kind="stable")
+        i, j = i[order], j[order]
+        rows, columns = self.rows[i].tolist(), self.columns[j].tolist()
+        baseline = self.baseline[i, j].tolist()
+        candidate = np.where(candidate_ok[i, j], self.candidate[i, j], np.nan).tolist()
+        deltas = np.where(candidate_ok[i, j], delta[i, j], np.nan).tolist()
+        return [
+            Regression(
+                *cell[:3], *(None if math.isnan(value) else value for value in cell[3:])
+            )
+            for cell in zip(rows, columns, baseline, candidate, deltas)
+        ]
+
+    def delta_records(self) -> Iterator[CorrelationRecord]:
+        """Yield the delta of every baseline cell, ``None`` where lost."""
+        delta = self.delta
+        rows, columns = self.rows.tolist(), self.columns.tolist()
+        i, j = np.nonzero(self.baseline_present & np.isfinite(self.baseline))
+        for row, column, value in zip(i.tolist(), j.tolist(), delta[i, j].tolist()):
+            yield CorrelationRecord(
+                rows[row], columns[column], None if math.isnan(value) else value
+            )
+
+    def to_dict(self, tolerance: float = 0.0) -> dict[str, Any]:
+        """Summarize as a JSON-serializable mapping."""
+        regressions = self.regressions(tolerance)
+        return {
+            "tolerance": tolerance,
+            "compared": self.compared,
+            "new": self.new,
+            "regressions": [regression._asdict() for regression in regressions],
+        }
+
+    def to_markdown(self, tolerance: float = 0.0, budget: int = COMMENT_LIMIT) -> str:
+        """Tabulate regressions, worst first, within ``budget`` UTF-8 bytes."""
+        regressions = self.regressions(tolerance)
+        summary = f"**{len(regressions)} of {self.compared} coefficients got worse**"
+        if tolerance:
+            summary += f" (by more than {tolerance:g})"
+        if not regressions:
+            return summary
+        parts = [
+            f"{summary}\n\n|feature|site|baseline|candidate|delta|\n|---|---|---|---|---|"
+        ]
+        remaining = budget - len(parts[0].encode("utf-8")) - 100
+        for shown, regression in enumerate(regressions):
+            row = (
+                f"\n|{regression.feature}|{regression.site}|{regression.baseline:.6g}|"
+                f"{_format(regression.candidate)}|{_format(regression.delta, '+.6g')}|"
+            )
+            remaining -= len(row.encode("utf-8"))
+            if remaining < 0:
+                parts.append(
+                    f"\n\n_{len(regressions) - shown} more omitted to fit the size "
+                    "limit._"
+                )
+                break
+            parts.append(row)
+        return "".join(parts)
+
+
+def _format(value: Optional[float], spec: str = ".6g") -> str:
+    """Format a coefficient, or ``lost`` for ``None``."""
+    return "lost" if value is None else format(value, spec)
+
+
+def compare(baseline: CorrelationMatrix, candidate: CorrelationMatrix) -> DeltaReport:
+    """Align ``candidate`` to ``baseline`` by feature and site.
+
+    Labels are matched through dictionaries and the values are copied with one
+    fancy-indexing assignment, so no cell is searched for.
+    """
+    with span("compare"):
+        return _compare(baseline, candidate)
+
+
+def _compare(baseline: CorrelationMatrix, candidate: CorrelationMatrix) -> DeltaReport:
+    row_index = {label: i for i, label in enumerate(candidate.rows.tolist())}
+    column_index = {label: j for j, label in enumerate(candidate.columns.tolist())}
+    rows = np.array([row_index.get(label, -1) for label in baseline.rows.tolist()])
+    columns = np.array(
+        [column_index.get(label, -1) for label in baseline.columns.tolist()]
+    )
+    shape = (len(baseline.rows), len(baseline.columns))
+    values = np.full(shape, np.nan)
+    present = np.zeros(shape, dtype=bool)
+    if rows.size and columns.size:
+        target = np.ix_(np.flatnonzero(rows >= 0), np.flatnonzero(columns >= 0))
+        source = np.ix_(rows[rows >= 0], columns[columns >= 0])
+        values[target] = np.asarray(candidate.values, dtype=np.float64)[source]
+        present[target] = np.asarray(candidate.present)[source]
+    return DeltaReport(
+        baseline.rows,
+        baseline.columns,
+        np.asarray(baseline.values, dtype=np.float64),
+        np.asarray(baseline.present),
+        values,
+        present,
+        int(np.count_nonzero(candidate.present)) - int(np.count_nonzero(present)),
+    )
@@ -0,0 +1,263 @@
+"""Watch directories for files that finish being written.
+
+:py:class:`InotifyWatcher` asks Linux to report each file closed after writing
+or moved into a watched directory, through ``inotify`` (via :py:mod:`ctypes`,
+so nothing needs compiling). Elsewhere, or on network filesystems such as NFS
+and Lustre, where ``inotify`` doesn't see writes from other hosts,
+:py:class:`PollingWatcher` compares each file's size and modification time at an
+interval instead. :py:class:`Debouncer` then gathers bursts of changes into
+batches.
+"""
+from abc import ABC, abstractmethod
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import time
+from typing import Callable, Optional
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_Q_OVERFLOW = 0x00004000
+IN_ONLYDIR = 0x01000000
+_EVENT = struct.Struct("iIII")
+"""``struct inotify_event`` without its name: wd, mask, cookie, len."""
+_READ_BYTES = 64 * 1024
+
+
+class FileWatcher(ABC):
+    """Report files in some directories as they are written.
+
+    Only files directly in ``directories`` whose path satisfies ``match`` are
+    reported.
+    """
+
+    method: str = ""
+    """How changes are noticed, e.g. for logs."""
+
+    def __init__(
+        self, directories: list[str], match: Optional[Callable[[str], bool]] = None
+    ) -> None:
+        self.directories = [os.path.abspath(directory) for directory in directories]
+        self.match = match or (lambda path: True)
+
+    def scan(self) -> set[str]:
+        """List every matching file that exists now."""
+        found = set()
+        for directory in self.directories:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.is_file() and self.match(entry.path):
+                        found.add(entry.path)
+        return found
+
+    @abstractmethod
+    def changes(self, timeout: Optional[float] = None) -> set[str]:
+        """Wait up to ``timeout`` seconds (forever if ``None``) for changes.
+
+        Returns
+        -------
+        set of str
+            Paths of files written since the last call, empty if none.
+        """
+
+    def close(self) -> None:
+        """Stop watching."""
+
+    def __enter__(self) -> "FileWatcher":
+        """Watch until the end of the ``with`` block."""
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        """Stop watching."""
+        self.close()
+
+
+class InotifyWatcher(FileWatcher):
+    """Watch with Linux ``inotify``.
+
+    Raises
+    ------
+    OSError
+        If ``inotify`` isn't available or a directory can't be watched.
+    """
+
+    method = "inotify"
+
+    def __init__(
+        self, directories: list[str], match: Optional[Callable[[str], bool]] = None
+    ) -> None:
+        super().__init__(directories, match)
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+            init, add_watch = libc.inotify_init1, libc.inotify_add_watch
+        except (AttributeError, OSError, TypeError) as error:
+            msg = f"inotify is not available: {error}"
+            raise OSError(msg) from error
+        add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self._fd = init(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+        self._directories: dict[int, str] = {}
+        for directory in self.directories:
+            wd = add_watch(
+                self._fd,
+                os.fsencode(directory),
+                IN_CLOSE_WRITE | IN_MOVED_TO | IN_ONLYDIR,
+            )
+            if wd < 0:
+                errno = ctypes.get_errno()
+                self.close()
+                raise OSError(errno, os.strerror(errno), directory)
+            self._directories[wd] = directory
+
+    def changes(self, timeout: Optional[float] = None) -> set[str]:
+        """Wait up to ``timeout`` seconds (forever if ``None``) for changes.
+
+        If the kernel's event queue overflowed, every matching file is reported.
+        """
+        found: set[str] = set()
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        while readable:
+            try:
+                data = os.read(self._fd, _READ_BYTES)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = _EVENT.unpack_from(data, offset)
+                offset += _EVENT.size
+                name = data[offset : offset + length].rstrip(b"\0")
+                offset += length
+                if mask & IN_Q_OVERFLOW:
+                    return self.scan()
+                if name and wd in self._directories:
+                    path = os.path.join(self._directories[wd], os.fsdecode(name))
+                    if self.match(path):
+                        found.add(path)
+        return found
+
+    def close(self) -> None:
+        """Stop watching."""
+        if getattr(self, "_fd", -1) >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+
+class PollingWatcher(FileWatcher):
+    """Watch by listing the directories every ``interval`` seconds.
+
+    A file is reported once its size and modification time are unchanged for
+    one interval, so files still being written aren't reported early. Files
+    that exist when watching starts aren't reported.
+    """
+
+    method = "polling"
+
+    def __init__(
+        self,
+        directories: list[str],
+        match: Optional[Callable[[str], bool]] = None,
+        interval: float = 2.0,
+    ) -> None:
+        super().__init__(directories, match)
+        self.interval = interval
+        self._reported = self._stat()
+        self._seen = dict(self._reported)
+
+    def _stat(self) -> dict[str, tuple[int, int]]:
+        """Size and modification time of each matching file."""
+        stats = {}
+        for path in self.scan():
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            stats[path] = (stat.st_size, stat.st_mtime_ns)
+        return stats
+
+    def changes(self, timeout: Optional[float] = None) -> set[str]:
+        """Wait up to ``timeout`` seconds (forever if ``None``) for changes."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            wait = self.interval
+            if deadline is not None:
+                wait = min(wait, max(0.0, deadline - time.monotonic()))
+            time.sleep(wait)
+            stats = self._stat()
+            found = {
+                path
+                for path, stat in stats.items()
+                if stat == self._seen.get(path) and stat != self._reported.get(path)
+            }
+            self._seen = stats
+            self._reported.update((path, stats[path]) for path in found)
+            if found or (deadline is not None and time.monotonic() >= deadline):
+                return found
+
+
+def watch_files(
+    directories: list[str],
+    match: Optional[Callable[[str], bool]] = None,
+    polling: bool = False,
+    interval: float = 2.0,
+) -> FileWatcher:
+    """Watch with ``inotify`` if possible, otherwise by polling.
+
+    Parameters
+    ----------
+    directories : list of str
+
+    match : callable, optional
+        Report only paths for which this returns ``True``.
+
+    polling : bool
+        Poll even if ``inotify`` is available, e.g. on a network filesystem.
+
+    interval : float
+        Seconds between polls.
+    """
+    if not polling:
+        try:
+            return InotifyWatcher(directories, match)
+        except OSError:
+            pass
+    return PollingWatcher(directories, match, interval)
+
+
+class Debouncer:
+    """Gather changes into batches, once they stop arriving.
+
+    A batch is ready ``quiet`` seconds after its last change, or ``max_wait``
+    seconds after its first, whichever is sooner, so a steady stream of
+    changes is still handled.
+    """
+
+    def __init__(self, quiet: float = 2.0, max_wait: float = 30.0) -> None:
+        self.quiet = quiet
+        self.max_wait = max_wait
+        self.pending: dict[str, float] = {}
+        """Each changed path, with when it first changed (``time.monotonic``)."""
+        self._last = 0.0
+
+    def add(self, paths: set[str], now: Optional[float] = None) -> None:
+        """Queue changed paths."""
+        if paths:
+            self._last = time.monotonic() if now is None else now
+            for path in paths:
+                self.pending.setdefault(path, self._last)
+
+    def timeout(self, now: Optional[float] = None) -> Optional[float]:
+        """Seconds until the pending batch is ready; ``None`` if nothing is."""
+        if not self.pending:
+            return None
+        now = time.monotonic() if now is None else now
+        first = min(self.pending.values())
+        return max(0.0, min(self._last + self.quiet, first + self.max_wait) - now)
+
+    def take(self) -> dict[str, float]:
+        """Remove and return the pending batch, ready or not."""
+        batch, self.pending = self.pending, {}
+        return batch
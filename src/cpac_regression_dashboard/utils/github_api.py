@@ -0,0 +1,356 @@
+"""Asynchronous GitHub REST client sharing one pooled HTTP session."""
+import asyncio
+import base64
+from http import HTTPStatus
+import time
+from types import TracebackType
+from typing import Any, Mapping, Optional, Type, Union
+
+import aiohttp
+
+from cpac_regression_dashboard.utils.instrumentation import count, span
+
+_JSON = Union[dict[str, Any], list[Any], str, int, float, bool, None]
+GITHUB_API: str = "https://api.github.com"
+RETRY_STATUSES: frozenset[int] = frozenset({429, 500, 502, 503, 504})
+"""Responses worth retrying after a backoff."""
+
+
+class GitHubAPIError(RuntimeError):
+    """A GitHub API request failed."""
+
+    def __init__(self, method: str, url: str, status: int, message: str) -> None:
+        """Record the failed request."""
+        super().__init__(f"{method} {url}: {status} {message}")
+        self.status = status
+
+
+class GitHubClient:
+    """GitHub REST client over a single ``aiohttp`` session.
+
+    Connections are pooled and reused for every request made through the client,
+    and at most ``max_connections`` requests are in flight at once. Transient
+    failures (connection errors and :data:`RETRY_STATUSES`) are retried with
+    exponential backoff, honouring ``Retry-After`` when GitHub sends it. Once
+    ``X-RateLimit-Remaining`` reaches zero, requests wait for
+    ``X-RateLimit-Reset`` instead of failing.
+
+    Use as an async context manager::
+
+        async with GitHubClient(token) as client:
+            await client.commit_files(owner, repo, branch, {"a.png": data}, "Add")
+    """
+
+    def __init__(
+        self,
+        token: str = "",
+        api_url: str = GITHUB_API,
+        retries: int = 4,
+        backoff: float = 0.5,
+        max_connections: int = 8,
+    ) -> None:
+        """Configure the client; the session is opened on entering the context."""
+        self.api_url = api_url.rstrip("/")
+        self.retries = retries
+        self.backoff = backoff
+        self.max_connections = max_connections
+        self.headers = {
+            "Accept": "application/vnd.github+json",
+            "X-GitHub-Api-Version": "2022-11-28",
+        }
+        if token:
+            self.headers["Authorization"] = f"Bearer {token}"
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._rate_limit_reset: float = 0.0
+        """The latest reset (epoch seconds) of an exhausted rate limit seen."""
+
+    async def __aenter__(self) -> "GitHubClient":
+        """Open the pooled session."""
+        self._semaphore = asyncio.Semaphore(self.max_connections)
+        self._session = aiohttp.ClientSession(
+            headers=self.headers,
+            connector=aiohttp.TCPConnector(limit=self.max_connections),
+            timeout=aiohttp.ClientTimeout(total=60),
+        )
+        return self
+
+    async def __aexit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc_value: Optional[BaseException],
+        traceback: Optional[TracebackType],
+    ) -> None:
+        """Close the session."""
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def _delay(self, attempt: int, headers: Optional[Mapping[str, str]]) -> float:
+        """Seconds to wait before retry number ``attempt``."""
+        if headers and headers.get("Retry-After", "").isdigit():
+            return float(headers["Retry-After"])
+        return self.backoff * 2**attempt
+
+    def _track_rate_limit(self, headers: Mapping[str, str]) -> bool:
+        """Note an exhausted rate limit, returning whether it is exhausted.
+
+        Concurrent responses may arrive in any order, so the latest reset seen
+        is kept.
+        """
+        if headers.get("X-RateLimit-Remaining") == "0":
+            reset = headers.get("X-RateLimit-Reset", "")
+            if reset.isdigit():
+                self._rate_limit_reset = max(self._rate_limit_reset, float(reset))
+            return True
+        return False
+
+    async def _wait_for_rate_limit(self) -> None:
+        """Sleep until an exhausted rate limit resets."""
+        delay = self._rate_limit_reset - time.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def request(self, method: str, path: str, json: _JSON = None) -> Any:  # noqa: ANN401
+        """Make an API request, returning the decoded JSON response (if any).
+
+        Parameters
+        ----------
+        method : str
+            HTTP method.
+
+        path : str
+            Path relative to the API root, e.g. ``/repos/{owner}/{repo}``.
+
+        json : optional
+            Request body.
+
+        Raises
+        ------
+        GitHubAPIError
+            For an unsuccessful response, once retries are exhausted.
+        """
+        if self._session is None or self._semaphore is None:
+            msg = "GitHubClient must be used as an async context manager"
+            raise RuntimeError(msg)
+        url = f"{self.api_url}{path}"
+        for attempt in range(self.retries + 1):
+            try:
+                async with self._semaphore:
+                    await self._wait_for_rate_limit()
+                    count(requests=1)
+                    async with self._session.request(
+                        method, url, json=json
+                    ) as response:
+                        limited = self._track_rate_limit(response.headers)
+                        if response.status < HTTPStatus.BAD_REQUEST:
+                            if response.status == HTTPStatus.NO_CONTENT:
+                                return None
+                            return await response.json(content_type=None)
+                        retry = response.status in RETRY_STATUSES or (
+                            limited and response.status == HTTPStatus.FORBIDDEN
+                        )
+                        if not retry or attempt == self.retries:
+                            raise GitHubAPIError(
+                                method, url, response.status, await response.text()
+                            )
+                        if limited and self._rate_limit_reset > time.time():
+                            # waited out on the next attempt
+                            delay = 0.0
+                        else:
+                            # e.g. no X-RateLimit-Reset to wait for
+                            delay = self._delay(attempt, response.headers)
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+                if attempt == self.retries:
+                    raise
+                delay = self._delay(attempt, None)
+            await asyncio.sleep(delay)
+        msg = "unreachable"
+        raise AssertionError(msg)
+
+    async def create_blobs(
+        self, owner: str, repo: str, files: Mapping[str, bytes]
+    ) -> dict[str, str]:
+        """Upload file contents as Git blobs, concurrently.
+
+        Parameters
+        ----------
+        owner, repo : str
+
+        files : mapping of str to bytes
+            File contents keyed by path in the repository.
+
+        Returns
+        -------
+        dict of str to str
+            Blob SHA keyed by path.
+        """
+        with span("create_blobs"):
+            count(blobs=len(files), bytes=sum(map(len, files.values())))
+            blobs = await asyncio.gather(
+                *(
+                    self.request(
+                        "POST",
+                        f"/repos/{owner}/{repo}/git/blobs",
+                        {
+                            "content": base64.b64encode(content).decode("ascii"),
+                            "encoding": "base64",
+                        },
+                    )
+                    for content in files.values()
+                )
+            )
+        return {path: blob["sha"] for path, blob in zip(files, blobs)}
+
+    async def commit_blobs(
+        self,
+        owner: str,
+        repo: str,
+        branch: str,
+        blobs: Mapping[str, str],
+        message: str,
+        attempts: int = 3,
+    ) -> str:
+        """Commit already-uploaded blobs to the tip of a branch.
+
+        Creates one tree, one commit and a fast-forward ref update. If the branch
+        moves in the meantime, the commit is rebuilt on the new tip, up to
+        ``attempts`` times.
+
+        Parameters
+        ----------
+        owner, repo, branch : str
+
+        blobs : mapping of str to str
+            Blob SHA keyed by path in the repository, from
+            :py:meth:`create_blobs`.
+
+        message : str
+            Commit message.
+
+        attempts : int
+
+        Returns
+        -------
+        str
+            SHA of the new commit, or of the tip if the files were already there.
+        """
+        with span("commit_blobs", files=len(blobs)):
+            return await self._commit_blobs(
+                owner, repo, branch, blobs, message, attempts
+            )
+
+    async def _commit_blobs(
+        self,
+        owner: str,
+        repo: str,
+        branch: str,
+        blobs: Mapping[str, str],
+        message: str,
+        attempts: int,
+    ) -> str:
+        prefix = f"/repos/{owner}/{repo}/git"
+        tree_entries = [
+            {"path": path, "mode": "100644", "type": "blob", "sha": sha}
+            for path, sha in blobs.items()
+        ]
+        for attempt in range(attempts):
+            ref = await self.request("GET", f"{prefix}/ref/heads/{branch}")
+            parent = ref["object"]["sha"]
+            base = await self.request("GET", f"{prefix}/commits/{parent}")
+            tree = await self.request(
+                "POST",
+                f"{prefix}/trees",
+                {"base_tree": base["tree"]["sha"], "tree": tree_entries},
+            )
+            if tree["sha"] == base["tree"]["sha"]:
+                return parent  # nothing changed
+            commit = await self.request(
+                "POST",
+                f"{prefix}/commits",
+                {"message": message, "tree": tree["sha"], "parents": [parent]},
+            )
+            try:
+                await self.request(
+                    "PATCH",
+                    f"{prefix}/refs/heads/{branch}",
+                    {"sha": commit["sha"], "force": False},
+                )
+            except GitHubAPIError as error:
+                # 422: not a fast-forward because someone else pushed first
+                if (
+                    error.status != HTTPStatus.UNPROCESSABLE_ENTITY
+                    or attempt == attempts - 1
+                ):
+                    raise
+                continue
+            return commit["sha"]
+        msg = "unreachable"
+        raise AssertionError(msg)
+
+    async def commit_files(
+        self,
+        owner: str,
+        repo: str,
+        branch: str,
+        files: Mapping[str, bytes],
+        message: str,
+        attempts: int = 3,
+    ) -> str:
+        """Commit files to the tip of a branch with the Git Data API.
+
+        Blobs are created concurrently, then committed with
+        :py:meth:`commit_blobs`.
+
+        Parameters
+        ----------
+        owner, repo, branch : str
+
+        files : mapping of str to bytes
+            File contents keyed by path in the repository.
+
+        message : str
+            Commit message.
+
+        attempts : int
+
+        Returns
+        -------
+        str
+            SHA of the new commit, or of the tip if the files were already there.
+        """
+        blobs = await self.create_blobs(owner, repo, files)
+        return await self.commit_blobs(owner, repo, branch, blobs, message, attempts)
+
+    async def pulls_for_commit(
+        self, owner: str, repo: str, sha: str, state: Optional[str] = "open"
+    ) -> list[dict[str, Any]]:
+        """List pull requests containing a commit, in one request.
+
+        Parameters
+        ----------
+        owner, repo, sha : str
+
+        state : str, optional
+            Only pull requests in this state; ``None`` for all.
+        """
+        pulls = await self.request(
+            "GET", f"/repos/{owner}/{repo}/commits/{sha}/pulls?per_page=100"
+        )
+        return [pull for pull in pulls if state is None or pull.get("state") == state]
+
+    async def create_commit_comment(
+        self, owner: str, repo: str, sha: str, body: str
+    ) -> dict[str, Any]:
+        """Comment on a commit."""
+        return await self.request(
+            "POST", f"/repos/{owner}/{repo}/commits/{sha}/comments", {"body": body}
+        )
+
+    async def create_issue_comment(
+        self, owner: str, repo: str, number: int, body: str
+    ) -> dict[str, Any]:
+        """Comment on an issue or pull request."""
+        return await self.request(
+            "POST", f"/repos/{owner}/{repo}/issues/{number}/comments", {"body": body}
+        )
@@ -0,0 +1,219 @@
+"""Render a correlation heatmap to SVG without a browser.
+
+Mirrors ``templates/heatmap.js``: rows are features sorted descending (so the
+first alphabetically is drawn at the top), columns are data sources in the order
+they first appear, and cells are coloured with D3's ``interpolateRdYlGn`` over
+``[0.8, 1]``.
+"""
+from dataclasses import dataclass
+from html import escape
+from typing import Callable, Iterable, Optional
+
+from cpac_regression_dashboard.utils.instrumentation import count, span
+from cpac_regression_dashboard.utils.records import CorrelationRecord
+
+_RDYLGN = [
+    tuple(int(color[i : i + 2], 16) for i in (0, 2, 4))
+    for color in (
+        "a50026 d73027 f46d43 fdae61 fee08b ffffbf d9ef8b a6d96a 66bd63 1a9850 006837"
+    ).split()
+]
+"""D3's 11-class RdYlGn scheme, the basis of ``d3.interpolateRdYlGn``."""
+
+
+@dataclass
+class Margin:
+    """Space around the plot, in pixels."""
+
+    top: int = 80
+    right: int = 25
+    bottom: int = 30
+    left: int = 40
+
+
+def _basis(t1: float, v0: float, v1: float, v2: float, v3: float) -> float:
+    """Uniform cubic B-spline, as in ``d3-interpolate``'s ``basis``."""
+    t2 = t1 * t1
+    t3 = t2 * t1
+    return (
+        (1 - 3 * t1 + 3 * t2 - t3) * v0
+        + (4 - 6 * t2 + 3 * t3) * v1
+        + (1 + 3 * t1 + 3 * t2 - 3 * t3) * v2
+        + t3 * v3
+    ) / 6
+
+
+def interpolate_rdylgn(t: float) -> str:
+    """Port of ``d3.interpolateRdYlGn``: a colour for ``t`` in ``[0, 1]``."""
+    n = len(_RDYLGN) - 1
+    if t <= 0:
+        t, i = 0.0, 0
+    elif t >= 1:
+        t, i = 1.0, n - 1
+    else:
+        i = int(t * n)
+    channels = []
+    for channel in range(3):
+        values = [color[channel] for color in _RDYLGN]
+        v1, v2 = values[i], values[i + 1]
+        v0 = values[i - 1] if i > 0 else 2 * v1 - v2
+        v3 = values[i + 2] if i < n - 1 else 2 * v2 - v1
+        channels.append(
+            max(0, min(255, round(_basis((t - i / n) * n, v0, v1, v2, v3))))
+        )
+    return "rgb({}, {}, {})".format(*channels)
+
+
+def sequential_color(
+    domain: tuple[float, float] = (0.8, 1.0), unknown: str = "black"
+) -> Callable[[Optional[float]], str]:
+    """Port of ``d3.scaleSequential().interpolator(d3.interpolateRdYlGn)``."""
+    low, high = domain
+
+    def color(value: Optional[float]) -> str:
+        if value is None:
+            return unknown
+        return interpolate_rdylgn((value - low) / (high - low) if high != low else 0.5)
+
+    return color
+
+
+def band_scale(
+    domain: list[str], start: float, stop: float, padding: float = 0.05
+) -> tuple[dict[str, float], float]:
+    """Port of ``d3.scaleBand().padding(padding)``.
+
+    Returns the position of each band and the bandwidth. A reversed range
+    (``start > stop``) puts the first band at ``start``, as in D3.
+    """
+    n = len(domain)
+    reverse = stop < start
+    low, high = (stop, start) if reverse else (start, stop)
+    step = (high - low) / max(1, n - padding + padding * 2)
+    low += (high - low - step * (n - padding)) * 0.5
+    positions = [low + step * i for i in range(n)]
+    if reverse:
+        positions.reverse()
+    return dict(zip(domain, positions)), step * (1 - padding)
+
+
+def render_heatmap_svg(
+    records: Iterable[CorrelationRecord],
+    title: str = "",
+    subtitle: str = "",
+    width: int = 800,
+    height: int = 5000,
+    margin: Optional[Margin] = None,
+    color: Optional[Callable[[Optional[float]], str]] = None,
+    rows: Optional[list[str]] = None,
+    columns: Optional[list[str]] = None,
+) -> str:
+    """Draw records as an SVG heatmap, like ``templates/heatmap.js`` does.
+
+    Parameters
+    ----------
+    records : iterable of CorrelationRecord
+
+    title, subtitle : str
+
+    width, height : int
+        Overall size, including ``margin``.
+
+    margin : Margin, optional
+
+    color : callable, optional
+        Maps a value to a fill colour. Defaults to :py:func:`sequential_color`.
+
+    rows, columns : list of str, optional
+        Order to draw in, as in a :py:class:`~.data_assets.DataManifest` (rows
+        bottom to top); records for other labels are left out. By default rows
+        are sorted by name, descending, and columns are in first-seen order.
+
+    Returns
+    -------
+    str
+        A standalone SVG document.
+    """
+    margin = margin or Margin()
+    color = color or sequential_color()
+    inner_width = width - margin.left - margin.right
+    inner_height = height - margin.top - margin.bottom
+    data = sorted(records, key=lambda record: record.rowid, reverse=True)
+    groups = columns or list(dict.fromkeys(record.columnid for record in data))
+    variables = rows or list(dict.fromkeys(record.rowid for record in data))
+    x, x_bandwidth = band_scale(groups, 0, inner_width)
+    y, y_bandwidth = band_scale(variables, inner_height, 0)
+    if rows or columns:
+        data = [record for record in data if record.rowid in y and record.columnid in x]
+
+    parts = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}">',
+        f'<g transform="translate({margin.left},{margin.top})">',
+        '<g font-size="15" font-family="sans-serif" text-anchor="middle">',
+    ]
+    parts.extend(
+        f'<text x="{x[group] + x_bandwidth / 2:g}" y="-3">'
+        f"{escape(group, quote=False)}</text>"
+        for group in groups
+    )
+    parts.append(
+        f'</g><g font-size="15" font-family="sans-serif" text-anchor="end" '
+        f'transform="translate({inner_width},0)">'
+    )
+    parts.extend(
+        f'<text x="-3" y="{y[variable] + y_bandwidth / 2:g}" dy="0.32em">'
+        f"{escape(variable, quote=False)}</text>"
+        for variable in variables
+    )
+    parts.append("</g>")
+    parts.extend(
+        f'<rect x="{x[record.columnid] + x_bandwidth / 2:g}" '
+        f'y="{y[record.rowid]:g}" rx="4" ry="4" width="{y_bandwidth:g}" '
+        f'height="{y_bandwidth:g}" style="fill: {color(record.value)}; '
+        'stroke-width: 0; stroke: none; opacity: 0.8;"/>'
+        for record in data
+    )
+    parts.append(
+        f'<text x="0" y="-50" text-anchor="start" style="font-size: 22px;">'
+        f"{escape(title, quote=False)}</text>"
+        f'<text x="0" y="-20" text-anchor="start" '
+        f'style="font-size: 14px; fill: grey;">'
+        f"{escape(subtitle, quote=False)}</text></g></svg>"
+    )
+    return "".join(parts)
+
+
+def svg_to_png(svg: str) -> bytes:
+    """Rasterize an SVG document on a white background (requires ``cairosvg``)."""
+    from cairosvg import svg2png
+
+    return svg2png(bytestring=svg.encode("utf-8"), background_color="white")
+
+
+def write_snapshot(
+    path: str,
+    records: Iterable[CorrelationRecord],
+    title: str = "",
+    subtitle: str = "",
+    color: Optional[Callable[[Optional[float]], str]] = None,
+    rows: Optional[list[str]] = None,
+    columns: Optional[list[str]] = None,
+) -> None:
+    """Render records to an ``.svg`` or ``.png`` file, chosen by extension.
+
+    See :py:func:`render_heatmap_svg` for the parameters.
+    """
+    if not path.lower().endswith((".png", ".svg")):
+        msg = f"snapshot must be a .svg or .png file, not {path}"
+        raise ValueError(msg)
+    with span("snapshot", file=path):
+        svg = render_heatmap_svg(
+            records, title, subtitle, color=color, rows=rows, columns=columns
+        )
+        if path.lower().endswith(".png"):
+            content = svg_to_png(svg)
+        else:
+            content = svg.encode("utf-8")
+        with open(path, "wb") as _f:
+            _f.write(content)
+        count(files=1, bytes=len(content))
@@ -0,0 +1,313 @@
+"""Append-only SQLite store of correlation results across branches and commits."""
+import hashlib
+import os
+import sqlite3
+import time
+from types import TracebackType
+from typing import Iterator, NamedTuple, Optional, Type, Union
+
+from cpac_regression_dashboard.utils.instrumentation import count, span
+from cpac_regression_dashboard.utils.records import CorrelationRecord, read_records
+
+HISTORY_FILENAME: str = "regression_history.sqlite"
+"""Default store filename."""
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    branch TEXT NOT NULL,
+    sha TEXT NOT NULL,
+    created REAL NOT NULL,
+    UNIQUE (branch, sha)
+);
+CREATE TABLE IF NOT EXISTS sites (id INTEGER PRIMARY KEY, name TEXT UNIQUE NOT NULL);
+CREATE TABLE IF NOT EXISTS features (
+    id INTEGER PRIMARY KEY, name TEXT UNIQUE NOT NULL
+);
+CREATE TABLE IF NOT EXISTS correlations (
+    run_id INTEGER NOT NULL REFERENCES runs (id),
+    site_id INTEGER NOT NULL REFERENCES sites (id),
+    feature_id INTEGER NOT NULL REFERENCES features (id),
+    value REAL,
+    PRIMARY KEY (run_id, site_id, feature_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS correlations_value ON correlations (run_id, value);
+CREATE INDEX IF NOT EXISTS correlations_feature
+    ON correlations (feature_id, site_id, run_id);
+CREATE TABLE IF NOT EXISTS files (
+    digest TEXT NOT NULL,
+    path TEXT NOT NULL,
+    run_id INTEGER NOT NULL REFERENCES runs (id),
+    site TEXT NOT NULL,
+    records INTEGER NOT NULL,
+    ingested REAL NOT NULL,
+    PRIMARY KEY (digest, run_id)
+);
+"""
+_MIGRATE_FILES = """
+ALTER TABLE files RENAME TO files_by_digest;
+CREATE TABLE files (
+    digest TEXT NOT NULL,
+    path TEXT NOT NULL,
+    run_id INTEGER NOT NULL REFERENCES runs (id),
+    site TEXT NOT NULL,
+    records INTEGER NOT NULL,
+    ingested REAL NOT NULL,
+    PRIMARY KEY (digest, run_id)
+);
+INSERT INTO files SELECT * FROM files_by_digest;
+DROP TABLE files_by_digest;
+"""
+"""Stores written before files were keyed by run too."""
+
+
+class HistoryRow(NamedTuple):
+    """A stored correlation, with the run it came from."""
+
+    branch: str
+    sha: str
+    site: str
+    feature: str
+    value: Optional[float]
+
+
+def file_digest(path: str) -> str:
+    """SHA-256 of a file's contents."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def site_from_filename(path: str, branch: str) -> str:
+    """Get ``data_source`` from a ``{data_source}_{branch}.json`` filename."""
+    name = os.path.splitext(os.path.basename(path))[0]
+    suffix = f"_{branch}"
+    return name[: -len(suffix)] if name.endswith(suffix) else name
+
+
+class HistoryStore:
+    """Correlation results for every ingested (branch, commit) run.
+
+    Runs are ordered by when they were first ingested. Feature and site names
+    are interned, and each result file is ingested at most once per run,
+    recognized by the SHA-256 of its contents, so identical results from
+    another commit (e.g. a rerun) are still recorded for it.
+    """
+
+    def __init__(self, path: str = HISTORY_FILENAME) -> None:
+        """Open (and if needed create) the store."""
+        self.path = path
+        self.connection = sqlite3.connect(path, timeout=30)
+        with self.connection:
+            self.connection.executescript(_SCHEMA)
+            primary_key = [
+                column[1]
+                for column in self.connection.execute("PRAGMA table_info(files)")
+                if column[5]
+            ]
+            if primary_key == ["digest"]:
+                self.connection.executescript(_MIGRATE_FILES)
+
+    def close(self) -> None:
+        """Close the store."""
+        self.connection.close()
+
+    def __enter__(self) -> "HistoryStore":
+        """Enter context."""
+        return self
+
+    def __exit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc_value: Optional[BaseException],
+        traceback: Optional[TracebackType],
+    ) -> None:
+        """Close the store."""
+        self.close()
+
+    def _intern(self, table: str, name: str, cache: dict[str, int]) -> int:
+        if name not in cache:
+            self.connection.execute(
+                f"INSERT OR IGNORE INTO {table} (name) VALUES (?)", (name,)
+            )
+            cache[name] = self.connection.execute(
+                f"SELECT id FROM {table} WHERE name = ?", (name,)
+            ).fetchone()[0]
+        return cache[name]
+
+    def _run_id(self, branch: str, sha: str) -> int:
+        self.connection.execute(
+            "INSERT OR IGNORE INTO runs (branch, sha, created) VALUES (?, ?, ?)",
+            (branch, sha, time.time()),
+        )
+        return self.connection.execute(
+            "SELECT id FROM runs WHERE branch = ? AND sha = ?", (branch, sha)
+        ).fetchone()[0]
+
+    def ingest(
+        self, path: str, branch: str, sha: str, site: Optional[str] = None
+    ) -> Optional[int]:
+        """Add a result file (JSON or ``.npz``) to the store.
+
+        Parameters
+        ----------
+        path : str
+            ``{data_source}_{branch}.json`` (or ``.npz``) file.
+
+        branch, sha : str
+            Run the results belong to.
+
+        site : str, optional
+            Only used to record which site the file was for; defaults to the
+            ``data_source`` in the filename. Each record keeps its own
+            ``columnid`` as its site.
+
+        Returns
+        -------
+        int or None
+            Number of records ingested, or ``None`` if this file was already,
+            for the same branch and commit.
+        """
+        with span("ingest", file=path):
+            return self._ingest(path, branch, sha, site)
+
+    def _ingest(
+        self, path: str, branch: str, sha: str, site: Optional[str]
+    ) -> Optional[int]:
+        digest = file_digest(path)
+        if self.connection.execute(
+            "SELECT 1 FROM files f JOIN runs r ON r.id = f.run_id "
+            "WHERE f.digest = ? AND r.branch = ? AND r.sha = ?",
+            (digest, branch, sha),
+        ).fetchone():
+            return None
+        sites: dict[str, int] = {}
+        features: dict[str, int] = {}
+        with self.connection:
+            run_id = self._run_id(branch, sha)
+            rows = (
+                (
+                    run_id,
+                    self._intern("sites", record.columnid, sites),
+                    self._intern("features", record.rowid, features),
+                    record.value,
+                )
+                for record in read_records(path)
+            )
+            cursor = self.connection.executemany(
+                "INSERT OR REPLACE INTO correlations "
+                "(run_id, site_id, feature_id, value) VALUES (?, ?, ?, ?)",
+                rows,
+            )
+            ingested = cursor.rowcount
+            self.connection.execute(
+                "INSERT INTO files (digest, path, run_id, site, records, ingested) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    digest,
+                    os.path.abspath(path),
+                    run_id,
+                    site or site_from_filename(path, branch),
+                    ingested,
+                    time.time(),
+                ),
+            )
+        count(records=ingested, bytes=os.path.getsize(path))
+        return ingested
+
+    def runs(
+        self, branch: Optional[str] = None, last: Optional[int] = None
+    ) -> list[tuple[int, str, str]]:
+        """``(id, branch, sha)`` of stored runs, newest first."""
+        query = "SELECT id, branch, sha FROM runs"
+        params: list = []
+        if branch is not None:
+            query += " WHERE branch = ?"
+            params.append(branch)
+        query += " ORDER BY id DESC"
+        if last is not None:
+            query += " LIMIT ?"
+            params.append(last)
+        return self.connection.execute(query, params).fetchall()
+
+    def query(
+        self,
+        below: Optional[float] = None,
+        last: Optional[int] = None,
+        branch: Optional[str] = None,
+        sha: Optional[str] = None,
+        site: Optional[str] = None,
+        feature: Optional[str] = None,
+    ) -> Iterator[HistoryRow]:
+        """Yield stored correlations matching every given filter.
+
+        Parameters
+        ----------
+        below : float, optional
+            Only values less than this (missing values are included).
+
+        last : int, optional
+            Only the ``last`` most recently ingested runs (of ``branch``, if given).
+
+        branch, sha, site, feature : str, optional
+            Exact matches.
+
+        Yields
+        ------
+        HistoryRow
+            Newest run first, then lowest value first.
+        """
+        run_ids = [
+            run_id
+            for run_id, _, run_sha in self.runs(branch, last)
+            if sha is None or run_sha == sha
+        ]
+        if not run_ids:
+            return
+        query = (
+            "SELECT r.branch, r.sha, s.name, f.name, c.value FROM correlations c "
+            "JOIN runs r ON r.id = c.run_id JOIN sites s ON s.id = c.site_id "
+            "JOIN features f ON f.id = c.feature_id "
+            f"WHERE c.run_id IN ({','.join('?' * len(run_ids))})"
+        )
+        params: list = list(run_ids)
+        if below is not None:
+            query += " AND (c.value < ? OR c.value IS NULL)"
+            params.append(below)
+        if site is not None:
+            query += " AND s.name = ?"
+            params.append(site)
+        if feature is not None:
+            query += " AND f.name = ?"
+            params.append(feature)
+        query += " ORDER BY c.run_id DESC, c.value IS NOT NULL, c.value, f.name, s.name"
+        for row in self.connection.execute(query, params):
+            yield HistoryRow(*row)
+
+    def export_records(
+        self,
+        by_run: bool = False,
+        below: Optional[float] = None,
+        **filters: Optional[Union[str, int]],
+    ) -> Iterator[CorrelationRecord]:
+        """Yield records for the dashboards from :py:meth:`query` results.
+
+        Columns are sites, or ``{sha[:7]} {site}`` with ``by_run`` so several
+        runs can be shown side by side. Without ``by_run``, each feature and
+        site comes from the newest matching run that has it, and ``below``
+        applies to that value only, so older runs don't show through.
+        """
+        if by_run:
+            for row in self.query(below, **filters):  # type: ignore[arg-type]
+                column = f"{row.sha[:7]} {row.site}"
+                yield CorrelationRecord(row.feature, column, row.value)
+            return
+        seen: set[tuple[str, str]] = set()
+        for row in self.query(**filters):  # type: ignore[arg-type]
+            # newest run first
+            if (row.feature, row.site) in seen:
+                continue
+            seen.add((row.feature, row.site))
+            if below is None or row.value is None or row.value < below:
+                yield CorrelationRecord(row.feature, row.site, row.value)
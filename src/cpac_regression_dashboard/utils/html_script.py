@@ -1,35 +1,37 @@
 import json
+from typing import Iterable, Optional, TextIO
 
+from cpac_regression_dashboard.utils.instrumentation import span
+from cpac_regression_dashboard.utils.records import (
+    CorrelationRecord,
+    dumps_record,
+    iter_records,
+)
+from cpac_regression_dashboard.utils.static_assets import (
+    BundledAsset,
+    pinned_urls,
+    template_content,
+)
 
-def dataset(name: str, data_source: str, value: float | int | str) -> str:
-    return f"""
-        {{
-            "rowid": "{name}",
-            "columnid": "{data_source}",
-            "value": "{value}"
-        }},
-            """
+VENDOR_SCRIPTS: tuple[str, ...] = (
+    "fusioncharts",
+    "fusioncharts.powercharts",
+    "fusioncharts.theme.fusion",
+)
+"""Libraries the page loads (see :py:data:`~.static_assets.VENDOR`)."""
 
 
 def body(all_keys: list[str], data_source: str) -> str:
-    data_body: str = "["
-    for key in all_keys:
-        name_value = key.split(": ")
-        name = name_value[0]
-        value = name_value[1]
-        data_body += dataset(name, data_source, value)
-    data_body = data_body.strip()
-    data_body += "]"
-    return json.dumps(json.loads(data_body))
-
-
-def write_html(data_body) -> str:
-    return f"""
+    return json.dumps(
+        [record.to_dict() for record in iter_records(all_keys, data_source)]
+    )
+
+
+_HTML_TEMPLATE = """
     <html>
     <head>
         <title>Correlations</title>
-        <script type="text/javascript" src="https://cdn.fusioncharts.com/fusioncharts/latest/fusioncharts.js"></script>
-        <script type="text/javascript" src="https://cdn.fusioncharts.com/fusioncharts/latest/themes/fusioncharts.theme.fusion.js"></script>
+        {scripts}
         <script type="text/javascript">
             FusionCharts.ready(function(){{
             var chartObj = new FusionCharts({{
@@ -81,7 +83,7 @@ def write_html(data_body) -> str:
         }}
     }}
     );
-                chartObj.render();
+                chartObj.render();{after_render}
             }});
         </script>
         </head>
@@ -92,11 +94,93 @@ def write_html(data_body) -> str:
     """  # noqa: E501
 
 
-def setup_browser(html_template) -> None:
-    import tempfile
+_LOAD_CHUNKS = """
+                // add each chunk of data as it arrives, redrawing once per frame
+                var pending = [];
+                var flush = function() {{
+                    var source = chartObj.getJSONData();
+                    Array.prototype.push.apply(source.dataset[0].data, pending);
+                    pending = [];
+                    chartObj.setJSONData(source);
+                }};
+                loadCorrelationData({manifest}, null, function(data) {{
+                    if (!pending.length) {{
+                        requestAnimationFrame(flush);
+                    }}
+                    Array.prototype.push.apply(pending, data);
+                }});"""
+
+
+def _script_tags(scripts: Optional[list[BundledAsset]]) -> str:
+    """HTML loading ``scripts``, by default :data:`VENDOR_SCRIPTS` unbundled."""
+    if scripts is None:
+        scripts = pinned_urls(VENDOR_SCRIPTS)
+    return "\n        ".join(script.script_tag() for script in scripts)
+
+
+def write_html(data_body, scripts: Optional[list[BundledAsset]] = None) -> str:
+    return _HTML_TEMPLATE.format(
+        data_body=data_body, scripts=_script_tags(scripts), after_render=""
+    )
+
+
+def stream_html(
+    file: TextIO,
+    records: Iterable[CorrelationRecord],
+    scripts: Optional[list[BundledAsset]] = None,
+) -> int:
+    """Write the dashboard page, streaming records into its dataset.
+
+    ``scripts`` are :data:`VENDOR_SCRIPTS`, e.g. bundled with
+    :py:func:`~.static_assets.bundle_scripts`; by default they are loaded from
+    their pinned URLs.
+
+    Returns the number of records written.
+    """
+    head, tail = _HTML_TEMPLATE.split("{data_body}")
+    file.write(head.format(scripts=_script_tags(scripts)))
+    count = 0
+    for record in records:
+        file.write(",\n" if count else "\n")
+        file.write(dumps_record(record))
+        count += 1
+    file.write(tail.format(after_render=""))
+    return count
+
+
+def linked_html(manifest: str, scripts: Optional[list[BundledAsset]] = None) -> str:
+    """Render the dashboard page loading its data from separate assets.
+
+    Parameters
+    ----------
+    manifest : str
+        URL of the data manifest written by
+        :py:func:`~cpac_regression_dashboard.utils.data_assets.write_data_assets`.
+
+    scripts : list of BundledAsset, optional
+        :data:`VENDOR_SCRIPTS` then ``templates/data_loader.js``, e.g. bundled
+        with :py:func:`~.static_assets.bundle_scripts`. By default, the
+        libraries are loaded from their pinned URLs and the loader is inlined.
+    """
+    if scripts is None:
+        scripts = [
+            *pinned_urls(VENDOR_SCRIPTS),
+            BundledAsset(
+                "data_loader.js",
+                inline=template_content("data_loader.js").decode("utf-8"),
+            ),
+        ]
+    return _HTML_TEMPLATE.format(
+        data_body="",
+        scripts=_script_tags(scripts),
+        after_render=_LOAD_CHUNKS.format(manifest=json.dumps(manifest)),
+    )
+
+
+def open_browser(path: str) -> None:
+    """Open a written HTML file in a new browser tab."""
+    from pathlib import Path
     import webbrowser
 
-    with tempfile.NamedTemporaryFile(suffix=".html", delete=False) as temp_file:
-        temp_file.write(html_template.encode("utf-8"))
-        filename = "file:///" + temp_file.name
-        webbrowser.open_new_tab(filename)
+    with span("open_browser"):
+        webbrowser.open_new_tab(Path(path).resolve().as_uri())
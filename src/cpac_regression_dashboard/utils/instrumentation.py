@@ -0,0 +1,296 @@
+"""Nestable timing spans with memory and I/O counts, for every entry point.
+
+Wrap a stage in :py:func:`span` and count what it handles with :py:func:`count`::
+
+    with span("scan_tree", root=root):
+        ...
+        count(dirs=1)
+
+Spans nest per thread and per asyncio task. Finished spans are appended to a
+JSON-lines trace file (``--trace`` or ``$CPAC_REGSUITE_TRACE``), summarized on
+stderr with ``--profile`` (``$CPAC_REGSUITE_PROFILE``), and profiled with
+:py:mod:`cProfile` into ``--cprofile_dir`` (``$CPAC_REGSUITE_CPROFILE_DIR``),
+one dump per outermost span in each process and thread.
+Settings are kept in the environment so worker processes inherit them.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+import cProfile
+from dataclasses import dataclass, field
+import functools
+import itertools
+import json
+import os
+import sys
+import threading
+import time
+from typing import Any, Callable, Iterator, Optional, TYPE_CHECKING, TypeVar
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None  # type: ignore[assignment]
+
+if TYPE_CHECKING:
+    from argparse import ArgumentParser
+
+TRACE_ENV = "CPAC_REGSUITE_TRACE"
+PROFILE_ENV = "CPAC_REGSUITE_PROFILE"
+CPROFILE_ENV = "CPAC_REGSUITE_CPROFILE_DIR"
+_F = TypeVar("_F", bound=Callable[..., Any])
+
+
+@dataclass
+class Span:
+    """A timed stage."""
+
+    name: str
+    path: str
+    """Names of this span and its ancestors, joined with ``/``."""
+    fields: dict[str, Any]
+    """Attributes given when the span started."""
+    counters: dict[str, float] = field(default_factory=dict)
+    start: float = field(default_factory=time.time)
+    duration: float = 0.0
+    peak_rss: Optional[int] = None
+    """Peak resident set size of the process so far, in bytes."""
+
+    def to_dict(self) -> dict[str, Any]:
+        """Return a JSON-serializable mapping."""
+        return {
+            "name": self.name,
+            "path": self.path,
+            "pid": os.getpid(),
+            "start": self.start,
+            "duration": self.duration,
+            "peak_rss": self.peak_rss,
+            **self.fields,
+            **self.counters,
+        }
+
+
+_CURRENT: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+_FINISHED: list[Span] = []
+_LOCK = threading.Lock()
+_PROFILING = threading.local()
+_SEQUENCE = itertools.count()
+
+
+def peak_rss() -> Optional[int]:
+    """Peak resident set size of this process, in bytes, if known."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def configure(
+    trace: Optional[str] = None,
+    profile: bool = False,
+    cprofile_dir: Optional[str] = None,
+) -> None:
+    """Turn on outputs for this process and any it starts."""
+    if trace:
+        os.environ[TRACE_ENV] = os.path.abspath(trace)
+    if profile:
+        os.environ[PROFILE_ENV] = "1"
+    if cprofile_dir:
+        os.makedirs(cprofile_dir, exist_ok=True)
+        os.environ[CPROFILE_ENV] = os.path.abspath(cprofile_dir)
+
+
+def _start_profiler() -> Optional[cProfile.Profile]:
+    """Profile the current thread, unless it is already being profiled."""
+    if not os.environ.get(CPROFILE_ENV) or getattr(_PROFILING, "active", False):
+        return None
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:  # another profiler is active
+        return None
+    _PROFILING.active = True
+    return profiler
+
+
+def _stop_profiler(profiler: cProfile.Profile, finished: Span) -> None:
+    profiler.disable()
+    _PROFILING.active = False
+    name = "".join(
+        character if character.isalnum() or character in "-_" else "_"
+        for character in finished.path
+    )
+    profiler.dump_stats(
+        os.path.join(
+            os.environ[CPROFILE_ENV],
+            f"{os.getpid()}-{next(_SEQUENCE):03d}-{name}.prof",
+        )
+    )
+
+
+def _record(finished: Span) -> None:
+    """Keep a finished span for the summary and append it to the trace."""
+    with _LOCK:
+        # only kept for the summary, so long-running commands don't accumulate
+        if os.environ.get(PROFILE_ENV):
+            _FINISHED.append(finished)
+        trace = os.environ.get(TRACE_ENV)
+        if trace:
+            with open(trace, "a", encoding="utf-8") as _f:
+                _f.write(json.dumps(finished.to_dict(), default=str) + "\n")
+
+
+@contextmanager
+def span(name: str, /, **fields: Any) -> Iterator[Span]:  # noqa: ANN401
+    """Time a stage, nested in the current span (if any).
+
+    Parameters
+    ----------
+    name : str
+
+    fields
+        Attributes to record with the span, e.g. the ``file`` it works on.
+    """
+    parent = _CURRENT.get()
+    current = Span(name, f"{parent.path}/{name}" if parent else name, fields)
+    token = _CURRENT.set(current)
+    profiler = _start_profiler()
+    start = time.perf_counter()
+    try:
+        yield current
+    finally:
+        current.duration = time.perf_counter() - start
+        current.peak_rss = peak_rss()
+        if profiler is not None:
+            _stop_profiler(profiler, current)
+        _CURRENT.reset(token)
+        _record(current)
+
+
+def count(**counters: float) -> None:
+    """Add to counters (e.g. ``files=1, bytes=n``) of the current span."""
+    current = _CURRENT.get()
+    if current is not None:
+        for key, value in counters.items():
+            current.counters[key] = current.counters.get(key, 0) + value
+
+
+def traced(name: Optional[str] = None) -> Callable[[_F], _F]:
+    """Decorate a function to run in a span named after it."""
+
+    def decorator(function: _F) -> _F:
+        @functools.wraps(function)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:  # noqa: ANN401
+            with span(name or function.__name__):
+                return function(*args, **kwargs)
+
+        return wrapper  # type: ignore[return-value]
+
+    return decorator
+
+
+def _format_bytes(size: Optional[float]) -> str:
+    if size is None:
+        return "-"
+    for unit in ("B", "KiB", "MiB"):
+        if size < 1024:  # noqa: PLR2004
+            return f"{size:.0f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GiB"
+
+
+def summary() -> str:
+    """Tabulate the spans finished in this process, grouped by path."""
+    groups: dict[str, list[Span]] = {}
+    for finished in sorted(_FINISHED, key=lambda finished: finished.start):
+        groups.setdefault(finished.path, []).append(finished)
+    lines = [f"{'stage':<48} {'calls':>5} {'seconds':>9} {'peak RSS':>10}  counts"]
+    for path, spans in groups.items():
+        depth = path.count("/")
+        label = "  " * depth + path.rsplit("/", 1)[-1]
+        counters: dict[str, float] = {}
+        for finished in spans:
+            for key, value in finished.counters.items():
+                counters[key] = counters.get(key, 0) + value
+        peaks = [finished.peak_rss for finished in spans if finished.peak_rss]
+        lines.append(
+            f"{label:<48} {len(spans):>5} "
+            f"{sum(finished.duration for finished in spans):>9.3f} "
+            f"{_format_bytes(max(peaks) if peaks else None):>10}  "
+            + ", ".join(
+                f"{key}={value:.0f}"
+                if float(value).is_integer()
+                else f"{key}={value:g}"
+                for key, value in counters.items()
+            )
+        )
+    return "\n".join(lines)
+
+
+@contextmanager
+def run(name: str, /, **fields: Any) -> Iterator[Span]:  # noqa: ANN401
+    """Run an entry point in a root span, printing a summary if profiling."""
+    try:
+        with span(name, argv=sys.argv[1:], **fields) as root:
+            yield root
+    finally:
+        if os.environ.get(PROFILE_ENV):
+            print(summary(), file=sys.stderr)
+
+
+def instrumented(name: str) -> Callable[[_F], _F]:
+    """Add ``--profile``, ``--trace`` and ``--cprofile_dir`` to a click command.
+
+    Apply below ``@click.command()`` and the command's own options; the command
+    then runs in a root span called ``name``.
+    """
+    import click
+
+    def decorator(function: _F) -> _F:
+        @click.option(
+            "--profile",
+            is_flag=True,
+            envvar=PROFILE_ENV,
+            help="print how long each stage took, and the memory it used",
+        )
+        @click.option(
+            "--trace",
+            type=click.Path(dir_okay=False),
+            envvar=TRACE_ENV,
+            help="append timing spans to this JSON-lines file",
+        )
+        @click.option(
+            "--cprofile_dir",
+            type=click.Path(file_okay=False),
+            envvar=CPROFILE_ENV,
+            help="write cProfile dumps (one per process and thread) to this directory",
+        )
+        @functools.wraps(function)
+        def wrapper(
+            *args: Any,  # noqa: ANN401
+            profile: bool = False,
+            trace: Optional[str] = None,
+            cprofile_dir: Optional[str] = None,
+            **kwargs: Any,  # noqa: ANN401
+        ) -> Any:  # noqa: ANN401
+            configure(trace, profile, cprofile_dir)
+            with run(name):
+                return function(*args, **kwargs)
+
+        return wrapper  # type: ignore[return-value]
+
+    return decorator
+
+
+def add_arguments(parser: "ArgumentParser") -> None:
+    """Add ``--profile``, ``--trace`` and ``--cprofile_dir`` to an argparse parser."""
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="print how long each stage took, and the memory it used",
+    )
+    parser.add_argument("--trace", help="append timing spans to this JSON-lines file")
+    parser.add_argument(
+        "--cprofile_dir",
+        help="write cProfile dumps (one per process and thread) to this directory",
+    )
@@ -0,0 +1,305 @@
+"""Rebuild D3 heatmap pages as result files land, until stopped.
+
+A :py:class:`PageWatcher` watches directories for ``{data_source}_{branch}``
+result files (see :py:mod:`.file_watch`). Changes are gathered until they stop
+arriving, then only the pages for the changed files and the index are rebuilt,
+with :py:func:`~.d3_pages.build_pages`. Scripts are bundled once, and pages are
+built in this process (or in a pool of worker processes kept for the whole
+watch), so the parsed template stays in memory between rebuilds.
+
+Rebuild latency and queue depth are kept in :py:class:`WatchMetrics`, written
+as JSON after every change to them.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import asdict, dataclass, field
+import json
+import os
+import time
+from typing import Any, Callable, Optional
+
+from cpac_regression_dashboard.utils.analysis import DEFAULT_THRESHOLD
+from cpac_regression_dashboard.utils.d3_pages import (
+    build_pages,
+    PageResult,
+    SCRIPTS,
+    VENDOR_SCRIPTS,
+)
+from cpac_regression_dashboard.utils.file_watch import Debouncer, watch_files
+from cpac_regression_dashboard.utils.instrumentation import count, span
+from cpac_regression_dashboard.utils.static_assets import (
+    bundle_scripts,
+    BundledAsset,
+)
+
+METRICS_FILENAME: str = ".watch_metrics.json"
+"""Default metrics file, in the output directory."""
+EXTENSIONS: tuple[str, ...] = (".json", ".npz")
+"""Result files that are watched."""
+
+
+@dataclass
+class WatchMetrics:
+    """Counts and timings of a watch so far."""
+
+    method: str
+    """``"inotify"`` or ``"polling"``."""
+    started: float = field(default_factory=time.time)
+    updated: float = field(default_factory=time.time)
+    rebuilds: int = 0
+    pages_built: int = 0
+    page_failures: int = 0
+    rebuild_failures: int = 0
+    """Rebuilds that failed as a whole, e.g. for an unwritable output directory."""
+    queue_depth: int = 0
+    """Changed files waiting for the next rebuild."""
+    max_queue_depth: int = 0
+    last_latency: Optional[float] = None
+    """Seconds from the first change in the last batch to its pages being
+    written."""
+    mean_latency: Optional[float] = None
+    max_latency: Optional[float] = None
+    last_duration: Optional[float] = None
+    """Seconds the last rebuild took."""
+
+    def queued(self, depth: int) -> None:
+        """Record the number of files waiting."""
+        self.queue_depth = depth
+        self.max_queue_depth = max(self.max_queue_depth, depth)
+        self.updated = time.time()
+
+    def rebuilt(self, rebuild: "Rebuild") -> None:
+        """Record a finished rebuild."""
+        self.rebuilds += 1
+        self.pages_built += sum(
+            result.built and result.error is None for result in rebuild.results
+        )
+        self.page_failures += sum(
+            result.error is not None for result in rebuild.results
+        )
+        self.rebuild_failures += rebuild.error is not None
+        self.mean_latency = (
+            (self.mean_latency or 0.0) * (self.rebuilds - 1) + rebuild.latency
+        ) / self.rebuilds
+        self.max_latency = max(self.max_latency or 0.0, rebuild.latency)
+        self.last_latency = rebuild.latency
+        self.last_duration = rebuild.duration
+        self.updated = time.time()
+
+    def to_dict(self) -> dict[str, Any]:
+        """Return a JSON-serializable mapping."""
+        return asdict(self)
+
+    def write(self, path: str) -> None:
+        """Write as JSON, atomically, so readers never see half a file."""
+        temporary = f"{path}.{os.getpid()}.tmp"
+        with open(temporary, "w", encoding="utf-8") as _f:
+            json.dump(self.to_dict(), _f, indent=2, sort_keys=True)
+        os.replace(temporary, path)
+
+
+@dataclass
+class Rebuild:
+    """Outcome of rebuilding the pages for one batch of changed files."""
+
+    changed: list[str]
+    results: list[PageResult]
+    latency: float
+    """Seconds from the first change in the batch to its pages being written."""
+    duration: float
+    """Seconds spent building."""
+    error: Optional[str] = None
+    """Why no pages could be built, if so."""
+
+
+class PageWatcher:
+    """Rebuild the pages for result files as they are written."""
+
+    def __init__(  # noqa: PLR0913
+        self,
+        directories: list[str],
+        branches: list[str],
+        output_dir: str = "output",
+        n_workers: int = 1,
+        order: str = "cluster",
+        threshold: float = DEFAULT_THRESHOLD,
+        quiet: float = 2.0,
+        max_wait: float = 30.0,
+        polling: bool = False,
+        interval: float = 2.0,
+        metrics_file: Optional[str] = None,
+    ) -> None:
+        """Set up a watch; :py:meth:`run` starts it.
+
+        Parameters
+        ----------
+        directories : list of str
+            Where result files are written.
+
+        branches : list of str
+            Watch ``{data_source}_{branch}`` files of these branches.
+
+        output_dir : str
+            Where to write pages; see :py:func:`~.d3_pages.build_pages`.
+
+        n_workers : int
+            Number of worker processes, kept for the whole watch.
+
+        order, threshold
+            See :py:func:`~.d3_pages.build_pages`.
+
+        quiet : float
+            Rebuild once no file has changed for this many seconds...
+
+        max_wait : float
+            ...or this many seconds after the first change, if sooner.
+
+        polling : bool
+            Poll rather than use ``inotify``; see :py:mod:`.file_watch`.
+
+        interval : float
+            Seconds between polls.
+
+        metrics_file : str, optional
+            Defaults to :data:`METRICS_FILENAME` in ``output_dir``.
+        """
+        self.directories = directories
+        # longest first, so "a_b_c.json" belongs to branch "b_c" before "c"
+        self.branches = sorted(set(branches), key=len, reverse=True)
+        self.output_dir = output_dir
+        self.n_workers = n_workers
+        self.order = order
+        self.threshold = threshold
+        self.quiet = quiet
+        self.max_wait = max_wait
+        self.polling = polling
+        self.interval = interval
+        self.metrics_file = metrics_file or os.path.join(output_dir, METRICS_FILENAME)
+        self.metrics: Optional[WatchMetrics] = None
+        self._assets: Optional[list[BundledAsset]] = None
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def branch_of(self, path: str) -> Optional[str]:
+        """Get the branch of a result file, ``None`` if it isn't watched."""
+        stem, extension = os.path.splitext(os.path.basename(path))
+        if extension in EXTENSIONS:
+            for branch in self.branches:
+                if stem.endswith(f"_{branch}") and len(stem) > len(branch) + 1:
+                    return branch
+        return None
+
+    def rebuild(self, batch: dict[str, float]) -> Rebuild:
+        """Rebuild the pages for changed files and the index.
+
+        Parameters
+        ----------
+        batch : dict
+            Changed paths, with when each first changed (``time.monotonic``).
+        """
+        inputs: list[tuple[str, str]] = []
+        for path in sorted(batch):
+            branch = self.branch_of(path)
+            # a file may be gone again by now
+            if branch is not None and os.path.exists(path):
+                inputs.append((path, branch))
+        changed = [path for path, _ in inputs]
+        start = time.monotonic()
+        results: list[PageResult] = []
+        error = None
+        with span("rebuild", files=len(changed)):
+            try:
+                results = build_pages(
+                    inputs,
+                    self.output_dir,
+                    self.n_workers,
+                    False,
+                    self.order,
+                    self.threshold,
+                    self._assets,
+                    self._executor,
+                )
+            except Exception as exception:  # keep watching
+                error = f"{type(exception).__name__}: {exception}"
+                if isinstance(exception, BrokenProcessPool):
+                    # e.g. a worker was killed for running out of memory
+                    self._executor = ProcessPoolExecutor(self.n_workers)
+            count(pages=sum(result.built for result in results))
+        finished = time.monotonic()
+        return Rebuild(
+            changed,
+            results,
+            finished - min(batch.values(), default=start),
+            finished - start,
+            error,
+        )
+
+    def run(
+        self,
+        on_rebuild: Optional[Callable[[Rebuild], None]] = None,
+        idle_timeout: Optional[float] = None,
+    ) -> WatchMetrics:
+        """Build every page that is out of date, then watch until interrupted.
+
+        Parameters
+        ----------
+        on_rebuild : callable, optional
+            Called with each :py:class:`Rebuild`, e.g. to log it.
+
+        idle_timeout : float, optional
+            Stop once no file has changed for this many seconds.
+
+        Returns
+        -------
+        WatchMetrics
+        """
+        os.makedirs(self.output_dir, exist_ok=True)
+        debouncer = Debouncer(self.quiet, self.max_wait)
+
+        def rebuild_batch(batch: dict[str, float]) -> None:
+            metrics.queued(len(debouncer.pending))
+            result = self.rebuild(batch)
+            metrics.rebuilt(result)
+            metrics.write(self.metrics_file)
+            if on_rebuild is not None:
+                on_rebuild(result)
+
+        # watch before listing, so that no file lands unseen in between
+        with watch_files(
+            self.directories,
+            lambda path: self.branch_of(path) is not None,
+            self.polling,
+            self.interval,
+        ) as watcher:
+            metrics = self.metrics = WatchMetrics(watcher.method)
+            self._assets = bundle_scripts(self.output_dir, VENDOR_SCRIPTS, SCRIPTS)
+            if self.n_workers > 1:
+                self._executor = ProcessPoolExecutor(self.n_workers)
+            try:
+                existing = watcher.scan()
+                if existing:
+                    rebuild_batch(dict.fromkeys(existing, time.monotonic()))
+                idle_since = time.monotonic()
+                while True:
+                    if debouncer.pending and debouncer.timeout() == 0:
+                        rebuild_batch(debouncer.take())
+                        idle_since = time.monotonic()
+                    timeout = debouncer.timeout()
+                    if timeout is None and idle_timeout is not None:
+                        timeout = idle_since + idle_timeout - time.monotonic()
+                        if timeout <= 0:
+                            break
+                    changed = watcher.changes(timeout)
+                    if changed:
+                        debouncer.add(changed)
+                        idle_since = time.monotonic()
+                        metrics.queued(len(debouncer.pending))
+                        metrics.write(self.metrics_file)
+            except KeyboardInterrupt:
+                pass
+            finally:
+                if self._executor is not None:
+                    self._executor.shutdown()
+                    self._executor = None
+                metrics.queued(len(debouncer.pending))
+                metrics.write(self.metrics_file)
+        return metrics
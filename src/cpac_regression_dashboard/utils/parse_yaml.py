@@ -1,26 +1,30 @@
 """From a pair of CPAC output directories, write a YAML file for regression."""
-import os
 from pathlib import Path
 from typing import cast, Optional
 
 import yaml
 
+from cpac_regression_dashboard.utils.instrumentation import count, span
+from cpac_regression_dashboard.utils.scan import cached_scan_tree, scan_pipeline_dirs
+from cpac_regression_dashboard.utils.scan_cache import ScanCache
+
 _PIPELINE_DICT = dict[Optional[str], dict[str, Optional[int | str]]]
 _FULL_YAML_DICT = dict[str, dict[str, bool | int | Optional[str]] | _PIPELINE_DICT]
 
 
-def get_dir(paths: Optional[str], variable_name: str = "dir") -> Optional[str]:
+def get_dir(
+    paths: Optional[str],
+    variable_name: str = "dir",
+    max_depth: Optional[int] = None,
+    cache: Optional[ScanCache] = None,
+) -> Optional[str]:
     """Get the full path to a ``pipeline_*`` directory."""
     if paths is None:
         return None
     assert isinstance(paths, str), f"{variable_name}: {paths}"
-    directory = paths
-    if directory:
-        for root, dirs, files in os.walk(paths):
-            for _dir in dirs:
-                if "pipeline_" in _dir:
-                    directory = os.path.join(root, _dir)
-    return directory
+    if not paths:
+        return paths
+    return cached_scan_tree(paths, max_depth, cache=cache).directory
 
 
 def write_pipeline_yaml(
@@ -42,28 +46,20 @@ def write_pipeline_yaml(
     }
 
 
-def parse_yaml(directory: str, pipeline_name: str) -> _PIPELINE_DICT:
+def parse_yaml(
+    directory: str,
+    pipeline_name: str,
+    max_depth: Optional[int] = None,
+    cache: Optional[ScanCache] = None,
+) -> _PIPELINE_DICT:
     """Parse a CPAC output directory for pipeline information."""
-    subdirs = ["log", "working", "output"]
-    paths: dict[str, Optional[str]] = {}
-
-    for subdir in subdirs:
-        if os.path.isdir(os.path.join(directory, subdir)):
-            paths[f"{subdir}_dir"] = os.path.join(directory, subdir)
-        else:
-            paths[f"{subdir}_dir"] = None
-    log_dir = get_dir(paths["log_dir"], "log_dir")
-    pipeline_config = None
-    if log_dir is not None:
-        for root, _dirs, files in os.walk(log_dir):
-            for file in files:
-                if file.endswith("Z.yml"):
-                    pipeline_config = os.path.join(root, file)
-    working_dir = get_dir(paths["working_dir"], "working_dir")
-    output_dir = get_dir(paths["output_dir"], "output_dir")
-
+    scan = scan_pipeline_dirs(directory, max_depth, cache)
     return write_pipeline_yaml(
-        output_dir, working_dir, log_dir, pipeline_config, pipeline_name
+        scan.output_dir,
+        scan.working_dir,
+        scan.log_dir,
+        scan.pipeline_config,
+        pipeline_name,
     )
 
 
@@ -101,10 +97,12 @@ def cpac_yaml(
     n_cpus: int,
     branch: str,
     data_source: str,
+    max_depth: Optional[int] = None,
+    cache: Optional[ScanCache] = None,
 ) -> Path:
     """Write a YAML file for the regression run."""
-    pipeline_1: _PIPELINE_DICT = parse_yaml(pipeline1, "pipeline_1")
-    pipeline_2: _PIPELINE_DICT = parse_yaml(pipeline2, "pipeline_2")
+    pipeline_1: _PIPELINE_DICT = parse_yaml(pipeline1, "pipeline_1", max_depth, cache)
+    pipeline_2: _PIPELINE_DICT = parse_yaml(pipeline2, "pipeline_2", max_depth, cache)
 
     yaml_contents: _FULL_YAML_DICT = write_yaml(
         pipeline_1, pipeline_2, correlations_dir, run_name, n_cpus
@@ -112,6 +110,7 @@ def cpac_yaml(
 
     yaml_path: Path = Path(f"{branch}_{data_source}.yml")
     """Path to YAML file for regression correlation."""
-    with yaml_path.open("w") as file:
+    with span("write_yaml", file=str(yaml_path)), yaml_path.open("w") as file:
         yaml.dump(yaml_contents, file, default_flow_style=False, sort_keys=False)
+        count(files=1, bytes=file.tell())
     return yaml_path
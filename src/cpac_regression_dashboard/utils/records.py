@@ -0,0 +1,249 @@
+"""Correlation records and streaming JSON serialization for them.
+
+A correlation result file is a JSON array of
+``{"rowid": feature, "columnid": data_source, "value": coefficient}`` objects, as
+read by the dashboards. Files are read and written a record at a time, so memory
+stays bounded however large they are.
+"""
+import json
+import math
+import os
+import re
+from types import TracebackType
+from typing import Iterable, Iterator, NamedTuple, Optional, TextIO, Type, Union
+
+from cpac_regression_dashboard.utils.instrumentation import count, span
+
+_DECODER = json.JSONDecoder()
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+_SEPARATORS = re.compile(r"[ \t\n\r,]*")
+"""Whitespace, and commas between array elements."""
+MAX_RECORD_CHARS: int = 1 << 20
+"""Longest record object read; bounds the reader's buffer with its chunk size."""
+
+
+class CorrelationRecord(NamedTuple):
+    """A single correlation coefficient."""
+
+    rowid: str
+    """Feature (derivative) name."""
+    columnid: str
+    """Data source (site) name."""
+    value: Optional[float]
+    """Correlation coefficient; ``None`` if not finite."""
+
+    def to_dict(self) -> dict[str, Union[str, Optional[float]]]:
+        """Return a JSON-serializable mapping."""
+        return self._asdict()
+
+    @classmethod
+    def from_dict(cls, record: dict) -> "CorrelationRecord":
+        """Build a record from a parsed JSON object, converting quoted values."""
+        return cls(
+            str(record["rowid"]), str(record["columnid"]), _coerce(record["value"])
+        )
+
+
+def _coerce(value: Union[float, int, str, None]) -> Optional[float]:
+    """Convert a coefficient to a finite float or ``None``."""
+    if value is None:
+        return None
+    try:
+        number = float(value)
+    except ValueError:
+        return None
+    return number if math.isfinite(number) else None
+
+
+def parse_key(key: str, data_source: str) -> CorrelationRecord:
+    """Parse a ``"feature: coefficient"`` key from ``cpac_correlations``."""
+    name, _, value = key.rpartition(": ")
+    return CorrelationRecord(name, data_source, _coerce(value))
+
+
+def iter_records(
+    all_keys: Iterable[str], data_source: str
+) -> Iterator[CorrelationRecord]:
+    """Parse every ``"feature: coefficient"`` key for one data source."""
+    for key in all_keys:
+        yield parse_key(key, data_source)
+
+
+def dumps_record(record: CorrelationRecord) -> str:
+    """Serialize one record as a JSON object."""
+    return json.dumps(record.to_dict(), allow_nan=False)
+
+
+class RecordWriter:
+    """Write records to a JSON array one at a time.
+
+    Each record is written on its own line as soon as it is given, so nothing
+    but the current record is held in memory.
+    """
+
+    def __init__(self, file: TextIO) -> None:
+        """Wrap an open text file."""
+        self.file = file
+        self.count = 0
+        """Number of records written so far."""
+        self.file.write("[")
+
+    def write(self, record: CorrelationRecord) -> None:
+        """Append one record."""
+        self.file.write(",\n" if self.count else "\n")
+        self.file.write(dumps_record(record))
+        self.count += 1
+
+    def write_all(self, records: Iterable[CorrelationRecord]) -> int:
+        """Append every record, returning the running total."""
+        for record in records:
+            self.write(record)
+        return self.count
+
+    def close(self) -> None:
+        """Close the array and the underlying file."""
+        self.file.write("\n]\n" if self.count else "]\n")
+        self.file.close()
+
+    def __enter__(self) -> "RecordWriter":
+        """Enter context."""
+        return self
+
+    def __exit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc_value: Optional[BaseException],
+        traceback: Optional[TracebackType],
+    ) -> None:
+        """Close the array."""
+        self.close()
+
+
+def write_records(path: str, records: Iterable[CorrelationRecord]) -> int:
+    """Stream records into a JSON file, returning how many were written."""
+    with RecordWriter(open(path, "w", encoding="utf-8")) as writer:
+        return writer.write_all(records)
+
+
+def iter_json_events(
+    file: TextIO,
+    chunk_size: int = 1 << 16,
+    max_record_chars: int = MAX_RECORD_CHARS,
+) -> Iterator[tuple[str, Optional[dict]]]:
+    """Scan a stream of JSON arrays of objects, yielding parse events.
+
+    Events are ``("start_array", None)``, ``("end_array", None)`` and
+    ``("object", value)``. Each object is decoded by :py:mod:`json`'s C decoder
+    as soon as all of it has been read, and the text before it is dropped, so
+    the buffer never holds more than ``chunk_size + max_record_chars``
+    characters. Commas between elements are optional, for files written by
+    earlier versions of this package.
+
+    Raises
+    ------
+    ValueError
+        If the stream isn't made of arrays of objects, or an object is
+        malformed or longer than ``max_record_chars``.
+    """
+    name = getattr(file, "name", "<stream>")
+    buffer = ""
+    position = 0
+    offset = 0  # characters dropped from the start of the buffer
+    depth = 0
+    eof = False
+    while True:
+        if position > chunk_size:
+            buffer = buffer[position:]
+            offset += position
+            position = 0
+        skipped = (_SEPARATORS if depth else _WHITESPACE).match(buffer, position)
+        assert skipped is not None  # both match the empty string
+        position = skipped.end()
+        if position >= len(buffer):
+            if eof:
+                break
+            chunk = file.read(chunk_size)
+            eof = not chunk
+            buffer += chunk
+            continue
+        char = buffer[position]
+        if char == "[":
+            depth += 1
+            position += 1
+            yield "start_array", None
+        elif char == "]" and depth:
+            depth -= 1
+            position += 1
+            yield "end_array", None
+        elif char == "{" and depth:
+            try:
+                value, position = _DECODER.raw_decode(buffer, position)
+            except json.JSONDecodeError as error:
+                # most likely cut off at the end of the buffer; read on
+                if eof or len(buffer) - position > max_record_chars:
+                    msg = (
+                        f"{name}: malformed or oversized (over {max_record_chars} "
+                        f"characters) record at character {offset + position}"
+                    )
+                    raise ValueError(msg) from error
+                chunk = file.read(chunk_size)
+                eof = not chunk
+                buffer += chunk
+                continue
+            yield "object", value
+        else:
+            msg = (
+                f"{name}: unexpected {char!r} in correlation records at character "
+                f"{offset + position}"
+            )
+            raise ValueError(msg)
+    if depth:
+        msg = f"{name}: unterminated array"
+        raise ValueError(msg)
+
+
+def iter_json_records(
+    path: str, chunk_size: int = 1 << 16
+) -> Iterator[CorrelationRecord]:
+    """Read records from a JSON file incrementally.
+
+    Only one record (and one chunk of the file) is decoded at a time; see
+    :py:func:`iter_json_events`. Besides a flat array, nested arrays of records
+    and back-to-back arrays (as written by earlier versions of this package) are
+    flattened, and quoted coefficients are converted to numbers.
+
+    Raises
+    ------
+    ValueError
+        If the file isn't made of arrays of record objects.
+    """
+    with open(path, "r", encoding="utf-8") as file:
+        for event, value in iter_json_events(file, chunk_size):
+            if event == "object" and value is not None:
+                try:
+                    yield CorrelationRecord.from_dict(value)
+                except (KeyError, TypeError) as error:
+                    msg = f"{path}: not a correlation record: {value!r}"
+                    raise ValueError(msg) from error
+
+
+def read_records(path: str) -> Iterator[CorrelationRecord]:
+    """Read records from a JSON or (by extension) columnar ``.npz`` file."""
+    if path.endswith(".npz"):
+        from cpac_regression_dashboard.utils.columnar import iter_npz_records
+
+        return iter_npz_records(path)
+    return iter_json_records(path)
+
+
+def save_records(path: str, records: Iterable[CorrelationRecord]) -> int:
+    """Write records to a JSON or (by extension) columnar ``.npz`` file."""
+    with span("save_records", file=path):
+        if path.endswith(".npz"):
+            from cpac_regression_dashboard.utils.columnar import records_to_npz
+
+            written = int(records_to_npz(records, path).present.sum())
+        else:
+            written = write_records(path, records)
+        count(records=written, files=1, bytes=os.path.getsize(path))
+    return written
@@ -0,0 +1,191 @@
+"""The steps from pairs of C-PAC output directories to a report, as tasks.
+
+For a branch, in a workspace ``W``, each data source ``ds`` gets
+
+``yaml:{ds}``
+    ``create_yaml``, writing ``W/{branch}_{ds}.yml``;
+``correlate:{ds}``
+    ``correlate``, writing ``W/correlations/{ds}_{branch}.json``;
+
+and then, over every data source,
+
+``pages``
+    ``build_d3_dashboard``, writing ``W/output/{branch}/{ds}.html`` and
+    ``W/output/index.html``;
+``heatmap``
+    ``build_dashboard``, writing the dashboard and ``heatmap.png`` (or ``.svg``)
+    in ``W/dashboard``;
+``comment``
+    optionally, ``generate_comment`` on ``W/correlations``.
+
+Each task runs ``cpac_regsuite`` in a subprocess; see :py:mod:`.tasks`.
+"""
+from functools import partial
+import json
+import os
+import sys
+
+from cpac_regression_dashboard.utils.batch import SubjectPair
+from cpac_regression_dashboard.utils.tasks import Task
+
+COMMENT_ENV: tuple[str, ...] = ("GITHUB_API_URL", "OWNER", "REPO", "SHA", "THRESHOLD")
+"""Environment variables that change the comment, so it's posted again."""
+
+
+def _cpac_regsuite(*args: str) -> list[str]:
+    """Command line for a ``cpac_regsuite`` subcommand in this interpreter."""
+    return [sys.executable, "-m", "cpac_regression_dashboard.cli", *args]
+
+
+def _correlation_fingerprint(yaml_file: str) -> str:
+    """Fingerprint the output directories a YAML config correlates."""
+    import yaml
+
+    from cpac_regression_dashboard.utils.artifact_cache import fingerprint
+
+    with open(yaml_file, "r", encoding="utf-8") as _f:
+        return fingerprint(yaml.safe_load(_f), engine="native")
+
+
+def _comment_fingerprint() -> str:
+    return json.dumps({name: os.environ.get(name) for name in COMMENT_ENV})
+
+
+def report_tasks(
+    pairs: list[SubjectPair],
+    workspace: str,
+    branch: str,
+    n_cpus: int = 1,
+    snapshot: str = "png",
+    comment: bool = False,
+) -> list[Task]:
+    """List the tasks that build a report comparing each pair of directories.
+
+    Parameters
+    ----------
+    pairs : list of SubjectPair
+
+    workspace : str
+        Where every file is written.
+
+    branch : str
+        Branch name, in filenames and page titles.
+
+    n_cpus : int
+        Worker processes for correlating each pair.
+
+    snapshot : str
+        ``"png"`` (needs :py:mod:`cairosvg`) or ``"svg"`` heatmap.
+
+    comment : bool
+        Also comment the results on GitHub, once per change to them.
+
+    Returns
+    -------
+    list of Task
+    """
+    workspace = os.path.abspath(workspace)
+    correlations_dir = os.path.join(workspace, "correlations")
+    tasks: list[Task] = []
+    json_files: list[str] = []
+    for pair in pairs:
+        yaml_file = os.path.join(workspace, f"{branch}_{pair.data_source}.yml")
+        json_file = os.path.join(correlations_dir, f"{pair.data_source}_{branch}.json")
+        json_files.append(json_file)
+        tasks.append(
+            Task(
+                f"yaml:{pair.data_source}",
+                _cpac_regsuite(
+                    "create_yaml",
+                    "--pipeline1",
+                    os.path.abspath(pair.pipeline1),
+                    "--pipeline2",
+                    os.path.abspath(pair.pipeline2),
+                    "--workspace",
+                    workspace,
+                    "--branch",
+                    branch,
+                    "--data_source",
+                    pair.data_source,
+                    "--n_cpus",
+                    str(n_cpus),
+                ),
+                outputs=[yaml_file],
+                cwd=workspace,
+                # scanning is cheap and cached; what's found decides the rest
+                always=True,
+            )
+        )
+        tasks.append(
+            Task(
+                f"correlate:{pair.data_source}",
+                _cpac_regsuite(
+                    "correlate",
+                    yaml_file,
+                    "--branch",
+                    branch,
+                    "--data_source",
+                    pair.data_source,
+                    "--engine",
+                    "native",
+                ),
+                inputs=[yaml_file],
+                outputs=[json_file],
+                cwd=correlations_dir,
+                fingerprint=partial(_correlation_fingerprint, yaml_file),
+            )
+        )
+    output_dir = os.path.join(workspace, "output")
+    tasks.append(
+        Task(
+            "pages",
+            _cpac_regsuite(
+                "build_d3_dashboard",
+                *(f"--json_file={json_file}" for json_file in json_files),
+                "--branch",
+                branch,
+                "--output_dir",
+                output_dir,
+            ),
+            inputs=json_files,
+            outputs=[
+                *(
+                    os.path.join(output_dir, branch, f"{pair.data_source}.html")
+                    for pair in pairs
+                ),
+                os.path.join(output_dir, "index.html"),
+            ],
+        )
+    )
+    dashboard_dir = os.path.join(workspace, "dashboard")
+    heatmap = os.path.join(dashboard_dir, f"heatmap.{snapshot}")
+    tasks.append(
+        Task(
+            "heatmap",
+            _cpac_regsuite(
+                "build_dashboard",
+                "--json_files",
+                ",".join(json_files),
+                "--branch",
+                branch,
+                "--no-browser",
+                "--snapshot",
+                heatmap,
+            ),
+            inputs=json_files,
+            outputs=[os.path.join(dashboard_dir, "html.html"), heatmap],
+            cwd=dashboard_dir,
+        )
+    )
+    if comment:
+        tasks.append(
+            Task(
+                "comment",
+                _cpac_regsuite(
+                    "generate_comment", "--branch", branch, correlations_dir
+                ),
+                inputs=json_files,
+                fingerprint=_comment_fingerprint,
+            )
+        )
+    return tasks
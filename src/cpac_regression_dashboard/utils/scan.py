@@ -0,0 +1,249 @@
+"""Single-pass discovery of ``pipeline_*`` directories in C-PAC output trees."""
+from collections import deque
+from dataclasses import dataclass, field
+import os
+from typing import Optional, TYPE_CHECKING
+
+from cpac_regression_dashboard.utils.instrumentation import count, span
+
+if TYPE_CHECKING:
+    from cpac_regression_dashboard.utils.scan_cache import ScanCache
+
+SUBDIRS: tuple[str, ...] = ("log", "working", "output")
+"""Subdirectories of a C-PAC output directory that get scanned."""
+
+
+@dataclass
+class TreeScan:
+    """What was found scanning one ``log``, ``working`` or ``output`` tree."""
+
+    root: str
+    """Root of the scanned tree."""
+    pipeline_dir: Optional[str] = None
+    """Shallowest ``pipeline_*`` directory, if any."""
+    pipeline_config: Optional[str] = None
+    """``*Z.yml`` pipeline configuration, if requested and found."""
+    visited: dict[str, int] = field(default_factory=dict)
+    """Every directory listed during the scan, mapped to its ``st_mtime_ns``."""
+    listings: dict[str, list[list[str]]] = field(default_factory=dict)
+    """Subdirectory names and ``*Z.yml`` filenames in each directory listed, so
+    a rescan needn't list those that haven't changed again."""
+
+    @property
+    def directory(self) -> str:
+        """The ``pipeline_*`` directory, falling back to the tree root."""
+        return self.pipeline_dir or self.root
+
+    def is_current(self) -> bool:
+        """Whether no directory listed during the scan has changed since."""
+        for directory, mtime in self.visited.items():
+            try:
+                if os.stat(directory).st_mtime_ns != mtime:
+                    return False
+            except OSError:
+                return False
+        return True
+
+
+@dataclass
+class PipelineScan:
+    """All paths discovered in a C-PAC output directory."""
+
+    directory: str
+    trees: dict[str, TreeScan] = field(default_factory=dict)
+    """Scans keyed by subdirectory name (see :data:`SUBDIRS`)."""
+
+    def _dir(self, subdir: str) -> Optional[str]:
+        tree = self.trees.get(subdir)
+        return None if tree is None else tree.directory
+
+    @property
+    def log_dir(self) -> Optional[str]:
+        """``pipeline_*`` directory in ``log``."""
+        return self._dir("log")
+
+    @property
+    def working_dir(self) -> Optional[str]:
+        """``pipeline_*`` directory in ``working``."""
+        return self._dir("working")
+
+    @property
+    def output_dir(self) -> Optional[str]:
+        """``pipeline_*`` directory in ``output``."""
+        return self._dir("output")
+
+    @property
+    def pipeline_config(self) -> Optional[str]:
+        """``*Z.yml`` pipeline configuration from the ``log`` tree."""
+        tree = self.trees.get("log")
+        return None if tree is None else tree.pipeline_config
+
+    @property
+    def visited(self) -> dict[str, int]:
+        """Every directory listed across all trees."""
+        visited: dict[str, int] = {}
+        for tree in self.trees.values():
+            visited.update(tree.visited)
+        return visited
+
+
+def _list_dir(
+    path: str, scan: TreeScan, previous: Optional[TreeScan] = None
+) -> tuple[list[str], list[str]]:
+    """List a directory once, returning sorted subdirectory and ``*Z.yml`` paths.
+
+    A directory whose mtime is unchanged since ``previous`` was scanned isn't
+    listed again.
+    """
+    try:
+        scan.visited[path] = mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        return [], []
+    if previous is not None and previous.visited.get(path) == mtime:
+        listing = previous.listings.get(path)
+    else:
+        listing = None
+    if listing is None:
+        dirs: list[str] = []
+        configs: list[str] = []
+        try:
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            dirs.append(entry.name)
+                        elif entry.name.endswith("Z.yml"):
+                            configs.append(entry.name)
+                    except OSError:
+                        continue
+        except OSError:
+            return [], []
+        listing = [sorted(dirs), sorted(configs)]
+    else:
+        count(dirs_reused=1)
+    scan.listings[path] = listing
+    subdirs, configs_found = listing
+    return (
+        [os.path.join(path, name) for name in subdirs],
+        [os.path.join(path, name) for name in configs_found],
+    )
+
+
+def _find_config(
+    root: str,
+    max_depth: Optional[int],
+    scan: TreeScan,
+    previous: Optional[TreeScan] = None,
+) -> Optional[str]:
+    """Breadth-first search for the first ``*Z.yml`` file under ``root``."""
+    queue: deque[tuple[str, int]] = deque([(root, 0)])
+    while queue:
+        path, depth = queue.popleft()
+        dirs, configs = _list_dir(path, scan, previous)
+        if configs:
+            return configs[0]
+        if max_depth is None or depth < max_depth:
+            queue.extend((directory, depth + 1) for directory in dirs)
+    return None
+
+
+def scan_tree(
+    root: str,
+    max_depth: Optional[int] = None,
+    find_config: bool = False,
+    previous: Optional[TreeScan] = None,
+) -> TreeScan:
+    """Walk a tree once, breadth-first, looking for a ``pipeline_*`` directory.
+
+    Descent stops at the first (shallowest, then alphabetical) ``pipeline_*``
+    directory. With ``find_config``, ``*Z.yml`` files are collected on the way so
+    the pipeline configuration can be found without walking the tree again; if a
+    ``pipeline_*`` directory is found, only its subtree is searched for one.
+
+    Parameters
+    ----------
+    root : str
+        Directory to scan.
+
+    max_depth : int, optional
+        Don't list directories more than this many levels below ``root``.
+
+    find_config : bool
+        Also look for a ``*Z.yml`` pipeline configuration.
+
+    previous : TreeScan, optional
+        An earlier scan of ``root`` with the same options, whose listings of
+        directories that haven't changed since are reused.
+
+    Returns
+    -------
+    TreeScan
+    """
+    scan = TreeScan(root)
+    queue: deque[tuple[str, int]] = deque([(root, 0)])
+    configs: list[str] = []
+    while queue and scan.pipeline_dir is None:
+        path, depth = queue.popleft()
+        dirs, found = _list_dir(path, scan, previous)
+        if find_config:
+            configs.extend(found)
+        for directory in dirs:
+            if "pipeline_" in os.path.basename(directory):
+                scan.pipeline_dir = directory
+                break
+        if max_depth is None or depth < max_depth:
+            queue.extend((directory, depth + 1) for directory in dirs)
+    if find_config:
+        if scan.pipeline_dir is not None:
+            remaining = None if max_depth is None else max_depth - depth - 1
+            if remaining is None or remaining >= 0:
+                scan.pipeline_config = _find_config(
+                    scan.pipeline_dir, remaining, scan, previous
+                )
+        elif configs:
+            scan.pipeline_config = configs[0]
+    return scan
+
+
+def cached_scan_tree(
+    root: str,
+    max_depth: Optional[int] = None,
+    find_config: bool = False,
+    cache: Optional["ScanCache"] = None,
+) -> TreeScan:
+    """:py:func:`scan_tree`, reusing and updating ``cache`` if given.
+
+    If the cached scan is out of date, only the directories that changed are
+    listed again.
+    """
+    with span("scan_tree", root=root):
+        previous = None if cache is None else cache.load(root, max_depth, find_config)
+        if previous is not None and previous.is_current():
+            count(cache_hits=1)
+            return previous
+        scan = scan_tree(root, max_depth, find_config, previous)
+        count(dirs=len(scan.visited))
+        if cache is not None:
+            cache.put(scan, max_depth, find_config)
+        return scan
+
+
+def scan_pipeline_dirs(
+    directory: str,
+    max_depth: Optional[int] = None,
+    cache: Optional["ScanCache"] = None,
+) -> PipelineScan:
+    """Scan each of ``log``, ``working`` and ``output`` in a C-PAC output directory.
+
+    Each tree is listed at most once, or not at all if ``cache`` holds an
+    up-to-date scan of it; missing subdirectories are left out of
+    :attr:`PipelineScan.trees`.
+    """
+    scan = PipelineScan(directory)
+    for subdir in SUBDIRS:
+        root = os.path.join(directory, subdir)
+        if os.path.isdir(root):
+            scan.trees[subdir] = cached_scan_tree(
+                root, max_depth, subdir == "log", cache
+            )
+    return scan
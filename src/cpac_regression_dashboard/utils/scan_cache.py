@@ -0,0 +1,142 @@
+"""On-disk cache of pipeline directory scans, validated by directory mtimes.
+
+Scans are cached in the user cache directory by default
+(:py:func:`default_cache_path`), shared by every workspace.
+"""
+from dataclasses import asdict
+import json
+import os
+import sqlite3
+import time
+from typing import Any, Optional
+
+from cpac_regression_dashboard.utils.scan import TreeScan
+
+CACHE_FILENAME: str = "scans.sqlite"
+"""Default cache filename, in ``cpac_regsuite`` in the user cache directory."""
+DEFAULT_MAX_ENTRIES: int = 4096
+"""Default number of tree scans kept before least-recently-used ones are evicted."""
+
+
+def default_cache_path() -> str:
+    """Get where directory scans are cached by default.
+
+    ``cpac_regsuite/scans.sqlite`` in the user cache directory
+    (``$XDG_CACHE_HOME`` or ``~/.cache``).
+    """
+    cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.join(
+        os.path.expanduser("~"), ".cache"
+    )
+    return os.path.join(cache_home, "cpac_regsuite", CACHE_FILENAME)
+
+
+class ScanCache:
+    """SQLite-backed cache of :py:class:`~.scan.TreeScan` results.
+
+    Each entry is keyed on the scanned root and the scan options, and stores the
+    ``st_mtime_ns`` of every directory listed during the scan. Adding or removing
+    anything in a listed directory changes its mtime, so an entry is only reused
+    when all of those mtimes still match; otherwise only the directories that
+    changed are listed again (see :py:func:`~.scan.cached_scan_tree`).
+
+    The connection is opened lazily and is not pickled, so a cache can be handed
+    to worker processes; SQLite serializes their writes.
+    """
+
+    def __init__(
+        self, path: Optional[str] = None, max_entries: int = DEFAULT_MAX_ENTRIES
+    ) -> None:
+        """Set the cache file and size bound without opening a connection yet.
+
+        ``path`` defaults to :py:func:`default_cache_path`.
+        """
+        self.path = path or default_cache_path()
+        self.max_entries = max_entries
+        self._connection: Optional[sqlite3.Connection] = None
+
+    def __getstate__(self) -> dict[str, Any]:
+        """Pickle everything but the connection."""
+        return {"path": self.path, "max_entries": self.max_entries}
+
+    def __setstate__(self, state: dict[str, Any]) -> None:
+        """Restore from :py:meth:`__getstate__`."""
+        self.__init__(**state)  # type: ignore[misc]
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        """Connection to the cache file, created on first use."""
+        if self._connection is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._connection = sqlite3.connect(self.path, timeout=30)
+            with self._connection:
+                self._connection.execute("PRAGMA journal_mode=WAL")
+                self._connection.execute(
+                    "CREATE TABLE IF NOT EXISTS scans ("
+                    "key TEXT PRIMARY KEY, scan TEXT NOT NULL, last_used REAL NOT NULL)"
+                )
+                self._connection.execute(
+                    "CREATE INDEX IF NOT EXISTS scans_last_used ON scans (last_used)"
+                )
+        return self._connection
+
+    def close(self) -> None:
+        """Close the connection, if open."""
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    @staticmethod
+    def key(root: str, max_depth: Optional[int], find_config: bool) -> str:
+        """Cache key for a scan of ``root`` with the given options.
+
+        Relative roots are keyed along with the working directory, since the
+        paths stored for them are relative too.
+        """
+        cwd = None if os.path.isabs(root) else os.getcwd()
+        return json.dumps([root, cwd, max_depth, find_config])
+
+    def load(
+        self, root: str, max_depth: Optional[int], find_config: bool
+    ) -> Optional[TreeScan]:
+        """Return the cached scan, even if a directory it listed has changed."""
+        key = self.key(root, max_depth, find_config)
+        row = self.connection.execute(
+            "SELECT scan FROM scans WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        with self.connection:
+            self.connection.execute(
+                "UPDATE scans SET last_used = ? WHERE key = ?", (time.time(), key)
+            )
+        return TreeScan(**json.loads(row[0]))
+
+    def get(
+        self, root: str, max_depth: Optional[int], find_config: bool
+    ) -> Optional[TreeScan]:
+        """Return a cached scan if no directory it listed has changed since."""
+        scan = self.load(root, max_depth, find_config)
+        return scan if scan is not None and scan.is_current() else None
+
+    def put(self, scan: TreeScan, max_depth: Optional[int], find_config: bool) -> None:
+        """Store a scan, evicting the least recently used beyond ``max_entries``."""
+        with self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO scans (key, scan, last_used) VALUES (?, ?, ?)",
+                (
+                    self.key(scan.root, max_depth, find_config),
+                    json.dumps(asdict(scan)),
+                    time.time(),
+                ),
+            )
+            self.connection.execute(
+                "DELETE FROM scans WHERE key IN (SELECT key FROM scans "
+                "ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    def __len__(self) -> int:
+        """Count cached scans."""
+        return self.connection.execute("SELECT COUNT(*) FROM scans").fetchone()[0]
@@ -0,0 +1,299 @@
+"""Scripts for dashboard pages, bundled into the output directory.
+
+Pages load no scripts from other hosts. Third-party libraries (:data:`VENDOR`)
+are pinned to a version, downloaded once into a local copy
+(:py:func:`default_asset_dir`) and bundled from there, as are this package's own
+``templates`` scripts. Each is written once per output directory, as
+``assets/{stem}.{sha256[:12]}{extension}`` with pre-compressed copies, so every
+page in the directory shares it and servers can cache it indefinitely. Scripts
+smaller than :data:`INLINE_MAX_BYTES` are inlined in each page instead, which is
+smaller than another request.
+
+Downloads are checked against each library's pinned SHA-256, and a library
+without one isn't downloaded at all (copies already in the asset directory are
+trusted). A library that isn't available locally and can't be downloaded (or
+doesn't match, or has no digest) is an error, tried once per process, unless
+``$CPAC_REGSUITE_ALLOW_CDN`` is set, when pages load it from its pinned URL
+instead, with a warning. To build offline, copy ``{version}/{filename}`` for
+each of :data:`VENDOR` into ``$CPAC_REGSUITE_ASSET_DIR``.
+"""
+from dataclasses import dataclass
+import hashlib
+from importlib.resources import files
+import json
+import os
+import tempfile
+from typing import Optional
+from urllib.request import urlopen
+import warnings
+
+from cpac_regression_dashboard.utils.instrumentation import count, span
+
+ASSET_DIR_ENV = "CPAC_REGSUITE_ASSET_DIR"
+ALLOW_CDN_ENV = "CPAC_REGSUITE_ALLOW_CDN"
+ASSETS_DIRNAME: str = "assets"
+"""Subdirectory of an output directory holding its bundled assets."""
+INLINE_MAX_BYTES: int = 2048
+"""Scripts up to this size are inlined in each page rather than linked."""
+
+
+@dataclass(frozen=True)
+class VendorAsset:
+    """A pinned version of a third-party script."""
+
+    filename: str
+    version: str
+    url: str
+    sha256: Optional[str]
+    """Hex digest of the file; downloads that don't match are rejected, as are
+    all downloads if it is ``None``."""
+
+
+_FUSIONCHARTS = "https://cdn.fusioncharts.com/fusioncharts/3.21.0"
+# no digests are pinned yet, so these are only bundled from copies saved in the
+# asset directory; pin each one's SHA-256 once checked against a trusted copy
+VENDOR: dict[str, VendorAsset] = {
+    "d3": VendorAsset(
+        "d3.min.js",
+        "7.9.0",
+        "https://cdn.jsdelivr.net/npm/d3@7.9.0/dist/d3.min.js",
+        sha256=None,
+    ),
+    "fusioncharts": VendorAsset(
+        "fusioncharts.js", "3.21.0", f"{_FUSIONCHARTS}/fusioncharts.js", sha256=None
+    ),
+    # FusionCharts loads its chart modules from its own URL unless they are
+    # already on the page, and bundled filenames don't match that URL
+    "fusioncharts.powercharts": VendorAsset(
+        "fusioncharts.powercharts.js",
+        "3.21.0",
+        f"{_FUSIONCHARTS}/fusioncharts.powercharts.js",
+        sha256=None,
+    ),
+    "fusioncharts.theme.fusion": VendorAsset(
+        "fusioncharts.theme.fusion.js",
+        "3.21.0",
+        f"{_FUSIONCHARTS}/themes/fusioncharts.theme.fusion.js",
+        sha256=None,
+    ),
+}
+"""Third-party libraries pages use, by name."""
+_UNAVAILABLE: dict[str, str] = {}
+"""Why each library that couldn't be downloaded wasn't, so each is only tried
+once per process."""
+
+
+def default_asset_dir() -> str:
+    """Get where downloaded libraries are kept.
+
+    ``$CPAC_REGSUITE_ASSET_DIR``, or ``cpac_regsuite/assets`` in the user cache
+    directory (``$XDG_CACHE_HOME`` or ``~/.cache``).
+    """
+    if os.environ.get(ASSET_DIR_ENV):
+        return os.environ[ASSET_DIR_ENV]
+    cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.join(
+        os.path.expanduser("~"), ".cache"
+    )
+    return os.path.join(cache_home, "cpac_regsuite", "assets")
+
+
+def _write_atomically(path: str, content: bytes) -> None:
+    """Write a file so that concurrent readers see all of it or none."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    handle, temporary = tempfile.mkstemp(dir=os.path.dirname(path))
+    with os.fdopen(handle, "wb") as _f:
+        _f.write(content)
+    os.replace(temporary, path)
+
+
+def allow_cdn() -> bool:
+    """Whether pages may load libraries that can't be bundled from their URLs.
+
+    Set ``$CPAC_REGSUITE_ALLOW_CDN`` (to anything but ``0``) to allow it.
+    """
+    return os.environ.get(ALLOW_CDN_ENV, "0") not in ("", "0")
+
+
+def _download(asset: VendorAsset) -> bytes:
+    """Download a library and check it against its pinned digest."""
+    if asset.sha256 is None:
+        msg = "it has no pinned SHA-256 to check a download against"
+        raise OSError(msg)
+    with urlopen(asset.url, timeout=30) as response:
+        content = response.read()
+    digest = hashlib.sha256(content).hexdigest()
+    if digest != asset.sha256:
+        msg = f"SHA-256 {digest} doesn't match the pinned {asset.sha256}"
+        raise OSError(msg)
+    return content
+
+
+def vendor_content(name: str, asset_dir: Optional[str] = None) -> Optional[bytes]:
+    """Get a library from :data:`VENDOR`, downloading it the first time.
+
+    Returns
+    -------
+    bytes or None
+        ``None`` if it isn't in ``asset_dir`` and can't be downloaded (or
+        doesn't match its digest, or has none), and :py:func:`allow_cdn`.
+
+    Raises
+    ------
+    OSError
+        If it isn't in ``asset_dir`` and can't be downloaded, unless
+        :py:func:`allow_cdn`. A failed download isn't retried in this process.
+    """
+    asset = VENDOR[name]
+    path = os.path.join(asset_dir or default_asset_dir(), asset.version, asset.filename)
+    if not os.path.exists(path):
+        if name not in _UNAVAILABLE:
+            with span("download_asset", asset=name):
+                try:
+                    content = _download(asset)
+                except OSError as error:
+                    _UNAVAILABLE[name] = f"couldn't download {asset.url} ({error})"
+                else:
+                    count(bytes=len(content))
+                    _write_atomically(path, content)
+                    return content
+        if not allow_cdn():
+            msg = (
+                f"{_UNAVAILABLE[name]}. To build offline, save it as {path}, or "
+                f"set ${ALLOW_CDN_ENV}=1 for pages to load it from its URL"
+            )
+            raise OSError(msg)
+        warnings.warn(
+            f"{_UNAVAILABLE[name]}; pages will load it from its URL", stacklevel=2
+        )
+        return None
+    with open(path, "rb") as _f:
+        return _f.read()
+
+
+def pinned_urls(vendor: tuple[str, ...]) -> list["BundledAsset"]:
+    """Load libraries from :data:`VENDOR` from their pinned URLs, unbundled."""
+    return [
+        BundledAsset(VENDOR[name].filename, url=VENDOR[name].url) for name in vendor
+    ]
+
+
+def template_content(filename: str) -> bytes:
+    """Get one of this package's ``templates`` scripts."""
+    return (
+        files("cpac_regression_dashboard")
+        .joinpath("templates")
+        .joinpath(filename)
+        .read_bytes()
+    )
+
+
+@dataclass(frozen=True)
+class BundledAsset:
+    """A script as a page should load it: from a file, a URL or inline."""
+
+    name: str
+    path: Optional[str] = None
+    """File, relative to the output directory."""
+    url: Optional[str] = None
+    """Pinned URL of a library that couldn't be bundled."""
+    inline: Optional[str] = None
+    """Text to put in the page itself."""
+
+    def src(self, prefix: str = "") -> Optional[str]:
+        """URL for a page whose path to the output directory is ``prefix``.
+
+        ``None`` for an inline script.
+        """
+        if self.path is not None:
+            return f"{prefix}{self.path}"
+        return self.url
+
+    @property
+    def text(self) -> str:
+        """The inline script, safe to put in a ``<script>`` element."""
+        # a literal "</script>" would end the element early
+        return (self.inline or "").replace("</", "<\\/")
+
+    def script_tag(self, prefix: str = "") -> str:
+        """HTML to load this script."""
+        src = self.src(prefix)
+        if src is not None:
+            return f'<script type="text/javascript" src={json.dumps(src)}></script>'
+        return f'<script type="text/javascript">{self.text}</script>'
+
+
+def bundle_asset(
+    name: str,
+    content: bytes,
+    output_dir: str,
+    inline_max_bytes: int = INLINE_MAX_BYTES,
+) -> BundledAsset:
+    """Inline a script, or write it to a content-addressed file, once."""
+    if len(content) <= inline_max_bytes:
+        return BundledAsset(name, inline=content.decode("utf-8"))
+    from cpac_regression_dashboard.utils.data_assets import compress_asset
+
+    stem, extension = os.path.splitext(name)
+    digest = hashlib.sha256(content).hexdigest()[:12]
+    path = f"{ASSETS_DIRNAME}/{stem}.{digest}{extension}"
+    target = os.path.join(output_dir, path)
+    if not os.path.exists(target):
+        _write_atomically(target, content)
+        compress_asset(target)
+        count(files=1, bytes=len(content))
+    return BundledAsset(name, path=path)
+
+
+def bundle_scripts(
+    output_dir: str,
+    vendor: tuple[str, ...] = (),
+    templates: tuple[str, ...] = (),
+    inline_max_bytes: int = INLINE_MAX_BYTES,
+    asset_dir: Optional[str] = None,
+) -> list[BundledAsset]:
+    """Bundle libraries and template scripts for the pages in ``output_dir``.
+
+    Files already bundled are left alone, and older versions are kept for pages
+    built before them.
+
+    Parameters
+    ----------
+    output_dir : str
+
+    vendor : tuple of str
+        Names from :data:`VENDOR`.
+
+    templates : tuple of str
+        Filenames of this package's ``templates`` scripts.
+
+    inline_max_bytes : int
+        Inline scripts up to this size.
+
+    asset_dir : str, optional
+        Local copies of :data:`VENDOR`; see :py:func:`default_asset_dir`.
+
+    Returns
+    -------
+    list of BundledAsset
+        Libraries then templates, in the order given, for pages to load in that
+        order.
+    """
+    with span("bundle_scripts"):
+        bundled = []
+        for name in vendor:
+            content = vendor_content(name, asset_dir)
+            if content is None:
+                bundled.extend(pinned_urls((name,)))
+            else:
+                bundled.append(
+                    bundle_asset(
+                        VENDOR[name].filename, content, output_dir, inline_max_bytes
+                    )
+                )
+        for filename in templates:
+            bundled.append(
+                bundle_asset(
+                    filename, template_content(filename), output_dir, inline_max_bytes
+                )
+            )
+        return bundled
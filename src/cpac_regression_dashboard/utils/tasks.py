@@ -0,0 +1,323 @@
+"""Run a graph of commands over files, skipping those that are up to date.
+
+Each :py:class:`Task` is a command with the files it reads and writes. A task
+depends on the tasks that write its inputs, and runs once all of them have
+succeeded, in parallel with any other task that is ready. Its state (the
+command, the SHA-256 of every input and output, and an optional extra
+fingerprint) is saved as soon as it succeeds, and it is skipped while that state
+still matches, so an interrupted or failed run resumes where it stopped.
+"""
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+import json
+import os
+import subprocess
+import threading
+import time
+from typing import Any, Callable, Optional
+
+from cpac_regression_dashboard.utils.history import file_digest
+from cpac_regression_dashboard.utils.instrumentation import count, span
+
+STATE_FILENAME: str = ".cpac_regsuite_run.json"
+"""Default task state file, in the workspace."""
+
+
+@dataclass
+class Task:
+    """A command, with the files it reads and writes."""
+
+    name: str
+    command: list[str]
+    inputs: list[str] = field(default_factory=list)
+    """Files read; any written by another task make this task depend on it."""
+    outputs: list[str] = field(default_factory=list)
+    """Files written, all of which must exist afterwards."""
+    after: list[str] = field(default_factory=list)
+    """Names of other tasks to run first."""
+    cwd: Optional[str] = None
+    fingerprint: Optional[Callable[[], str]] = None
+    """Extra state to compare, e.g. of files too large to hash; computed once
+    this task's dependencies have run."""
+    always: bool = False
+    """Run even if up to date, e.g. because it reads directories rather than
+    files. Tasks after it are still skipped if its outputs don't change."""
+
+
+@dataclass
+class TaskResult:
+    """Outcome of one task."""
+
+    name: str
+    status: str
+    """``"ran"``, ``"up to date"``, ``"failed"``, ``"blocked"`` (by a failed
+    dependency) or, for a dry run, ``"would run"``."""
+    error: Optional[str] = None
+    duration: float = 0.0
+    log: Optional[str] = None
+
+
+def dependencies(tasks: list[Task]) -> dict[str, set[str]]:
+    """Map each task to those it depends on.
+
+    Raises
+    ------
+    ValueError
+        If tasks share a name or an output, depend on unknown tasks, or form a
+        cycle.
+    """
+    names = [task.name for task in tasks]
+    if len(set(names)) != len(names):
+        msg = "task names must be unique"
+        raise ValueError(msg)
+    producers: dict[str, str] = {}
+    for task in tasks:
+        for output in task.outputs:
+            path = os.path.abspath(output)
+            if path in producers:
+                msg = f"{output} is written by both {producers[path]} and {task.name}"
+                raise ValueError(msg)
+            producers[path] = task.name
+    graph = {}
+    for task in tasks:
+        unknown = set(task.after) - set(names)
+        if unknown:
+            msg = f"{task.name} runs after unknown tasks: {', '.join(sorted(unknown))}"
+            raise ValueError(msg)
+        graph[task.name] = {
+            producers[path]
+            for path in map(os.path.abspath, task.inputs)
+            if path in producers
+        } | set(task.after)
+    # Kahn's algorithm, to reject cycles before running anything
+    remaining = {name: set(deps) for name, deps in graph.items()}
+    while remaining:
+        ready = [name for name, deps in remaining.items() if not deps]
+        if not ready:
+            msg = f"tasks depend on each other: {', '.join(sorted(remaining))}"
+            raise ValueError(msg)
+        for name in ready:
+            del remaining[name]
+        for deps in remaining.values():
+            deps.difference_update(ready)
+    return graph
+
+
+def _digests(paths: list[str]) -> dict[str, Optional[str]]:
+    """SHA-256 of each file, ``None`` if missing."""
+    digests: dict[str, Optional[str]] = {}
+    for path in paths:
+        try:
+            digests[path] = file_digest(path)
+            count(files=1, bytes=os.path.getsize(path))
+        except FileNotFoundError:
+            digests[path] = None
+    return digests
+
+
+class TaskRunner:
+    """Run tasks in dependency order, in parallel, skipping up-to-date ones."""
+
+    def __init__(
+        self,
+        tasks: list[Task],
+        state_file: str = STATE_FILENAME,
+        n_jobs: int = 1,
+        force: bool = False,
+        log_dir: Optional[str] = None,
+    ) -> None:
+        """Check the graph and load any saved state.
+
+        Parameters
+        ----------
+        tasks : list of Task
+
+        state_file : str
+            Where each task's state is saved as it succeeds.
+
+        n_jobs : int
+            Tasks to run at once.
+
+        force : bool
+            Run every task, whatever its saved state.
+
+        log_dir : str, optional
+            Write each task's output to ``{log_dir}/{name}.log`` (with ``_`` for
+            ``:``). By default it
+            goes to this process's stdout and stderr.
+        """
+        self.tasks = {task.name: task for task in tasks}
+        self.graph = dependencies(tasks)
+        self.state_file = state_file
+        self.n_jobs = n_jobs
+        self.force = force
+        self.log_dir = log_dir
+        self._lock = threading.Lock()
+        self.state: dict[str, dict[str, Any]] = {}
+        if os.path.exists(state_file):
+            with open(state_file, "r", encoding="utf-8") as _f:
+                self.state = json.load(_f)
+
+    def _signature(self, task: Task) -> dict[str, Any]:
+        """Everything that decides whether a task must run again."""
+        return {
+            "command": task.command,
+            "cwd": task.cwd,
+            "inputs": _digests(task.inputs),
+            "fingerprint": task.fingerprint() if task.fingerprint else None,
+        }
+
+    def up_to_date(self, task: Task, signature: dict[str, Any]) -> bool:
+        """Check that ``task`` succeeded with this signature and outputs."""
+        saved = self.state.get(task.name)
+        if self.force or task.always or saved is None:
+            return False
+        if {key: saved.get(key) for key in signature} != signature:
+            return False
+        return _digests(task.outputs) == saved.get("outputs")
+
+    def _save(self, name: str, state: Optional[dict[str, Any]]) -> None:
+        """Record (or forget) a task's state, writing the file atomically."""
+        with self._lock:
+            if state is None:
+                self.state.pop(name, None)
+            else:
+                self.state[name] = state
+            directory = os.path.dirname(os.path.abspath(self.state_file))
+            os.makedirs(directory, exist_ok=True)
+            temporary = f"{self.state_file}.{os.getpid()}.tmp"
+            with open(temporary, "w", encoding="utf-8") as _f:
+                json.dump(self.state, _f, indent=2, sort_keys=True)
+            os.replace(temporary, self.state_file)
+
+    def _execute(self, task: Task) -> TaskResult:
+        """Run a task unless it is up to date."""
+        with span("task", task=task.name):
+            start = time.perf_counter()
+            signature = self._signature(task)
+            if self.up_to_date(task, signature):
+                return TaskResult(task.name, "up to date")
+            missing = [
+                path for path, digest in signature["inputs"].items() if not digest
+            ]
+            if missing:
+                return TaskResult(
+                    task.name, "failed", f"missing inputs: {', '.join(missing)}"
+                )
+            # forget the old state first, so a half-finished run isn't trusted
+            self._save(task.name, None)
+            result = TaskResult(task.name, "ran")
+            for output in task.outputs:
+                os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+            if self.log_dir:
+                os.makedirs(self.log_dir, exist_ok=True)
+                result.log = os.path.join(
+                    self.log_dir, f"{task.name.replace(':', '_')}.log"
+                )
+            log = open(result.log, "w", encoding="utf-8") if result.log else None
+            try:
+                process = subprocess.run(
+                    task.command,
+                    cwd=task.cwd,
+                    stdout=log,
+                    stderr=subprocess.STDOUT if log else None,
+                    check=False,
+                )
+            finally:
+                if log:
+                    log.close()
+            result.duration = time.perf_counter() - start
+            outputs = _digests(task.outputs)
+            if process.returncode:
+                result.status = "failed"
+                result.error = f"exited with status {process.returncode}"
+            elif not all(outputs.values()):
+                result.status = "failed"
+                result.error = "did not write " + ", ".join(
+                    path for path, digest in outputs.items() if not digest
+                )
+            else:
+                self._save(task.name, {**signature, "outputs": outputs})
+            return result
+
+    def _would_run(self, task: Task, stale: set[str]) -> TaskResult:
+        """Plan a task without running it."""
+        if task.always or self.graph[task.name] & stale:
+            return TaskResult(task.name, "would run")
+        try:
+            signature = self._signature(task)
+        except OSError:  # e.g. a fingerprint of inputs that don't exist yet
+            return TaskResult(task.name, "would run")
+        if self.up_to_date(task, signature):
+            return TaskResult(task.name, "up to date")
+        return TaskResult(task.name, "would run")
+
+    def run(self, dry_run: bool = False) -> list[TaskResult]:
+        """Run every task whose dependencies succeed, as they become ready.
+
+        With ``dry_run``, report what would run instead, assuming that
+        everything downstream of a task that runs must run too, unless that task
+        runs ``always`` (whose outputs usually don't change).
+
+        Returns
+        -------
+        list of TaskResult
+            In the order the tasks finished.
+        """
+        results: dict[str, TaskResult] = {}
+        pending = dict(self.graph)
+        if dry_run:
+            stale: set[str] = set()
+            while pending:
+                for name in [
+                    name for name, deps in pending.items() if deps <= set(results)
+                ]:
+                    results[name] = self._would_run(self.tasks[name], stale)
+                    if (
+                        results[name].status == "would run"
+                        and not self.tasks[name].always
+                    ):
+                        stale.add(name)
+                    del pending[name]
+            return list(results.values())
+        succeeded = ("ran", "up to date")
+        running: dict[Future, str] = {}
+        with ThreadPoolExecutor(max_workers=max(1, self.n_jobs)) as pool:
+            while pending or running:
+                for name, deps in list(pending.items()):
+                    if any(
+                        dep in results and results[dep].status not in succeeded
+                        for dep in deps
+                    ):
+                        results[name] = TaskResult(
+                            name,
+                            "blocked",
+                            "after failed "
+                            + ", ".join(
+                                sorted(
+                                    dep
+                                    for dep in deps
+                                    if dep in results
+                                    and results[dep].status not in succeeded
+                                )
+                            ),
+                        )
+                        del pending[name]
+                    elif all(
+                        dep in results and results[dep].status in succeeded
+                        for dep in deps
+                    ):
+                        running[pool.submit(self._execute, self.tasks[name])] = name
+                        del pending[name]
+                if not running:
+                    continue
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    try:
+                        results[name] = future.result()
+                    except Exception as exception:
+                        results[name] = TaskResult(
+                            name, "failed", f"{type(exception).__name__}: {exception}"
+                        )
+        return list(results.values())
@@ -0,0 +1,148 @@
+"""Rebuild D3 heatmap pages as correlation result files are written."""
+import signal
+import time
+from typing import Optional, TYPE_CHECKING
+
+import click
+
+from cpac_regression_dashboard.utils.instrumentation import instrumented
+
+if TYPE_CHECKING:
+    from cpac_regression_dashboard.utils.page_watch import Rebuild, WatchMetrics
+
+
+def _log(rebuild: "Rebuild") -> None:
+    """Report a rebuild on stdout, and its failures on stderr."""
+    stamp = time.strftime("%Y-%m-%d %H:%M:%S")
+    if rebuild.error:
+        click.echo(f"{stamp} rebuild failed: {rebuild.error}", err=True)
+        return
+    for result in rebuild.results:
+        if result.error:
+            click.echo(f"{stamp} {result.html}: {result.error}", err=True)
+    built = sum(result.built and not result.error for result in rebuild.results)
+    click.echo(
+        f"{stamp} {len(rebuild.changed)} changed, {built} built in "
+        f"{rebuild.duration:.1f} s ({rebuild.latency:.1f} s after the first change)"
+    )
+
+
+@click.command()
+@click.option(
+    "--json_dir",
+    required=True,
+    multiple=True,
+    type=click.Path(exists=True, file_okay=False),
+    help="directory that {data_source}_{branch}.json (or .npz) files are "
+    "written to; repeat for more",
+)
+@click.option(
+    "--branch", required=True, multiple=True, help="branch to watch; repeat for more"
+)
+@click.option("--output_dir", default="output", help="where to write the pages")
+@click.option(
+    "--n_workers",
+    type=int,
+    default=1,
+    help="number of worker processes, kept while watching",
+)
+@click.option(
+    "--order",
+    type=click.Choice(["cluster", "name"]),
+    default="cluster",
+    show_default=True,
+    help="cluster similar rows and columns together, worst first, or sort rows by name",
+)
+@click.option(
+    "--threshold",
+    type=float,
+    default=0.98,
+    show_default=True,
+    help="coefficients below this are counted and flagged in each row's summary",
+)
+@click.option(
+    "--quiet",
+    type=float,
+    default=2.0,
+    show_default=True,
+    help="rebuild once no file has changed for this many seconds",
+)
+@click.option(
+    "--max_wait",
+    type=float,
+    default=30.0,
+    show_default=True,
+    help="rebuild at most this many seconds after a change, even if files keep "
+    "changing",
+)
+@click.option(
+    "--poll",
+    is_flag=True,
+    help="poll instead of using inotify, e.g. on NFS or Lustre, where inotify "
+    "doesn't see files written on other hosts",
+)
+@click.option(
+    "--interval",
+    type=float,
+    default=2.0,
+    show_default=True,
+    help="seconds between polls",
+)
+@click.option(
+    "--metrics_file",
+    type=click.Path(dir_okay=False),
+    help="where to write rebuild latency and queue depth as JSON "
+    "[default: OUTPUT_DIR/.watch_metrics.json]",
+)
+@click.option(
+    "--idle_timeout",
+    type=float,
+    help="exit once no file has changed for this many seconds [default: never]",
+)
+@instrumented("cpac_regsuite_watch")
+def main(  # noqa: PLR0913
+    json_dir: tuple[str, ...],
+    branch: tuple[str, ...],
+    output_dir: str = "output",
+    n_workers: int = 1,
+    order: str = "cluster",
+    threshold: float = 0.98,
+    quiet: float = 2.0,
+    max_wait: float = 30.0,
+    poll: bool = False,
+    interval: float = 2.0,
+    metrics_file: Optional[str] = None,
+    idle_timeout: Optional[float] = None,
+) -> "WatchMetrics":
+    """Build pages for the result files there are, then rebuild as they change.
+
+    Only the pages for changed files, and the index, are rebuilt. Runs until
+    interrupted (Ctrl+C or SIGTERM), or --idle_timeout.
+    """
+    from cpac_regression_dashboard.utils.page_watch import PageWatcher
+
+    watcher = PageWatcher(
+        list(json_dir),
+        list(branch),
+        output_dir,
+        n_workers,
+        order,
+        threshold,
+        quiet,
+        max_wait,
+        poll,
+        interval,
+        metrics_file,
+    )
+    # stop cleanly, e.g. when a SLURM job is cancelled
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    metrics = watcher.run(_log, idle_timeout)
+    click.echo(
+        f"watched with {metrics.method}: {metrics.rebuilds} rebuilds, "
+        f"{metrics.pages_built} pages built, {metrics.page_failures} failed"
+    )
+    return metrics
+
+
+if __name__ == "__main__":
+    main()
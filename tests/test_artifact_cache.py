@@ -0,0 +1,55 @@
+"""Reusing cached correlation runs."""
+from pathlib import Path
+
+from cpac_regression_dashboard.utils.artifact_cache import ArtifactCache, fingerprint
+
+
+def _config(tmp_path: Path, run_name: str) -> dict:
+    return {
+        "settings": {
+            "run_name": run_name,
+            "correlations_dir": str(tmp_path / f"c_{run_name}"),
+        },
+        "pipelines": {"a": {"output_dir": str(tmp_path / "outputs")}},
+    }
+
+
+def test_hit_under_another_run_name(tmp_path: Path) -> None:
+    """Files named after the cached run are restored under the current name."""
+    (tmp_path / "outputs").mkdir()
+    (tmp_path / "outputs" / "sub-1.nii.gz").write_bytes(b"image")
+    main, feature = _config(tmp_path, "main_site"), _config(tmp_path, "feat_site")
+    key = fingerprint(main)
+    assert fingerprint(feature) == key
+
+    written = tmp_path / "c_main_site"
+    (written / "plots").mkdir(parents=True)
+    (written / "main_site_correlations.txt").write_text("feature\n")
+    (written / "plots" / "main_site.png").write_bytes(b"png")
+    cache = ArtifactCache(str(tmp_path / "cache"))
+    cache.put(
+        key,
+        ["feature"],
+        str(written),
+        ["main_site_correlations.txt", "plots/main_site.png"],
+        "main_site",
+    )
+
+    restored = tmp_path / "c_feat_site"
+    assert cache.get(key, str(restored), "feat_site") == ["feature"]
+    assert sorted(
+        str(path.relative_to(restored)) for path in restored.rglob("*.*")
+    ) == ["feat_site_correlations.txt", "plots/feat_site.png"]
+    assert (restored / "feat_site_correlations.txt").read_text() == "feature\n"
+    cache.close()
+
+
+def test_unnamed_entry_misses_for_named_run(tmp_path: Path) -> None:
+    """An entry stored without its run's name can't be renamed, so isn't reused."""
+    (tmp_path / "run").mkdir()
+    (tmp_path / "run" / "old_correlations.txt").write_text("feature\n")
+    cache = ArtifactCache(str(tmp_path / "cache"))
+    cache.put("key", ["feature"], str(tmp_path / "run"), ["old_correlations.txt"])
+    assert cache.get("key", str(tmp_path / "new"), "new") is None
+    assert cache.get("key", str(tmp_path / "same")) == ["feature"]
+    cache.close()
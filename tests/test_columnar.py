@@ -0,0 +1,31 @@
+"""Columnar ``.npz`` storage of correlation records."""
+from pathlib import Path
+
+import numpy as np
+
+from cpac_regression_dashboard.utils.columnar import iter_npz_records, records_to_npz
+from cpac_regression_dashboard.utils.records import CorrelationRecord
+
+RECORDS = [
+    CorrelationRecord("feature 0", "HNU_1", 0.9876543210123),
+    CorrelationRecord("feature 1", "HNU_1", None),
+    CorrelationRecord("feature 0", "Site-CBIC", 0.25),
+]
+
+
+def test_values_round_trip(tmp_path: Path) -> None:
+    """Coefficients are stored at double precision by default."""
+    path = str(tmp_path / "results.npz")
+    records_to_npz(RECORDS, path)
+    assert list(iter_npz_records(path)) == RECORDS
+
+
+def test_single_precision_opt_in(tmp_path: Path) -> None:
+    """Single precision keeps the shortest decimal that round-trips at it."""
+    path = str(tmp_path / "results.npz")
+    assert records_to_npz(RECORDS, path, np.float32).values.dtype == np.float32
+    assert [record.value for record in iter_npz_records(path)] == [
+        0.9876543,
+        None,
+        0.25,
+    ]
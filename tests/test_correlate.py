@@ -0,0 +1,139 @@
+"""Pearson's r accumulated a block at a time, and the keys it's reported by."""
+import math
+import os
+from pathlib import Path
+import sys
+
+import nibabel as nib
+import numpy as np
+import pytest
+import yaml
+
+from cpac_regression_dashboard.utils.correlate import (
+    correlate_pipelines,
+    PearsonAccumulator,
+)
+from cpac_regression_dashboard.utils.records import parse_key
+
+DERIVATIVES = (
+    "anat/{subject}_desc-preproc_T1w.nii.gz",
+    "func/{subject}_task-rest_desc-mean_bold.nii.gz",
+    "func/{subject}_task-rest_atlas-AAL_desc-Mean_timeseries.1D",
+    "func/{subject}_task-rest_desc-confounds_timeseries.tsv",
+)
+"""A representative slice of a C-PAC output directory, per subject."""
+KEYS = [
+    "sub-1_ses-1_desc-preproc_T1w",
+    "sub-1_ses-1_task-rest_atlas-AAL_desc-Mean_timeseries",
+    "sub-1_ses-1_task-rest_desc-confounds_timeseries",
+    "sub-1_ses-1_task-rest_desc-mean_bold",
+    "sub-2_ses-1_desc-preproc_T1w",
+    "sub-2_ses-1_task-rest_atlas-AAL_desc-Mean_timeseries",
+    "sub-2_ses-1_task-rest_desc-confounds_timeseries",
+    "sub-2_ses-1_task-rest_desc-mean_bold",
+]
+"""Features the derivatives are reported as, for results to line up with
+earlier runs."""
+
+
+@pytest.mark.parametrize("block", [1, 7, 1000])
+def test_matches_corrcoef(block: int) -> None:
+    """Blocks of any size give the coefficient of all the data at once."""
+    rng = np.random.default_rng(0)
+    x = rng.normal(1e6, 1.0, 1000)  # large offset, to test numerical stability
+    y = x + rng.normal(0.0, 0.5, 1000)
+    accumulator = PearsonAccumulator()
+    for start in range(0, x.size, block):
+        accumulator.update(x[start : start + block], y[start : start + block])
+    assert accumulator.n == x.size
+    assert accumulator.r == pytest.approx(np.corrcoef(x, y)[0, 1], rel=1e-9)
+
+
+def test_constant_is_nan() -> None:
+    """A constant side has no correlation."""
+    accumulator = PearsonAccumulator()
+    accumulator.update(np.ones(5), np.arange(5))
+    assert math.isnan(accumulator.r)
+    assert math.isnan(PearsonAccumulator().r)
+
+
+def test_empty_block_is_ignored() -> None:
+    """An empty block changes nothing."""
+    accumulator = PearsonAccumulator()
+    accumulator.update(np.arange(5), np.arange(5) ** 2)
+    r = accumulator.r
+    accumulator.update(np.array([]), np.array([]))
+    assert accumulator.r == r
+    assert accumulator.n == 5
+
+
+def test_mismatched_blocks() -> None:
+    """Blocks of different sizes can't be paired."""
+    with pytest.raises(ValueError, match="differ in size"):
+        PearsonAccumulator().update(np.arange(3), np.arange(4))
+
+
+def _output_tree(root: Path, seed: int) -> str:
+    """Write :data:`DERIVATIVES` for two subjects under ``root``."""
+    rng = np.random.default_rng(seed)
+    for subject in ("sub-1_ses-1", "sub-2_ses-1"):
+        for derivative in DERIVATIVES:
+            path = root / "output" / subject.replace("_", os.sep) / derivative
+            path = path.with_name(path.name.format(subject=subject))
+            path.parent.mkdir(parents=True, exist_ok=True)
+            if path.name.endswith(".nii.gz"):
+                image = nib.Nifti1Image(rng.normal(size=(4, 4, 4, 3)), np.eye(4))
+                nib.save(image, str(path))
+            elif path.suffix == ".tsv":
+                path.write_text("a\tb\n1\t2\n3\t5\n4\t4\n")
+            else:
+                np.savetxt(path, rng.normal(size=(5, 2)))
+    return str(root / "output")
+
+
+def _config(tmp_path: Path) -> dict:
+    return {
+        "settings": {
+            "n_cpus": 1,
+            "correlations_dir": str(tmp_path / "correlations"),
+            "run_name": "run",
+            "s3_creds": None,
+            "quick": False,
+            "verbose": False,
+        },
+        "pipelines": {
+            name: {
+                "output_dir": _output_tree(tmp_path / name, seed),
+                "work_dir": None,
+                "log_dir": None,
+                "pipe_config": None,
+                "replacements": None,
+            }
+            for seed, name in enumerate(("pipeline_1", "pipeline_2"))
+        },
+    }
+
+
+def test_key_format(tmp_path: Path) -> None:
+    """Derivatives are reported by subject, session and the rest of the name."""
+    results = correlate_pipelines(_config(tmp_path), 1)
+    assert [result.key for result in results] == KEYS
+    assert not [result.error for result in results if result.error]
+
+
+def test_keys_match_cpac_correlations(
+    monkeypatch: pytest.MonkeyPatch, tmp_path: Path
+) -> None:
+    """The native engine reports the features ``cpac_correlations`` does."""
+    cpac_correlations = pytest.importorskip("cpac_correlations").cpac_correlations
+    config = _config(tmp_path)
+    yaml_file = tmp_path / "branch_site.yml"
+    yaml_file.write_text(yaml.dump(config))
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(
+        sys,
+        "argv",
+        ["cpac_correlations", str(yaml_file), "--branch", "b", "--data_source", "s"],
+    )
+    all_keys, _, _ = cpac_correlations()
+    assert sorted(parse_key(key, "s").rowid for key in all_keys) == KEYS
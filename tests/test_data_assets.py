@@ -0,0 +1,31 @@
+"""Ordering dashboard data for linked and inline pages."""
+import json
+from pathlib import Path
+
+import pytest
+
+from cpac_regression_dashboard.utils.data_assets import (
+    ordered_records,
+    write_data_assets,
+)
+from cpac_regression_dashboard.utils.records import CorrelationRecord
+
+RECORDS = [
+    CorrelationRecord(f"feature {i}", site, 1 - i * (j + 1) / 10)
+    for i in (2, 0, 3, 1)
+    for j, site in enumerate(("HNU_1", "Site-CBIC"))
+]
+
+
+@pytest.mark.parametrize("order", ["cluster", "name"])
+def test_inline_order_matches_assets(tmp_path: Path, order: str) -> None:
+    """Embedded records come in the order of the written assets."""
+    manifest, records = ordered_records(RECORDS, order, 0.9)
+    written = write_data_assets(RECORDS, str(tmp_path), "html", order=order)
+    assert (manifest.rows, manifest.columns) == (written.rows, written.columns)
+    chunk = json.loads((tmp_path / "html.json").read_text())
+    assert [record.to_dict() for record in records] == chunk
+    assert manifest.threshold == 0.9
+    if order == "name":
+        # heatmap.js draws the first row at the bottom
+        assert manifest.rows == [f"feature {i}" for i in (3, 2, 1, 0)]
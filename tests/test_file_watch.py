@@ -0,0 +1,33 @@
+"""Batching of changed files."""
+from cpac_regression_dashboard.utils.file_watch import Debouncer
+
+
+def test_ready_once_quiet() -> None:
+    """A batch is ready ``quiet`` seconds after its last change."""
+    debouncer = Debouncer(quiet=2.0, max_wait=30.0)
+    assert debouncer.timeout(now=0.0) is None
+    debouncer.add({"a"}, now=0.0)
+    assert debouncer.timeout(now=1.0) == 1.0
+    debouncer.add({"b"}, now=1.5)
+    assert debouncer.timeout(now=2.0) == 1.5
+    assert debouncer.timeout(now=4.0) == 0.0
+
+
+def test_ready_after_max_wait() -> None:
+    """A steady stream of changes is still handled after ``max_wait`` seconds."""
+    debouncer = Debouncer(quiet=2.0, max_wait=3.0)
+    for now in (0.0, 1.0, 2.0, 2.9):
+        debouncer.add({f"file{now}"}, now=now)
+    assert debouncer.timeout(now=2.9) == 3.0 - 2.9
+
+
+def test_take_keeps_first_change() -> None:
+    """Each path is reported with when it first changed, and taking empties."""
+    debouncer = Debouncer()
+    debouncer.add({"a"}, now=1.0)
+    debouncer.add({"a", "b"}, now=2.0)
+    debouncer.add(set(), now=5.0)  # nothing changed
+    assert debouncer.timeout(now=3.0) == 1.0
+    assert debouncer.take() == {"a": 1.0, "b": 2.0}
+    assert debouncer.pending == {}
+    assert debouncer.timeout() is None
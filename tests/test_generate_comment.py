@@ -0,0 +1,19 @@
+"""The comment API, still importable from the command line's module."""
+import pytest
+
+from cpac_regression_dashboard import generate_comment
+from cpac_regression_dashboard.utils import comment
+
+
+@pytest.mark.parametrize(
+    "name", [name for name in generate_comment.__all__ if name != "main"]
+)
+def test_reexported(name: str) -> None:
+    """Each public name of ``utils.comment`` is the same object here."""
+    assert getattr(generate_comment, name) is getattr(comment, name)
+
+
+def test_unknown_name() -> None:
+    """Other names are still missing."""
+    with pytest.raises(AttributeError, match="no_such_name"):
+        generate_comment.no_such_name
@@ -0,0 +1,226 @@
+"""Retries, backoff and rate limits of the GitHub client, against a local server."""
+import asyncio
+import time
+from typing import Any, Awaitable, Callable
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+import pytest
+
+from cpac_regression_dashboard.utils.github_api import GitHubAPIError, GitHubClient
+
+_Handler = Callable[[web.Request], Awaitable[web.StreamResponse]]
+
+
+def _serve(
+    routes: list[web.RouteDef],
+    calls: Callable[[GitHubClient], Awaitable[Any]],
+    **client_options: Any,  # noqa: ANN401
+) -> Any:  # noqa: ANN401
+    """Run ``calls`` with a client of a test server for ``routes``."""
+
+    async def main() -> Any:  # noqa: ANN401
+        app = web.Application()
+        app.add_routes(routes)
+        async with TestServer(app) as server:
+            async with GitHubClient(
+                "token", str(server.make_url("")), **client_options
+            ) as client:
+                return await calls(client)
+
+    return asyncio.run(main())
+
+
+def _responses(*responses: Callable[[], web.Response]) -> tuple[_Handler, list[int]]:
+    """Answer with each of ``responses`` in turn (then the last), counting calls."""
+    calls: list[int] = []
+
+    async def handler(request: web.Request) -> web.Response:
+        calls.append(1)
+        return responses[min(len(calls), len(responses)) - 1]()
+
+    return handler, calls
+
+
+def _ok() -> web.Response:
+    return web.json_response({"ok": True})
+
+
+def test_retries_transient_failures() -> None:
+    """A 502 and a 429 are retried until the request succeeds."""
+    handler, calls = _responses(
+        lambda: web.Response(status=502),
+        lambda: web.Response(status=429, headers={"Retry-After": "0"}),
+        _ok,
+    )
+    result = _serve(
+        [web.get("/thing", handler)],
+        lambda client: client.request("GET", "/thing"),
+        backoff=0.01,
+    )
+    assert result == {"ok": True}
+    assert len(calls) == 3
+
+
+def test_gives_up_after_retries() -> None:
+    """The last failure is raised once every retry has failed."""
+    handler, calls = _responses(lambda: web.Response(status=503, text="down"))
+    with pytest.raises(GitHubAPIError, match="503 down") as error:
+        _serve(
+            [web.get("/thing", handler)],
+            lambda client: client.request("GET", "/thing"),
+            retries=2,
+            backoff=0.01,
+        )
+    assert error.value.status == 503
+    assert len(calls) == 3
+
+
+def test_does_not_retry_client_errors() -> None:
+    """A 404 fails at once."""
+    handler, calls = _responses(lambda: web.Response(status=404))
+    with pytest.raises(GitHubAPIError):
+        _serve(
+            [web.get("/thing", handler)],
+            lambda client: client.request("GET", "/thing"),
+            backoff=0.01,
+        )
+    assert len(calls) == 1
+
+
+def test_backoff_delay() -> None:
+    """Retries back off exponentially, unless ``Retry-After`` says otherwise."""
+    client = GitHubClient(backoff=0.5)
+    assert [client._delay(attempt, None) for attempt in range(3)] == [0.5, 1.0, 2.0]
+    assert client._delay(2, {"Retry-After": "7"}) == 7.0
+
+
+def test_waits_for_rate_limit_reset() -> None:
+    """An exhausted rate limit is waited out, then the request is retried."""
+    reset = int(time.time()) + 1
+    handler, calls = _responses(
+        lambda: web.Response(
+            status=403,
+            headers={"X-RateLimit-Remaining": "0", "X-RateLimit-Reset": str(reset)},
+        ),
+        _ok,
+    )
+    result = _serve(
+        [web.get("/thing", handler)],
+        lambda client: client.request("GET", "/thing"),
+        backoff=0.01,
+    )
+    assert result == {"ok": True}
+    assert len(calls) == 2
+    assert time.time() >= reset
+
+
+def test_rate_limit_without_reset_backs_off() -> None:
+    """An exhausted rate limit with no reset time is retried after a backoff."""
+    handler, calls = _responses(
+        lambda: web.Response(status=403, headers={"X-RateLimit-Remaining": "0"}),
+        _ok,
+    )
+
+    async def timed(client: GitHubClient) -> float:
+        start = time.monotonic()
+        await client.request("GET", "/thing")
+        return time.monotonic() - start
+
+    assert _serve([web.get("/thing", handler)], timed, backoff=0.2) >= 0.2
+    assert len(calls) == 2
+
+
+def test_rate_limit_keeps_latest_reset() -> None:
+    """Responses handled out of order don't shorten or clear the wait."""
+    client = GitHubClient()
+    assert client._track_rate_limit(
+        {"X-RateLimit-Remaining": "0", "X-RateLimit-Reset": "200"}
+    )
+    assert client._track_rate_limit(
+        {"X-RateLimit-Remaining": "0", "X-RateLimit-Reset": "100"}
+    )
+    assert not client._track_rate_limit({"X-RateLimit-Remaining": "5"})
+    assert client._rate_limit_reset == 200.0
+
+
+class _Repository:
+    """Just enough of the Git Data API to commit to one branch."""
+
+    def __init__(self, conflicts: int) -> None:
+        self.tip = "commit0"
+        self.conflicts = conflicts
+        """Ref updates to reject as not fast-forwards, as if someone pushed."""
+        self.commits: dict[str, dict[str, Any]] = {
+            "commit0": {"sha": "commit0", "tree": {"sha": "tree0"}}
+        }
+        self.patches = 0
+
+    def routes(self) -> list[web.RouteDef]:
+        prefix = "/repos/owner/repo/git"
+        return [
+            web.get(f"{prefix}/ref/heads/main", self.get_ref),
+            web.get(f"{prefix}/commits/{{sha}}", self.get_commit),
+            web.post(f"{prefix}/trees", self.create_tree),
+            web.post(f"{prefix}/commits", self.create_commit),
+            web.patch(f"{prefix}/refs/heads/main", self.update_ref),
+        ]
+
+    async def get_ref(self, request: web.Request) -> web.Response:
+        return web.json_response({"object": {"sha": self.tip}})
+
+    async def get_commit(self, request: web.Request) -> web.Response:
+        return web.json_response(self.commits[request.match_info["sha"]])
+
+    async def create_tree(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        return web.json_response({"sha": f"{body['base_tree']}+blobs"})
+
+    async def create_commit(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        sha = f"commit{len(self.commits)}"
+        self.commits[sha] = {"sha": sha, "tree": {"sha": body["tree"]}, **body}
+        return web.json_response({"sha": sha})
+
+    async def update_ref(self, request: web.Request) -> web.Response:
+        self.patches += 1
+        if self.conflicts:
+            self.conflicts -= 1
+            # someone else pushed first
+            pushed = f"commit{len(self.commits)}"
+            self.commits[pushed] = {"sha": pushed, "tree": {"sha": f"{pushed}-tree"}}
+            self.tip = pushed
+            return web.json_response(
+                {"message": "Update is not a fast forward"}, status=422
+            )
+        self.tip = (await request.json())["sha"]
+        return web.json_response({"object": {"sha": self.tip}})
+
+
+def test_commit_rebuilt_on_new_tip() -> None:
+    """A ref update rejected with 422 is retried on top of the new tip."""
+    repository = _Repository(conflicts=1)
+    sha = _serve(
+        repository.routes(),
+        lambda client: client.commit_blobs(
+            "owner", "repo", "main", {"a.png": "blob"}, "Add"
+        ),
+    )
+    assert repository.patches == 2
+    assert sha == repository.tip
+    # built on the commit that was pushed in between, not the first tip
+    assert repository.commits[sha]["parents"] == ["commit2"]
+
+
+def test_commit_gives_up_after_attempts() -> None:
+    """A ref that keeps moving fails after ``attempts`` tries."""
+    repository = _Repository(conflicts=5)
+    with pytest.raises(GitHubAPIError) as error:
+        _serve(
+            repository.routes(),
+            lambda client: client.commit_blobs(
+                "owner", "repo", "main", {"a.png": "blob"}, "Add", attempts=2
+            ),
+        )
+    assert error.value.status == 422
+    assert repository.patches == 2
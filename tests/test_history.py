@@ -0,0 +1,47 @@
+"""Ingesting result files into the history store."""
+import json
+from pathlib import Path
+import sqlite3
+
+from cpac_regression_dashboard.utils.history import HistoryStore
+
+
+def _results(path: Path, value: float) -> str:
+    path.write_text(json.dumps([{"rowid": "f1", "columnid": "HNU", "value": value}]))
+    return str(path)
+
+
+def test_identical_results_for_two_commits(tmp_path: Path) -> None:
+    """The same file is recorded for each commit, but only once per commit."""
+    results = _results(tmp_path / "HNU_main.json", 0.5)
+    with HistoryStore(str(tmp_path / "history.sqlite")) as history:
+        assert history.ingest(results, "main", "aaaaaaa") == 1
+        assert history.ingest(results, "main", "aaaaaaa") is None
+        assert history.ingest(results, "main", "bbbbbbb") == 1
+        assert history.ingest(results, "feature", "aaaaaaa") == 1
+        assert {sha for _, _, sha in history.runs()} == {"aaaaaaa", "bbbbbbb"}
+        assert [row.sha for row in history.query(branch="main")] == [
+            "bbbbbbb",
+            "aaaaaaa",
+        ]
+
+
+def test_migrates_files_keyed_by_digest(tmp_path: Path) -> None:
+    """A store that keyed files by digest alone records reruns once opened."""
+    store = str(tmp_path / "history.sqlite")
+    results = _results(tmp_path / "HNU_main.json", 0.5)
+    with HistoryStore(store) as history:
+        history.ingest(results, "main", "aaaaaaa")
+    connection = sqlite3.connect(store)
+    with connection:
+        connection.executescript(
+            "ALTER TABLE files RENAME TO new_files;"
+            "CREATE TABLE files (digest TEXT PRIMARY KEY, path TEXT NOT NULL, "
+            "run_id INTEGER NOT NULL, site TEXT NOT NULL, records INTEGER NOT NULL, "
+            "ingested REAL NOT NULL);"
+            "INSERT INTO files SELECT * FROM new_files; DROP TABLE new_files;"
+        )
+    connection.close()
+    with HistoryStore(store) as history:
+        assert history.ingest(results, "main", "aaaaaaa") is None
+        assert history.ingest(results, "main", "bbbbbbb") == 1
@@ -0,0 +1,65 @@
+"""Streaming JSON scanning of correlation records."""
+import io
+import json
+
+import pytest
+
+from cpac_regression_dashboard.utils.records import iter_json_events
+
+RECORDS = [
+    {"rowid": f"feature {i}", "columnid": "HNU_1", "value": i / 10} for i in range(10)
+]
+
+
+def _events(text: str, **options: int) -> list[tuple]:
+    return list(iter_json_events(io.StringIO(text), **options))
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 1 << 16])
+def test_objects_across_chunks(chunk_size: int) -> None:
+    """Records split across reads are decoded whole, in order."""
+    events = _events(json.dumps(RECORDS, indent=2), chunk_size=chunk_size)
+    assert events[0] == ("start_array", None)
+    assert events[-1] == ("end_array", None)
+    assert [value for event, value in events[1:-1]] == RECORDS
+    assert {event for event, _ in events[1:-1]} == {"object"}
+
+
+def test_legacy_layouts() -> None:
+    """Nested and back-to-back arrays, with or without commas, are scanned."""
+    first, second = RECORDS[:2]
+    text = f"[[{json.dumps(first)}]]\n[{json.dumps(first)} {json.dumps(second)}]"
+    assert _events(text) == [
+        ("start_array", None),
+        ("start_array", None),
+        ("object", first),
+        ("end_array", None),
+        ("end_array", None),
+        ("start_array", None),
+        ("object", first),
+        ("object", second),
+        ("end_array", None),
+    ]
+
+
+@pytest.mark.parametrize(
+    ("text", "message"),
+    [
+        ('{"rowid": "a"}', "unexpected '{'"),
+        ('[{"rowid": "a",}]', "malformed or oversized"),
+        ('[{"rowid": "a"}', "unterminated array"),
+        ("[1, 2]", "unexpected '1'"),
+    ],
+)
+def test_malformed(text: str, message: str) -> None:
+    """Anything but arrays of objects is reported with its position."""
+    with pytest.raises(ValueError, match=message):
+        _events(text)
+
+
+def test_oversized_record() -> None:
+    """A record longer than ``max_record_chars`` fails instead of filling memory."""
+    text = json.dumps([{"rowid": "a" * 1000, "columnid": "b", "value": 1}])
+    with pytest.raises(ValueError, match="over 100 characters"):
+        _events(text, chunk_size=10, max_record_chars=100)
+    assert len(_events(text, chunk_size=10, max_record_chars=2000)) == 3
@@ -0,0 +1,60 @@
+"""Downloading pinned third-party libraries."""
+from pathlib import Path
+from typing import Optional
+
+import pytest
+
+from cpac_regression_dashboard.utils import static_assets
+from cpac_regression_dashboard.utils.static_assets import vendor_content, VendorAsset
+
+
+def _vendor(monkeypatch: pytest.MonkeyPatch, sha256: Optional[str]) -> list[str]:
+    """Pin a library to ``sha256``, recording the URLs it is downloaded from."""
+    downloads: list[str] = []
+
+    class _Response:
+        def __init__(self, url: str, timeout: float) -> None:
+            downloads.append(url)
+
+        def __enter__(self) -> "_Response":
+            return self
+
+        def __exit__(self, *args: object) -> None:
+            pass
+
+        def read(self) -> bytes:
+            return b"library"
+
+    monkeypatch.setattr(static_assets, "urlopen", _Response)
+    monkeypatch.setattr(static_assets, "_UNAVAILABLE", {})
+    monkeypatch.setitem(
+        static_assets.VENDOR,
+        "library",
+        VendorAsset("library.js", "1.0", "https://example.com/library.js", sha256),
+    )
+    monkeypatch.delenv(static_assets.ALLOW_CDN_ENV, raising=False)
+    return downloads
+
+
+def test_download_without_digest_is_an_error(
+    monkeypatch: pytest.MonkeyPatch, tmp_path: Path
+) -> None:
+    """A library with no pinned digest isn't downloaded."""
+    downloads = _vendor(monkeypatch, None)
+    with pytest.raises(OSError, match="no pinned SHA-256"):
+        vendor_content("library", str(tmp_path))
+    assert not downloads
+    # a copy saved in the asset directory is still used
+    (tmp_path / "1.0").mkdir()
+    (tmp_path / "1.0" / "library.js").write_bytes(b"saved")
+    assert vendor_content("library", str(tmp_path)) == b"saved"
+
+
+def test_download_checked_against_digest(
+    monkeypatch: pytest.MonkeyPatch, tmp_path: Path
+) -> None:
+    """A download that doesn't match its digest is rejected."""
+    _vendor(monkeypatch, "0" * 64)
+    with pytest.raises(OSError, match="doesn't match"):
+        vendor_content("library", str(tmp_path))
+    assert not (tmp_path / "1.0" / "library.js").exists()
@@ -0,0 +1,73 @@
+"""Resuming a graph of tasks."""
+from pathlib import Path
+import sys
+
+import pytest
+
+from cpac_regression_dashboard.utils.tasks import dependencies, Task, TaskRunner
+
+
+def _copy(source: Path, target: Path) -> list[str]:
+    """Command copying one file to another, failing while ``FAIL`` exists."""
+    script = (
+        "import os, shutil, sys\n"
+        "if os.path.exists(sys.argv[3]): sys.exit(1)\n"
+        "shutil.copy(sys.argv[1], sys.argv[2])\n"
+    )
+    return [
+        sys.executable,
+        "-c",
+        script,
+        str(source),
+        str(target),
+        str(source.parent / "FAIL"),
+    ]
+
+
+def _tasks(tmp_path: Path) -> list[Task]:
+    a, b, c = (tmp_path / name for name in ("a.txt", "b.txt", "c.txt"))
+    return [
+        Task("second", _copy(b, c), [str(b)], [str(c)]),
+        Task("first", _copy(a, b), [str(a)], [str(b)]),
+    ]
+
+
+def _run(tmp_path: Path, dry_run: bool = False) -> dict[str, str]:
+    runner = TaskRunner(_tasks(tmp_path), str(tmp_path / "state.json"))
+    return {result.name: result.status for result in runner.run(dry_run)}
+
+
+def test_resume(tmp_path: Path) -> None:
+    """Up-to-date tasks are skipped, and a failed run resumes where it stopped."""
+    (tmp_path / "a.txt").write_text("1")
+    assert _run(tmp_path) == {"first": "ran", "second": "ran"}
+    assert _run(tmp_path) == {"first": "up to date", "second": "up to date"}
+
+    (tmp_path / "a.txt").write_text("2")
+    (tmp_path / "FAIL").touch()
+    assert _run(tmp_path) == {"first": "failed", "second": "blocked"}
+    (tmp_path / "FAIL").unlink()
+    assert _run(tmp_path, dry_run=True) == {"first": "would run", "second": "would run"}
+    assert _run(tmp_path) == {"first": "ran", "second": "ran"}
+    assert (tmp_path / "c.txt").read_text() == "2"
+
+    # an output changed by hand is rebuilt, and nothing upstream of it
+    (tmp_path / "c.txt").write_text("edited")
+    assert _run(tmp_path) == {"first": "up to date", "second": "ran"}
+    assert (tmp_path / "c.txt").read_text() == "2"
+
+
+def test_missing_input(tmp_path: Path) -> None:
+    """A task whose inputs don't exist fails without running."""
+    assert _run(tmp_path) == {"first": "failed", "second": "blocked"}
+
+
+def test_cycle() -> None:
+    """Tasks that depend on each other are rejected before anything runs."""
+    with pytest.raises(ValueError, match="depend on each other"):
+        dependencies(
+            [
+                Task("a", ["true"], after=["b"]),
+                Task("b", ["true"], after=["a"]),
+            ]
+        )